@@ -0,0 +1,84 @@
+from django.db import connection, transaction
+from django.db.models import Q
+from api.models import Alert, Stock
+
+# transicoes de estado dos alertas em lote
+# em vez de um UPDATE condicional + um INSERT por ativo, cada direcao (limite superior/inferior) é um
+# unico UPDATE ... SET flag = TRUE WHERE id IN (...) AND flag = FALSE RETURNING ..., e os alertas das
+# linhas devolvidas entram num unico bulk_create
+#
+# o UPDATE condicional mantem a garantia de envio unico: se dois workers tentarem marcar o mesmo
+# ativo, o segundo espera o lock da linha, reavalia o WHERE com a flag ja marcada e nao devolve a
+# linha, entao so quem realmente fez a transicao cria o alerta e manda o email
+
+FLAGS = {'upper': 'alert_upper_sent', 'lower': 'alert_lower_sent'}
+ALERT_TYPES = {'upper': 'sell_suggestion', 'lower': 'buy_suggestion'}
+
+# colunas devolvidas pelo UPDATE, o suficiente pra montar o alerta e o email
+RETURNED_FIELDS = ['id', 'user_id', 'name', 'current_price', 'lower_limit', 'upper_limit', 'fake']
+
+# limite de parametros por statement (o SQLite aceita no minimo 999)
+CHUNK_SIZE = 500
+
+
+def _flip(side, ids):
+    # marca a flag da direcao nos ativos em que ela ainda estava desmarcada e devolve essas linhas
+    flag = FLAGS[side]
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        # bancos sem UPDATE ... RETURNING: travamos as linhas antes, o que da a mesma garantia
+        with transaction.atomic():
+            rows = list(
+                Stock.objects.select_for_update().filter(id__in=ids, **{flag: False}).values_list(*RETURNED_FIELDS)
+            )
+            Stock.objects.filter(id__in=[row[0] for row in rows]).update(**{flag: True})
+        return rows
+
+    quote = connection.ops.quote_name
+    table = quote(Stock._meta.db_table)
+    flag_column = quote(Stock._meta.get_field(flag).column)
+    columns = ", ".join(quote(Stock._meta.get_field(field).column) for field in RETURNED_FIELDS)
+    id_column = quote(Stock._meta.pk.column)
+
+    rows = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), CHUNK_SIZE):
+            chunk = ids[start:start + CHUNK_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"UPDATE {table} SET {flag_column} = %s "
+                f"WHERE {id_column} IN ({placeholders}) AND {flag_column} = %s "
+                f"RETURNING {columns}",
+                [True, *chunk, False],
+            )
+            rows += cursor.fetchall()
+    return rows
+
+
+def fire(crossings, timestamp, price=None):
+    # crossings: {id do ativo: 'upper' ou 'lower'}
+    # devolve ([(ativo, direcao)], alertas criados) so das linhas que fizeram a transicao
+    # `price` é o preco que cruzou o tunel dos ativos reais (os fakes usam o preco gravado)
+    fired = []
+    for side in ('upper', 'lower'):
+        ids = [stock_id for stock_id, crossed in crossings.items() if crossed == side]
+        if not ids:
+            continue
+        for row in _flip(side, ids):
+            stock = Stock(**dict(zip(RETURNED_FIELDS, row)))
+            if price is not None and not stock.fake:
+                stock.current_price = price
+            fired.append((stock, side))
+
+    alerts = Alert.objects.bulk_create([
+        Alert(user_id=stock.user_id, stock=stock, asset_name=stock.name,
+              alert_type=ALERT_TYPES[side], timestamp=timestamp)
+        for stock, side in fired
+    ])
+    return fired, alerts
+
+
+def reset(queryset):
+    # desmarca as flags dos ativos do queryset que voltaram pra dentro do tunel, num unico UPDATE
+    return queryset.filter(Q(alert_upper_sent=True) | Q(alert_lower_sent=True)).update(
+        alert_upper_sent=False, alert_lower_sent=False
+    )
@@ -0,0 +1,117 @@
+import random
+import zlib
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from api.models import Alert, Stock
+
+# dados sinteticos dos benchmarks (comandos seed_benchmark, benchmark_queries, benchmark_cycle,
+# stub_market_data e loadtest_events)
+# o preco base de cada ticker é derivado do nome, entao o servidor stub e a base populada
+# concordam sobre a faixa de preco sem compartilhar estado: os ativos sao criados com o tunel em
+# volta do preco base e a serie do stub anda alguns % a partir dele, cruzando parte dos tuneis
+
+BENCH_USER_PREFIX = "bench-user-"
+DEFAULT_TICKERS = 200
+
+
+def bench_tickers(count=DEFAULT_TICKERS):
+    return [f"BENCH{i:03d}.SA" for i in range(count)]
+
+
+BENCH_TICKERS = bench_tickers()
+
+
+def base_price(symbol):
+    # entre 5 e 100, fixo por ticker
+    return 5 + (zlib.crc32(symbol.encode()) % 9500) / 100
+
+
+def synthetic_daily_series(symbol, bars=100, seed=0, end=None):
+    # resposta no formato do TIME_SERIES_DAILY do Alpha Vantage (barra mais recente primeiro),
+    # com um passeio aleatorio deterministico por (seed, ticker)
+    # o passeio anda pra tras a partir do fechamento mais recente, que fica a ~1% do preco base,
+    # assim so uma parte dos tuneis criados pelo seed é cruzada
+    rng = random.Random(f"{seed}:{symbol}")
+    end = end or date.today()
+    price = base_price(symbol) * (1 + rng.gauss(0, 0.01))
+    closes = []
+    for _ in range(bars):
+        closes.append(price)
+        price = max(0.01, price * (1 + rng.gauss(0, 0.01)))
+    series = {}
+    for i, close in enumerate(closes):
+        series[(end - timedelta(days=i)).isoformat()] = {
+            "1. open": f"{close:.4f}",
+            "2. high": f"{close * 1.01:.4f}",
+            "3. low": f"{close * 0.99:.4f}",
+            "4. close": f"{close:.4f}",
+            "5. volume": str(rng.randint(100_000, 5_000_000)),
+        }
+    return {
+        "Meta Data": {"2. Symbol": symbol, "3. Last Refreshed": end.isoformat()},
+        "Time Series (Daily)": series,
+    }
+
+
+def bench_users():
+    return User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+
+
+def seed(users, stocks_per_user, alerts_per_user, tickers=DEFAULT_TICKERS, rng_seed=42):
+    # os dados sao inseridos com bulk_create (sem passar pelo save), entao last_updated e
+    # next_due_at sao preenchidos aqui mesmo, espalhados pelos ultimos dias
+    # devolve (usuarios, ativos, alertas) criados
+    rng = random.Random(rng_seed)
+    now = timezone.now()
+    names = bench_tickers(tickers)
+    stocks_per_user = min(stocks_per_user, len(names))
+    existing = bench_users().count()
+    stock_count = 0
+
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username=f"{BENCH_USER_PREFIX}{i}", email=f"{BENCH_USER_PREFIX}{i}@example.com")
+            for i in range(existing, existing + users)
+        ], batch_size=1000)
+        # nem todo banco devolve os ids no bulk_create, entao buscamos os usuarios criados
+        new_users = list(bench_users().order_by('id')[existing:])
+
+        stocks = []
+        for user in new_users:
+            for name in rng.sample(names, stocks_per_user):
+                price = round(base_price(name) * (1 + rng.uniform(-0.02, 0.02)), 4)
+                last_updated = now - timedelta(minutes=rng.randint(0, 3 * 24 * 60))
+                periodicity = rng.choice([1, 5, 15, 60])
+                stocks.append(Stock(
+                    user=user, name=name, periodicity=periodicity,
+                    current_price=price, lower_limit=round(price * 0.985, 4), upper_limit=round(price * 1.015, 4),
+                    last_updated=last_updated, next_due_at=last_updated + timedelta(minutes=periodicity),
+                ))
+            if len(stocks) >= 10000:
+                Stock.objects.bulk_create(stocks, batch_size=1000)
+                stock_count += len(stocks)
+                stocks = []
+        Stock.objects.bulk_create(stocks, batch_size=1000)
+        stock_count += len(stocks)
+
+        alert_types = [choice for choice, _ in Alert.ALERT_CHOICES]
+        alerts = []
+        for user in new_users:
+            for _ in range(alerts_per_user):
+                alerts.append(Alert(
+                    user=user, asset_name=rng.choice(names), alert_type=rng.choice(alert_types),
+                    timestamp=now - timedelta(minutes=rng.randint(0, 90 * 24 * 60)),
+                ))
+            if len(alerts) >= 10000:
+                Alert.objects.bulk_create(alerts, batch_size=1000)
+                alerts = []
+        Alert.objects.bulk_create(alerts, batch_size=1000)
+    return len(new_users), stock_count, len(new_users) * alerts_per_user
+
+
+def clear():
+    # apaga os usuarios de teste (ativos e alertas vao junto pelo CASCADE)
+    deleted, _ = bench_users().delete()
+    return deleted
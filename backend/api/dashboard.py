@@ -0,0 +1,68 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Min, Q
+from django.utils import timezone
+from api.models import Alert, Stock
+
+# resumo do painel do usuario (ultima/proxima atualizacao, ativos perto ou alem dos limites e
+# alertas recentes), calculado com agregacoes no banco (uma query nos ativos e uma nos alertas)
+# e guardado no cache por usuario; qualquer escrita nos ativos ou alertas do usuario invalida o resumo
+
+# distancia relativa (1%) a partir da qual um ativo conta como perto do limite
+NEAR_LIMIT_RATIO = 0.01
+
+
+def _key(user_id):
+    return f"dashboard-summary:{user_id}"
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def compute_summary(user_id):
+    now = timezone.now()
+    over_upper = Q(current_price__gte=F('upper_limit'))
+    over_lower = Q(current_price__lte=F('lower_limit'))
+    near = (
+        Q(current_price__gte=F('upper_limit') * (1 - NEAR_LIMIT_RATIO))
+        | Q(current_price__lte=F('lower_limit') * (1 + NEAR_LIMIT_RATIO))
+    )
+    stocks = Stock.objects.filter(user_id=user_id).aggregate(
+        stock_count=Count('id'),
+        last_update=Max('last_updated'),
+        next_update=Min('next_due_at', filter=Q(status=Stock.STATUS_READY)),
+        over_limit=Count('id', filter=over_upper | over_lower),
+        near_limit=Count('id', filter=near & ~over_upper & ~over_lower),
+    )
+
+    day_ago = now - timedelta(days=1)
+    week_ago = now - timedelta(days=7)
+    alerts = Alert.objects.filter(user_id=user_id, timestamp__gte=week_ago).aggregate(
+        alerts_24h=Count('id', filter=Q(timestamp__gte=day_ago)),
+        alerts_7d=Count('id'),
+        sell_suggestions_7d=Count('id', filter=Q(alert_type='sell_suggestion')),
+        buy_suggestions_7d=Count('id', filter=Q(alert_type='buy_suggestion')),
+    )
+
+    return {
+        **stocks,
+        'last_update': _isoformat(stocks['last_update']),
+        'next_update': _isoformat(stocks['next_update']),
+        **alerts,
+    }
+
+
+def get_summary(user_id):
+    key = _key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_summary(user_id)
+        # o TTL limita a idade das contagens por janela de tempo (ultimas 24h/7 dias)
+        cache.set(key, summary, timeout=settings.DASHBOARD_SUMMARY_TTL)
+    return summary
+
+
+def invalidate(user_ids):
+    cache.delete_many([_key(user_id) for user_id in set(user_ids)])
@@ -0,0 +1,95 @@
+import logging
+import redis
+from django.conf import settings
+from django.utils import timezone
+from api.models import Stock
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# indice dos vencimentos dos ativos (sorted set no Redis, membro = id do ativo, score = next_due_at
+# em epoch), usado pelo agendador por vencimento (api.scheduler) pra liberar cada ativo no proprio
+# instante em vez de varrer o banco uma vez por minuto
+#
+# o banco continua sendo a fonte da verdade: o indice é atualizado nas
+# escritas que reagendam ativos e recarregado do banco periodicamente (resync), e os ativos
+# liberados sao conferidos contra o banco antes de ir pra fila de atualizacao
+
+DUE_KEY = "scheduler:due"
+
+# tira do indice, numa operacao atomica, ate ARGV[2] ativos vencidos ate ARGV[1]
+# (varios agendadores rodando ao mesmo tempo nunca liberam o mesmo ativo duas vezes)
+_CLAIM_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2]))
+for i = 1, #due, 2 do
+    redis.call('ZREM', KEYS[1], due[i])
+end
+return due
+"""
+
+
+def schedule(stocks):
+    # grava no indice o vencimento atual dos ativos (chamar depois de salvar no banco)
+    # com o agendador do beat o indice nao é usado, entao nao gastamos escritas nele
+    if settings.UPDATE_SCHEDULER != 'due':
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for stock in stocks:
+            if stock.status != Stock.STATUS_READY or stock.next_due_at is None:
+                pipe.zrem(DUE_KEY, str(stock.id))
+            else:
+                pipe.zadd(DUE_KEY, {str(stock.id): stock.next_due_at.timestamp()})
+        pipe.execute()
+    except redis.RedisError as e:
+        # o ativo entra no indice no proximo resync
+        logger.warning("Não foi possível atualizar o índice de vencimentos: %s", e)
+
+
+def retry(names, at):
+    # devolve pro indice, vencendo em `at`, os ativos ainda vencidos dos tickers cuja cotacao falhou
+    # (o claim ja tirou eles do indice e, sem isso, so voltariam no proximo resync)
+    if settings.UPDATE_SCHEDULER != 'due' or not names:
+        return
+    ids = Stock.objects.filter(Stock.due_filter(timezone.now()), name__in=names).values_list('id', flat=True)
+    entries = {str(stock_id): at.timestamp() for stock_id in ids}
+    if not entries:
+        return
+    try:
+        get_redis().zadd(DUE_KEY, entries)
+    except redis.RedisError as e:
+        logger.warning("Não foi possível atualizar o índice de vencimentos: %s", e)
+
+
+def remove(stock_id):
+    try:
+        get_redis().zrem(DUE_KEY, str(stock_id))
+    except redis.RedisError as e:
+        logger.warning("Não foi possível atualizar o índice de vencimentos: %s", e)
+
+
+def resync(until):
+    # recarrega do banco os ativos prontos que vencem ate `until` (inclusive os atrasados)
+    # devolve quantos foram gravados
+    rows = list(
+        Stock.objects.filter(Stock.due_filter(until)).values_list('id', 'next_due_at').iterator(chunk_size=10000)
+    )
+    entries = {str(stock_id): due.timestamp() if due else 0 for stock_id, due in rows}
+    pipe = get_redis().pipeline(transaction=False)
+    items = list(entries.items())
+    for i in range(0, len(items), 10000):
+        pipe.zadd(DUE_KEY, dict(items[i:i + 10000]))
+    pipe.execute()
+    return len(entries)
+
+
+def claim(now, limit):
+    # devolve {id do ativo: vencimento em epoch} dos ativos liberados
+    reply = get_redis().eval(_CLAIM_LUA, 1, DUE_KEY, now, limit)
+    return {int(reply[i]): float(reply[i + 1]) for i in range(0, len(reply), 2)}
+
+
+def next_due():
+    # vencimento mais proximo no indice (epoch), ou None se estiver vazio
+    head = get_redis().zrange(DUE_KEY, 0, 0, withscores=True)
+    return head[0][1] if head else None
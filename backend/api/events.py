@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import secrets
+import weakref
+import redis
+import redis.asyncio as redis_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from api.serializers.alert_serializers import AlertListSerializer
+from api.serializers.stock_serializers import StockSerializer
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# eventos em tempo real pro frontend (Server-Sent Events)
+# quem grava (as tasks do Celery) publica no canal Redis do usuario, e cada processo web assina
+# so os canais dos usuarios conectados nele, entao qualquer processo atende qualquer usuario
+#
+# cada processo web mantem uma unica conexao de pub/sub com o Redis, compartilhada por todos os
+# streams abertos nele; as mensagens sao distribuidas pra uma fila por conexao do navegador
+# as mensagens ja saem do publish no formato do SSE, o stream so repassa os bytes
+
+
+def _channel(user_id):
+    return f"events:user:{user_id}"
+
+
+def _frame(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _ticket_key(ticket):
+    return f"events:ticket:{ticket}"
+
+
+def issue_ticket(user_id):
+    # ticket aleatorio pra abrir o stream: o EventSource do navegador nao manda headers, entao a
+    # autenticacao vai na query, e la o JWT ficaria nos logs de acesso valendo ate expirar
+    # o ticket vale EVENTS_TICKET_TTL segundos e abre uma unica conexao
+    ticket = secrets.token_urlsafe(32)
+    get_redis().set(_ticket_key(ticket), user_id, ex=settings.EVENTS_TICKET_TTL)
+    return ticket
+
+
+def redeem_ticket(ticket):
+    # devolve o id do usuario do ticket (ou None) e apaga o ticket na mesma transacao,
+    # entao dois streams nunca abrem com o mesmo ticket
+    key = _ticket_key(ticket)
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.get(key)
+        pipe.delete(key)
+        user_id, _ = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Não foi possível validar o ticket do stream: %s", e)
+        return None
+    return int(user_id) if user_id is not None else None
+
+
+def publish(events):
+    # events: iteravel de (user_id, tipo do evento, dados serializaveis em JSON)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for user_id, event, data in events:
+            pipe.publish(_channel(user_id), _frame(event, data))
+        pipe.execute()
+    except redis.RedisError as e:
+        # o evento em tempo real é so um atalho, os dados continuam no banco pra proxima listagem
+        logger.warning("Não foi possível publicar os eventos: %s", e)
+
+
+def publish_stocks(stocks):
+    publish((stock.user_id, 'stock', StockSerializer(stock).data) for stock in stocks)
+
+
+def publish_alerts(alerts):
+    publish((alert.user_id, 'alert', AlertListSerializer(alert).data) for alert in alerts)
+
+
+class _Hub:
+    # conexao de pub/sub do processo e as filas dos streams abertos, por usuario
+
+    def __init__(self):
+        self.client = redis_async.Redis.from_url(settings.CACHE_REDIS_URL)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.queues = {}
+        self.lock = asyncio.Lock()
+        self.reader = None
+
+    async def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        async with self.lock:
+            if user_id not in self.queues:
+                self.queues[user_id] = set()
+                await self.pubsub.subscribe(_channel(user_id))
+            self.queues[user_id].add(queue)
+            if self.reader is None or self.reader.done():
+                self.reader = asyncio.create_task(self._read())
+        return queue
+
+    async def unsubscribe(self, user_id, queue):
+        async with self.lock:
+            queues = self.queues.get(user_id)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self.queues[user_id]
+                await self.pubsub.unsubscribe(_channel(user_id))
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self.pubsub.get_message(timeout=1.0)
+            except redis.RedisError as e:
+                # o redis-py reconecta e reassina os canais na proxima leitura
+                logger.warning("Conexão de eventos com o Redis caiu: %s", e)
+                await asyncio.sleep(1)
+                continue
+            if message is None or message['type'] != 'message':
+                continue
+            user_id = int(message['channel'].decode().rsplit(':', 1)[1])
+            for queue in list(self.queues.get(user_id, ())):
+                try:
+                    queue.put_nowait(message['data'])
+                except asyncio.QueueFull:
+                    # navegador lento demais: descartamos o evento em vez de segurar os outros streams
+                    pass
+
+
+# um hub por event loop (no uvicorn é um por processo)
+_hubs = weakref.WeakKeyDictionary()
+
+
+def _get_hub():
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = _Hub()
+    return hub
+
+
+async def stream(user_id):
+    # gerador do corpo da resposta SSE de um usuario; roda ate o navegador desconectar
+    hub = _get_hub()
+    queue = await hub.subscribe(user_id)
+    try:
+        # o navegador reconecta sozinho depois de 5s se a conexao cair
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), settings.EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # comentario do SSE, mantem a conexao viva atraves de proxies
+                yield ": ping\n\n"
+                continue
+            yield frame
+    finally:
+        await hub.unsubscribe(user_id, queue)
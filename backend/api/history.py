@@ -0,0 +1,193 @@
+import logging
+from bisect import bisect_left
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from api.models import PriceBar, TickerStats
+from utils.finance import rolling_stats, rolling_push, rolling_replace, rolling_volatility
+from utils.timeseries import EPOCH
+
+logger = logging.getLogger(__name__)
+
+# historico local de precos e estado incremental da volatilidade por ticker
+# a serie diaria ganha no maximo uma barra por dia, entao guardamos as barras no banco (PriceBar),
+# gravamos so as novas a cada fetch e, em vez de recalcular media e desvio padrao do historico
+# inteiro a cada atualizacao, aplicamos so as barras novas sobre o estado salvo (TickerStats)
+
+
+def _new_bars(name, stock_data, last_stored):
+    # barras da serie a partir da ultima data salva; a ultima barra salva entra de novo porque
+    # o fechamento do dia pode ter mudado
+    # as datas da serie sao dias desde EPOCH, entao a busca é direto no array ordenado
+    start = int(np.searchsorted(stock_data.dates, (last_stored - EPOCH).days)) if last_stored else 0
+    if start >= len(stock_data):
+        return []
+    new = stock_data.tail(len(stock_data) - start)
+    return [
+        PriceBar(name=name, date=day, close=close, volume=volume)
+        for day, close, volume in zip(new.date_list(), new.closes.tolist(), new.volumes.tolist())
+    ]
+
+
+def merge_many_bars(series):
+    # grava no historico local as barras que ainda nao estao no banco, pra varios tickers
+    # ({nome: TimeSeries}) com uma query pras ultimas datas salvas e um unico bulk_create
+    last_stored = dict(
+        PriceBar.objects.filter(name__in=list(series)).values('name').annotate(last=Max('date'))
+        .order_by().values_list('name', 'last')
+    )
+    bars = []
+    for name, stock_data in series.items():
+        bars += _new_bars(name, stock_data, last_stored.get(name))
+    PriceBar.objects.bulk_create(
+        bars,
+        update_conflicts=True,
+        unique_fields=['name', 'date'],
+        update_fields=['close', 'volume'],
+        batch_size=1000,
+    )
+    return len(bars)
+
+
+def load_many_history(names, limit):
+    # devolve {nome: (datas, fechamentos)} das ultimas `limit` barras de cada ticker, em ordem cronologica,
+    # numa unica query (numeracao das barras por ticker com uma window function)
+    rows = (
+        PriceBar.objects.filter(name__in=list(names))
+        .annotate(position=Window(RowNumber(), partition_by=F('name'), order_by=F('date').desc()))
+        .filter(position__lte=limit)
+        .order_by('name', 'date')
+        .values_list('name', 'date', 'close')
+    )
+    history = {name: ([], []) for name in names}
+    for name, day, close in rows:
+        dates, prices = history[name]
+        dates.append(day)
+        prices.append(close)
+    return history
+
+
+def load_history(name, limit):
+    # devolve (datas, fechamentos) das ultimas `limit` barras do historico local, em ordem cronologica
+    rows = list(
+        PriceBar.objects.filter(name=name).order_by('-date').values_list('date', 'close')[:limit]
+    )
+    rows.reverse()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def rebuild_stats(stats, dates, prices):
+    # recalculo completo da janela (cold start, mudanca de janela ou buraco na serie)
+    window = prices[-stats.window:]
+    stats.count, stats.mean, stats.m2 = rolling_stats(window)
+    stats.first_price = window[0] if window else None
+    stats.last_date = dates[-1] if dates else None
+    stats.last_price = prices[-1] if prices else None
+
+
+def advance_stats(stats, dates, prices):
+    # aplica sobre o estado salvo as barras posteriores a stats.last_date
+    # devolve False quando o estado nao bate com a serie e precisa de recalculo completo
+    if stats.last_date is None or stats.last_price is None or stats.first_price is None:
+        return False
+    if stats.count > stats.window:
+        return False
+
+    idx = bisect_left(dates, stats.last_date)
+    if idx == len(dates) or dates[idx] != stats.last_date:
+        return False
+
+    state = (stats.count, stats.mean, stats.m2)
+
+    # a barra do dia pode ter sido revisada (o fechamento muda durante o pregao)
+    if prices[idx] != stats.last_price:
+        state = rolling_replace(*state, stats.last_price, prices[idx])
+
+    # posicao, na serie atual, da barra mais antiga da janela salva; fica negativa quando ela
+    # ja nao aparece na serie (o compact do Alpha Vantage so traz as ultimas 100 barras),
+    # e nesse caso o preco que sai da janela vem de stats.first_price
+    start = idx - stats.count + 1
+    evicted_from_state = False
+    for j in range(idx + 1, len(prices)):
+        if state[0] < stats.window:
+            state = rolling_push(*state, prices[j])
+            continue
+        if start >= 0:
+            old_price = prices[start]
+        elif not evicted_from_state:
+            old_price = stats.first_price
+            evicted_from_state = True
+        else:
+            return False
+        state = rolling_replace(*state, old_price, prices[j])
+        start += 1
+
+    if start >= 0:
+        stats.first_price = prices[start]
+    elif evicted_from_state:
+        return False
+
+    stats.count, stats.mean, stats.m2 = state
+    stats.last_date = dates[-1]
+    stats.last_price = prices[-1]
+    return True
+
+
+def update_rolling_volatility(history):
+    # history: {nome: (datas, fechamentos)}; devolve {nome: volatilidade}, atualizando o estado
+    # incremental de cada ticker com as barras novas da serie, numa unica transacao
+    window = settings.VOLATILITY_WINDOW
+    names = sorted(history)
+
+    with transaction.atomic():
+        # os tickers sem estado ganham a linha antes do lock (outro worker pode estar criando a mesma)
+        existing = set(TickerStats.objects.filter(name__in=names).values_list('name', flat=True))
+        TickerStats.objects.bulk_create(
+            [TickerStats(name=name, window=window) for name in names if name not in existing],
+            ignore_conflicts=True,
+        )
+        # travadas sempre na mesma ordem, pra dois lotes com tickers em comum nao se travarem
+        rows = list(TickerStats.objects.select_for_update().filter(name__in=names).order_by('name'))
+
+        now = timezone.now()
+        for stats in rows:
+            dates, prices = history[stats.name]
+            if stats.name not in existing or stats.window != window:
+                stats.window = window
+                rebuild_stats(stats, dates, prices)
+            elif not advance_stats(stats, dates, prices):
+                logger.warning(
+                    "Estado de volatilidade de %s inconsistente com a série, recalculando.", stats.name,
+                    extra={'ticker': stats.name},
+                )
+                rebuild_stats(stats, dates, prices)
+            # o bulk_update nao passa pelo auto_now
+            stats.updated_at = now
+        TickerStats.objects.bulk_update(
+            rows, ['window', 'count', 'mean', 'm2', 'first_price', 'last_date', 'last_price', 'updated_at'],
+        )
+
+    return {stats.name: rolling_volatility(stats.count, stats.mean, stats.m2) for stats in rows}
+
+
+def refresh_histories(series):
+    # junta as series recem buscadas ({nome: TimeSeries}) ao historico local e devolve
+    # {nome: volatilidade} calculada sobre ele, com um numero fixo de queries pra qualquer quantidade
+    # de tickers (a importacao em lote e o recalculo geral passam varios de uma vez):
+    # - as ultimas datas salvas (1 query) e o upsert so das barras a partir delas (1 por 1000 barras);
+    # - as ultimas 2 * VOLATILITY_WINDOW barras de cada ticker (1 query): o dobro da janela pra que
+    #   o estado incremental sempre ache as barras que saem dela;
+    # - o estado incremental (TickerStats): leitura, criacao dos que faltam, lock e bulk_update (4 queries)
+    # o custo por ticker é fixo: no maximo 2 * VOLATILITY_WINDOW barras lidas, nunca o historico inteiro
+    if not series:
+        return {}
+    merge_many_bars(series)
+    return update_rolling_volatility(load_many_history(series, settings.VOLATILITY_WINDOW * 2))
+
+
+def refresh_history(name, stock_data):
+    # mesma coisa pra um ticker so
+    return refresh_histories({name: stock_data})[name]
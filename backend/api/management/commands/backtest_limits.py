@@ -0,0 +1,109 @@
+import glob
+import json
+import os
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.models import PriceBar
+from utils.backtest import PARAMETERS, parameter_grid, run_backtest
+from utils.finance import history_matrix
+from utils.providers import replay_path
+from utils.timeseries import TimeSeries
+
+SORT_KEYS = {
+    'hit_rate': lambda results, i: -np.nan_to_num(results['hit_rate'][i], nan=-1),
+    'alerts': lambda results, i: -results['alerts'][i],
+    'churn': lambda results, i: results['churn'][i],
+}
+
+
+def _values(text):
+    return [float(value) for value in text.split(',') if value.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula os alertas e as trocas de túnel sobre o histórico diário guardado (PriceBar) ou as "
+        "gravações do replay, pra uma grade de parâmetros do cálculo dos limites. Cada parâmetro "
+        "aceita uma lista separada por vírgula (padrão: o valor atual)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help="Tickers simulados (padrão: todos com histórico)")
+        parser.add_argument('--source', choices=['history', 'replay'], default='history',
+                            help="history: tabela PriceBar; replay: arquivos de MARKET_DATA_REPLAY_DIR")
+        parser.add_argument('--window', type=int, default=settings.VOLATILITY_WINDOW, help="Janela da volatilidade")
+        parser.add_argument('--warmup', type=int, help="Barras antes do primeiro túnel (padrão: a janela)")
+        parser.add_argument('--horizon', type=int, default=5, help="Pregões até conferir se o alerta acertou")
+        parser.add_argument('--sort', choices=list(SORT_KEYS), default='hit_rate')
+        parser.add_argument('--top', type=int, default=20, help="Configurações listadas")
+        for name in PARAMETERS:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=_values, help=f"Valores de {name}")
+
+    def handle(self, *args, **options):
+        series = self.load_history(options['source'], options['tickers'])
+        if not series:
+            raise CommandError("Nenhum histórico encontrado.")
+        closes = history_matrix([closes for closes, _ in series.values()])
+        volumes = history_matrix([volumes for _, volumes in series.values()])
+        grid = parameter_grid(**{name: options[name] for name in PARAMETERS if options[name]})
+        configs = len(grid['update_percentage'])
+
+        started = time.perf_counter()
+        results = run_backtest(closes, volumes, grid, options['window'], options['warmup'], options['horizon'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{configs} configurações x {closes.shape[0]} tickers x {closes.shape[1]} pregões em {elapsed:.2f}s\n"
+        )
+
+        # so os parametros que variam na grade viram colunas
+        names = [name for name in PARAMETERS if len(set(grid[name])) > 1]
+        fixed = [f"{name}={grid[name][0]:g}" for name in PARAMETERS if name not in names]
+        if fixed:
+            self.stdout.write("fixos: " + ", ".join(fixed))
+        header = "".join(f"{name:>22}" for name in names)
+        self.stdout.write(f"{header}{'alertas':>10}{'acerto':>9}{'alertas/ano':>13}{'trocas/ano':>12}")
+        order = sorted(range(configs), key=lambda i: SORT_KEYS[options['sort']](results, i))
+        for i in order[:options['top']]:
+            hit_rate = results['hit_rate'][i]
+            self.stdout.write(
+                "".join(f"{grid[name][i]:>22g}" for name in names)
+                + f"{results['alerts'][i]:>10}"
+                + (f"{hit_rate:>9.1%}" if not np.isnan(hit_rate) else f"{'-':>9}")
+                + f"{results['alerts_per_ticker_year'][i]:>13.2f}{results['churn'][i]:>12.2f}"
+            )
+
+    def load_history(self, source, tickers):
+        # devolve {ticker: (fechamentos, volumes)} em ordem cronologica
+        if source == 'replay':
+            try:
+                paths = (
+                    [replay_path(settings.MARKET_DATA_REPLAY_DIR, name) for name in tickers]
+                    or sorted(glob.glob(os.path.join(settings.MARKET_DATA_REPLAY_DIR, "*.json")))
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            series = {}
+            for path in paths:
+                name = os.path.basename(path)[:-len(".json")]
+                try:
+                    with open(path) as file:
+                        data = TimeSeries.from_daily_json(name, json.load(file)["Time Series (Daily)"])
+                except (OSError, ValueError, KeyError) as e:
+                    self.stderr.write(f"Erro ao ler {path}: {e}")
+                    continue
+                if data is not None:
+                    series[name] = (data.closes, data.volumes)
+            return series
+
+        # uma unica query ordenada por ticker e data, agrupada aqui
+        rows = PriceBar.objects.order_by('name', 'date').values_list('name', 'close', 'volume')
+        if tickers:
+            rows = rows.filter(name__in=tickers)
+        grouped = {}
+        for name, close, volume in rows.iterator(chunk_size=10000):
+            closes, volumes = grouped.setdefault(name, ([], []))
+            closes.append(close)
+            volumes.append(volume)
+        return grouped
@@ -0,0 +1,184 @@
+import statistics
+import time
+from collections import Counter
+from datetime import timedelta
+import httpx
+from celery import current_app
+from celery.app.task import Task
+from celery.signals import task_prerun
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+import resend
+from api import notifications
+from api.benchmark import bench_users, synthetic_daily_series
+from api.management.commands.stub_market_data import start_server
+from api.models import Alert, Stock
+from api.tasks import check_and_update_stocks_global
+from utils import quote_cache
+from utils.redis_client import get_redis
+from utils.fetcher import parse_daily_series
+from utils.finance import calculate_limits, calculate_volatility, get_stock_data
+from utils.timeseries import TimeSeries
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o custo das funções do caminho quente e de um ciclo completo do agendador "
+        "(check_and_update_stocks_global até o envio dos emails) sobre a base do seed_benchmark, "
+        "com o provedor e o Resend trocados pelo stub_market_data. O ciclo recentraliza os túneis, "
+        "então rode seed_benchmark --reset entre execuções pra comparar os números"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000, help="Repetições de cada micro-benchmark")
+        parser.add_argument('--skip-micro', action='store_true', help="Não roda os micro-benchmarks")
+        parser.add_argument('--skip-cycle', action='store_true', help="Não roda o ciclo completo")
+        parser.add_argument('--stub-url', help="URL de um stub_market_data já rodando (senão sobe um aqui)")
+        parser.add_argument('--latency', type=float, default=0.05, help="Latência do stub, em segundos")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Jitter do stub, em segundos")
+        parser.add_argument('--stub-rate-per-minute', type=int, default=0, help="Cota por minuto do stub (0 desliga)")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fração das requests do stub que falha")
+        parser.add_argument(
+            '--provider', default='alphavantage',
+            help="Provedor usado no ciclo (MARKET_DATA_PROVIDER; só o alphavantage passa pelo stub)",
+        )
+        parser.add_argument(
+            '--rate-per-minute', type=int, default=0,
+            help="Cota local do provedor durante o ciclo (MARKET_DATA_RATE_PER_MINUTE; 0 desliga)",
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_micro']:
+            self.micro_benchmarks(options['iterations'])
+        if not options['skip_cycle']:
+            self.cycle(options)
+
+    def timeit(self, label, func, iterations):
+        # mediana e p95 por chamada, em microssegundos
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1e6)
+        samples.sort()
+        p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+        self.stdout.write(f"{label:<45} mediana {statistics.median(samples):9.1f}us   p95 {p95:9.1f}us")
+
+    def micro_benchmarks(self, iterations):
+        self.stdout.write("Micro-benchmarks:")
+        ticker = "BENCH000.SA"
+        payload = synthetic_daily_series(ticker)
+        series = payload["Time Series (Daily)"]
+        stock_data = parse_daily_series(ticker, payload)
+        prices = stock_data.closes.tolist()
+        old_PBT = float(stock_data.closes[-1]) * 0.97
+
+        self.timeit("parse_daily_series (100 barras)", lambda: parse_daily_series(ticker, payload), iterations)
+        self.timeit("TimeSeries.from_daily_json", lambda: TimeSeries.from_daily_json(ticker, series), iterations)
+        self.timeit("calculate_volatility", lambda: calculate_volatility(prices), iterations)
+        self.timeit("calculate_limits", lambda: calculate_limits(old_PBT, stock_data), iterations)
+
+        # acerto no cache de cotacoes: a primeira chamada grava, as seguintes leem da memoria do processo
+        # (ou do Redis, depois de QUOTE_CACHE_LOCAL_TTL)
+        quote_cache.invalidate(ticker)
+        quote_cache.get_or_fetch(ticker, lambda name: stock_data)
+        self.timeit("get_stock_data (cache)", lambda: get_stock_data(ticker), iterations)
+        quote_cache.invalidate(ticker)
+
+    def cycle(self, options):
+        stocks = Stock.objects.filter(user__in=bench_users())
+        tickers = list(stocks.values_list('name', flat=True).distinct().order_by())
+        if not tickers:
+            self.stderr.write("Nenhum ativo de teste encontrado, rode seed_benchmark antes.")
+            return
+
+        server = None
+        stub_url = options['stub_url']
+        if not stub_url:
+            server, stub_url = start_server(
+                latency=options['latency'], jitter=options['jitter'],
+                rate_per_minute=options['stub_rate_per_minute'], error_rate=options['error_rate'],
+            )
+
+        # prepara um ciclo em que todos os ativos de teste estao vencidos e nada esta em cache,
+        # com as flags de alerta zeradas pra que as execucoes sejam comparaveis
+        now = timezone.now()
+        stocks.update(next_due_at=now - timedelta(minutes=1), alert_upper_sent=False, alert_lower_sent=False)
+        for ticker in tickers:
+            quote_cache.invalidate(ticker)
+        get_redis().delete(notifications.FLUSH_SCHEDULED_KEY)
+        httpx.post(f"{stub_url}/stats/reset", json={})
+
+        # o Celery roda as tasks no proprio processo; as agendadas com countdown/eta (o digest de emails)
+        # sao guardadas e executadas depois do ciclo, em vez de esperar a janela
+        # cada execucao de task conta como uma mensagem no broker
+        messages = Counter()
+        deferred = []
+        original_apply_async = Task.apply_async
+
+        def apply_async(task, args=None, kwargs=None, **extra):
+            if extra.get('countdown') or extra.get('eta'):
+                deferred.append((task, args, kwargs))
+                return None
+            return original_apply_async(task, args, kwargs, **extra)
+
+        def count_message(sender=None, **kwargs):
+            messages[sender.name] += 1
+
+        old_resend = (resend.api_url, resend.api_key)
+        resend.api_url, resend.api_key = stub_url, resend.api_key or "stub"
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        Task.apply_async = apply_async
+        task_prerun.connect(count_message, weak=False)
+
+        self.stdout.write(f"\nCiclo completo: {stocks.count()} ativos em {len(tickers)} tickers, stub em {stub_url}")
+        try:
+            with override_settings(
+                MARKET_DATA_PROVIDER=options['provider'],
+                MARKET_DATA_URL=f"{stub_url}/query",
+                MARKET_DATA_RATE_PER_MINUTE=options['rate_per_minute'],
+                MARKET_DATA_RATE_PER_DAY=0 if not options['rate_per_minute'] else settings.MARKET_DATA_RATE_PER_DAY,
+            ), CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                check_and_update_stocks_global.delay()
+                dispatch_time = time.perf_counter() - started
+                while deferred:
+                    task, args, kwargs = deferred.pop(0)
+                    original_apply_async(task, args, kwargs)
+                elapsed = time.perf_counter() - started
+        finally:
+            task_prerun.disconnect(count_message)
+            Task.apply_async = original_apply_async
+            current_app.conf.task_always_eager = eager
+            resend.api_url, resend.api_key = old_resend
+
+        stats = httpx.get(f"{stub_url}/stats").json()
+        if server:
+            server.shutdown()
+            server.server_close()
+
+        statements = Counter(sql['sql'].split(None, 1)[0].upper() for sql in queries.captured_queries)
+        alerts = Alert.objects.filter(user__in=bench_users(), timestamp__gte=now).count()
+        updated = stocks.filter(last_updated__gte=now).count()
+
+        self.stdout.write(f"tempo total                  {elapsed:.2f}s (agendador ate o ultimo update {dispatch_time:.2f}s)")
+        self.stdout.write(f"ativos atualizados           {updated}")
+        self.stdout.write(f"alertas disparados           {alerts}")
+        self.stdout.write(
+            f"queries no banco             {len(queries)} ("
+            + ", ".join(f"{kind} {count}" for kind, count in statements.most_common()) + ")"
+        )
+        self.stdout.write(f"mensagens no broker          {sum(messages.values())}")
+        for name, count in messages.most_common():
+            self.stdout.write(f"  {name:<40} {count}")
+        self.stdout.write(
+            f"requests ao provedor         {stats.get('quote_requests', 0)} "
+            f"({stats.get('quote_rate_limited', 0)} barradas pela cota, {stats.get('quote_errors', 0)} com erro)"
+        )
+        self.stdout.write(
+            f"emails enviados              {stats.get('emails', 0)} em {stats.get('email_batches', 0)} lotes"
+        )
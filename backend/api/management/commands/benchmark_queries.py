@@ -0,0 +1,74 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.benchmark import BENCH_TICKERS, bench_users, clear, seed
+from api.models import Alert, Stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a latência das queries mais usadas (listagens, busca por nome, agendador) "
+        "sobre uma base populada com --seed (ou com o comando seed_benchmark)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help="Popula a base com usuários, ativos e alertas de teste antes de medir")
+        parser.add_argument('--clear', action='store_true', help="Só remove os dados de teste criados pelo --seed")
+        parser.add_argument('--users', type=int, default=1000, help="Usuários criados pelo --seed")
+        parser.add_argument('--stocks-per-user', type=int, default=20, help="Ativos por usuário criados pelo --seed")
+        parser.add_argument('--alerts-per-user', type=int, default=200, help="Alertas por usuário criados pelo --seed")
+        parser.add_argument('--repeat', type=int, default=200, help="Execuções de cada query")
+        parser.add_argument('--explain', action='store_true', help="Mostra também o plano de execução de cada query")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f"{clear()} registros de teste removidos.")
+            return
+
+        if options['seed']:
+            users, stocks, alerts = seed(options['users'], options['stocks_per_user'], options['alerts_per_user'])
+            self.stdout.write(f"Base populada: {users} usuários, {stocks} ativos, {alerts} alertas.")
+
+        user_ids = list(bench_users().values_list('id', flat=True))
+        if not user_ids:
+            self.stderr.write("Nenhum dado de teste encontrado, rode com --seed.")
+            return
+
+        rng = random.Random(0)
+        now = timezone.now()
+        queries = [
+            ("stock/list", lambda: list(Stock.objects.filter(user_id=rng.choice(user_ids)))),
+            ("stock por (user, name)", lambda: Stock.objects.filter(
+                user_id=rng.choice(user_ids), name=rng.choice(BENCH_TICKERS)).exists()),
+            ("alert/list (50 mais recentes)", lambda: list(
+                Alert.objects.filter(user_id=rng.choice(user_ids)).order_by('-timestamp')[:50])),
+            ("ativos sem update há 1 dia", lambda: Stock.objects.filter(
+                last_updated__lt=now - timedelta(days=1)).count()),
+            ("tickers vencidos", lambda: list(
+                Stock.objects.filter(Stock.due_filter(now)).values_list('name', flat=True).distinct().order_by())),
+        ]
+
+        self.stdout.write(f"{'query':<32}{'mediana (ms)':>14}{'p95 (ms)':>12}")
+        for label, run in queries:
+            run()  # aquece caches do banco
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(f"{label:<32}{statistics.median(timings):>14.3f}{p95:>12.3f}")
+
+        if options['explain']:
+            user_id = user_ids[0]
+            for label, queryset in [
+                ("stock/list", Stock.objects.filter(user_id=user_id)),
+                ("stock por (user, name)", Stock.objects.filter(user_id=user_id, name=BENCH_TICKERS[0])),
+                ("alert/list", Alert.objects.filter(user_id=user_id).order_by('-timestamp')[:50]),
+                ("ativos sem update há 1 dia", Stock.objects.filter(last_updated__lt=now - timedelta(days=1))),
+            ]:
+                self.stdout.write(f"\n{label}:\n{queryset.explain()}")
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import statistics
+import time
+import httpx
+from django.core.management.base import BaseCommand
+from api import events
+from api.benchmark import bench_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do stream de eventos: abre N conexões SSE contra um processo web rodando, "
+        "publica eventos no Redis e mede quantas conexões ficaram de pé e a latência de entrega "
+        "(usa os usuários criados por seed_benchmark; aumente o ulimit -n pra muitas conexões)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000/api/events/stream/', help="URL do stream de eventos")
+        parser.add_argument('--subscribers', type=int, default=1000, help="Conexões simultâneas")
+        parser.add_argument('--rounds', type=int, default=5, help="Rodadas de eventos publicados (um por usuário por rodada)")
+        parser.add_argument('--interval', type=float, default=1.0, help="Segundos entre as rodadas")
+        parser.add_argument('--connect-timeout', type=float, default=60.0, help="Espera máxima pra todas as conexões abrirem")
+
+    def handle(self, *args, **options):
+        users = list(bench_users().order_by('id')[:options['subscribers']])
+        if not users:
+            self.stderr.write("Nenhum usuário de teste encontrado, rode seed_benchmark antes.")
+            return
+        asyncio.run(self.run(options, [user.id for user in users]))
+
+    async def run(self, options, user_ids):
+        subscribers = options['subscribers']
+        connected = 0
+        all_connected = asyncio.Event()
+        latencies = []
+        failures = []
+
+        async def subscriber(client, user_id):
+            nonlocal connected
+            event = None
+            try:
+                # cada conexao abre com um ticket proprio, como o frontend (o ticket é de uso unico)
+                ticket = await asyncio.to_thread(events.issue_ticket, user_id)
+                async with client.stream('GET', options['url'], params={'ticket': ticket}) as response:
+                    if response.status_code != 200:
+                        failures.append(f"HTTP {response.status_code}")
+                        return
+                    async for line in response.aiter_lines():
+                        if line.startswith('retry:'):
+                            connected += 1
+                            if connected == subscribers:
+                                all_connected.set()
+                        elif line.startswith('event:'):
+                            event = line.split(':', 1)[1].strip()
+                        elif line.startswith('data:') and event == 'loadtest':
+                            sent_at = json.loads(line.split(':', 1)[1])['sent_at']
+                            latencies.append((time.time() - sent_at) * 1000)
+            except (httpx.HTTPError, OSError) as e:
+                failures.append(type(e).__name__)
+
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(timeout=httpx.Timeout(None, connect=30.0), limits=limits) as client:
+            start = time.perf_counter()
+            tasks = [
+                asyncio.create_task(subscriber(client, user_ids[i % len(user_ids)]))
+                for i in range(subscribers)
+            ]
+            try:
+                await asyncio.wait_for(all_connected.wait(), options['connect_timeout'])
+            except asyncio.TimeoutError:
+                pass
+            connect_time = time.perf_counter() - start
+            self.stdout.write(f"{connected}/{subscribers} conexões abertas em {connect_time:.1f}s ({len(failures)} falhas)")
+
+            for round_number in range(options['rounds']):
+                await asyncio.to_thread(events.publish, [
+                    (user_id, 'loadtest', {'sent_at': time.time(), 'round': round_number}) for user_id in user_ids
+                ])
+                await asyncio.sleep(options['interval'])
+            # margem pros ultimos eventos chegarem
+            await asyncio.sleep(max(options['interval'], 2.0))
+
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        expected = connected * options['rounds']
+        self.stdout.write(f"eventos entregues: {len(latencies)}/{expected}")
+        if latencies:
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f"latência (ms): mediana {statistics.median(latencies):.1f}, p95 {p95:.1f}, máx {latencies[-1]:.1f}"
+            )
+        if failures:
+            self.stdout.write(f"falhas: {', '.join(sorted(set(failures)))}")
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.history import load_history, rebuild_stats
+from api.models import Stock, TickerStats
+from utils.finance import rolling_volatility
+
+
+class Command(BaseCommand):
+    help = "Recalcula do zero o estado de volatilidade dos tickers monitorados (ou só compara, com --check)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help="Tickers a recalcular (padrão: todos os monitorados)")
+        parser.add_argument('--check', action='store_true', help="Só compara o estado salvo com o recálculo completo")
+        parser.add_argument('--tolerance', type=float, default=1e-6, help="Diferença máxima aceita na volatilidade (em %%)")
+
+    def handle(self, *args, **options):
+        names = options['tickers'] or list(
+            Stock.objects.filter(fake=False).values_list('name', flat=True).distinct().order_by()
+        )
+        drifted = 0
+        for name in names:
+            dates, prices = load_history(name, settings.VOLATILITY_WINDOW)
+            if not prices:
+                self.stderr.write(f"Nenhum histórico local para {name}.")
+                continue
+
+            stats = TickerStats.objects.filter(name=name).first() or TickerStats(name=name)
+            saved = rolling_volatility(stats.count, stats.mean, stats.m2) if stats.pk else None
+
+            stats.window = settings.VOLATILITY_WINDOW
+            rebuild_stats(stats, dates, prices)
+            full = rolling_volatility(stats.count, stats.mean, stats.m2)
+
+            if saved is not None and abs(saved - full) > options['tolerance']:
+                drifted += 1
+                self.stdout.write(f"{name}: incremental={saved:.8f}% completo={full:.8f}%")
+
+            if not options['check']:
+                stats.save()
+
+        self.stdout.write(f"{len(names)} tickers verificados, {drifted} com divergência.")
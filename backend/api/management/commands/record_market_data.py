@@ -0,0 +1,75 @@
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmark import synthetic_daily_series
+from api.models import Stock
+from utils.providers import YFinanceProvider, replay_path, restart_replay, series_from_frame
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava séries diárias em MARKET_DATA_REPLAY_DIR pro provedor replay "
+        "(MARKET_DATA_PROVIDER=replay), baixando do yfinance ou gerando séries sintéticas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help="Tickers a gravar (padrão: todos os monitorados)")
+        parser.add_argument('--source', choices=['yfinance', 'synthetic'], default='yfinance')
+        parser.add_argument('--period', default='2y', help="Período baixado do yfinance (ex.: 1y, 5y, max)")
+        parser.add_argument('--bars', type=int, default=500, help="Barras de cada série sintética")
+        parser.add_argument('--seed', type=int, default=0, help="Semente das séries sintéticas")
+        parser.add_argument('--dir', default=settings.MARKET_DATA_REPLAY_DIR, help="Diretório das gravações")
+        parser.add_argument('--restart-clock', action='store_true', help="Volta o relógio do replay pro início")
+
+    def handle(self, *args, **options):
+        names = options['tickers'] or list(
+            Stock.objects.filter(fake=False).values_list('name', flat=True).distinct().order_by()
+        )
+        try:
+            paths = {name: replay_path(options['dir'], name) for name in names}
+        except ValueError as e:
+            raise CommandError(str(e))
+        os.makedirs(options['dir'], exist_ok=True)
+
+        if options['source'] == 'synthetic':
+            recordings = {
+                name: synthetic_daily_series(name, bars=options['bars'], seed=options['seed']) for name in names
+            }
+        else:
+            recordings = self.download(names, options['period'])
+
+        for name, payload in recordings.items():
+            with open(paths[name], 'w') as file:
+                json.dump(payload, file)
+        self.stdout.write(f"{len(recordings)} de {len(names)} tickers gravados em {options['dir']}.")
+
+        if options['restart_clock']:
+            restart_replay()
+            self.stdout.write("Relógio do replay reiniciado.")
+
+    def download(self, names, period):
+        # import tardio, como no provedor
+        import yfinance
+
+        recordings = {}
+        batch_size = YFinanceProvider().batch_size
+        for i in range(0, len(names), batch_size):
+            chunk = names[i:i + batch_size]
+            frame = yfinance.download(
+                chunk, period=period, interval='1d', group_by='ticker', auto_adjust=False,
+                actions=False, threads=True, progress=False,
+            )
+            for name in chunk:
+                try:
+                    series = series_from_frame(name, frame[name] if frame.columns.nlevels > 1 else frame, bars=None)
+                except (KeyError, ValueError):
+                    series = None
+                if series is None:
+                    self.stderr.write(f"Sem dados para {name}.")
+                    continue
+                recordings[name] = {
+                    "Meta Data": {"2. Symbol": name},
+                    "Time Series (Daily)": series.to_daily_json(),
+                }
+        return recordings
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api import scheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Agendador por vencimento (UPDATE_SCHEDULER=due): libera cada ativo na fila de atualização "
+        "no próprio vencimento, no lugar do ciclo de minuto do Celery Beat"
+    )
+
+    def handle(self, *args, **options):
+        if settings.UPDATE_SCHEDULER != 'due':
+            self.stderr.write(
+                "UPDATE_SCHEDULER não é 'due': o Celery Beat também vai disparar o ciclo de minuto."
+            )
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula a base com usuários, ativos e alertas sintéticos pros benchmarks "
+        "(benchmark_queries, benchmark_cycle e loadtest_events)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help="Usuários criados")
+        parser.add_argument('--stocks-per-user', type=int, default=20, help="Ativos por usuário")
+        parser.add_argument('--alerts-per-user', type=int, default=200, help="Alertas por usuário")
+        parser.add_argument('--tickers', type=int, default=benchmark.DEFAULT_TICKERS, help="Tickers distintos entre os ativos")
+        parser.add_argument('--seed', type=int, default=42, help="Semente do gerador, pra repetir a mesma base")
+        parser.add_argument('--clear', action='store_true', help="Só remove os dados de teste")
+        parser.add_argument('--reset', action='store_true', help="Remove os dados de teste antes de popular")
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['reset']:
+            deleted = benchmark.clear()
+            self.stdout.write(f"{deleted} registros de teste removidos.")
+            if options['clear']:
+                return
+
+        users, stocks, alerts = benchmark.seed(
+            options['users'], options['stocks_per_user'], options['alerts_per_user'],
+            tickers=options['tickers'], rng_seed=options['seed'],
+        )
+        self.stdout.write(f"Base populada: {users} usuários, {stocks} ativos, {alerts} alertas.")
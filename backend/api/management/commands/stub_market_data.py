@@ -0,0 +1,158 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from django.core.management.base import BaseCommand
+from api.benchmark import synthetic_daily_series
+
+
+class StubState:
+    # configuracao e contadores compartilhados pelas threads do servidor
+    def __init__(self, latency=0.0, jitter=0.0, rate_per_minute=0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_per_minute = rate_per_minute
+        self.error_rate = error_rate
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = deque()  # horarios das ultimas requests de cotacao, pra simular a cota por minuto
+        self.counters = Counter()
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.recent.clear()
+
+    def over_quota(self):
+        if not self.rate_per_minute:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] >= 60:
+                self.recent.popleft()
+            if len(self.recent) >= self.rate_per_minute:
+                return True
+            self.recent.append(now)
+            return False
+
+    def delay(self):
+        with self.lock:
+            extra = self.rng.uniform(0, self.jitter) if self.jitter else 0
+            failed = self.error_rate and self.rng.random() < self.error_rate
+        time.sleep(self.latency + extra)
+        return failed
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 pra o httpx reaproveitar as conexoes como faria com o provedor de verdade
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/stats':
+                return self.send_json(200, state.stats())
+            if url.path != '/query':
+                return self.send_json(404, {"error": "not found"})
+
+            # mesmo formato do TIME_SERIES_DAILY do Alpha Vantage, incluindo os avisos de cota e de erro
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            symbol = params.get('symbol', '')
+            state.count('quote_requests')
+            if state.over_quota():
+                state.count('quote_rate_limited')
+                return self.send_json(200, {"Note": (
+                    "Thank you for using Alpha Vantage! Our standard API call frequency is "
+                    f"{state.rate_per_minute} calls per minute and 500 calls per day."
+                )})
+            if state.delay():
+                state.count('quote_errors')
+                return self.send_json(500, {"error": "stub failure"})
+            if params.get('function') != 'TIME_SERIES_DAILY' or not symbol:
+                return self.send_json(200, {"Error Message": "Invalid API call."})
+            bars = 100 if params.get('outputsize', 'compact') == 'compact' else 1000
+            return self.send_json(200, synthetic_daily_series(symbol, bars=bars, seed=state.seed))
+
+        def do_POST(self):
+            # imita o Resend (resend.api_url apontando pra ca): so conta os emails e devolve ids
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'null')
+            if url.path == '/stats/reset':
+                state.reset()
+                return self.send_json(200, {})
+            if url.path == '/emails/batch':
+                state.count('email_batches')
+                state.count('emails', len(payload or []))
+                return self.send_json(200, {"data": [{"id": f"stub-{i}"} for i in range(len(payload or []))]})
+            if url.path == '/emails':
+                state.count('emails')
+                return self.send_json(200, {"id": "stub"})
+            return self.send_json(404, {"error": "not found"})
+
+    return Handler
+
+
+def start_server(host='127.0.0.1', port=0, **options):
+    # sobe o servidor numa thread e devolve (servidor, url base); usado pelo benchmark_cycle
+    server = ThreadingHTTPServer((host, port), make_handler(StubState(**options)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-market-data", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Sobe um servidor local que imita o Alpha Vantage (TIME_SERIES_DAILY em /query, com latência, "
+        "cota e erros configuráveis) e o Resend (/emails e /emails/batch); aponte MARKET_DATA_URL e "
+        "RESEND_API_URL pra ele. GET /stats devolve os contadores"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.05, help="Segundos de latência por request")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Segundos aleatórios somados à latência")
+        parser.add_argument('--rate-per-minute', type=int, default=0, help="Cota por minuto (0 desliga)")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fração das requests que devolve 500")
+        parser.add_argument('--seed', type=int, default=0, help="Semente das séries sintéticas")
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(
+            (options['host'], options['port']),
+            make_handler(StubState(
+                latency=options['latency'], jitter=options['jitter'], rate_per_minute=options['rate_per_minute'],
+                error_rate=options['error_rate'], seed=options['seed'],
+            )),
+        )
+        server.daemon_threads = True
+        self.stdout.write(f"Stub do provedor em http://{options['host']}:{server.server_address[1]}/query")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Código do ativo, ex.: ITUB4.SA', max_length=20)),
+                ('periodicity', models.PositiveIntegerField(help_text='Frequência (em minutos) para verificação')),
+                ('current_price', models.DecimalField(decimal_places=40, help_text='Cotação atual', max_digits=100)),
+                ('lower_limit', models.DecimalField(decimal_places=40, help_text='Limite inferior do túnel de preço', max_digits=100)),
+                ('upper_limit', models.DecimalField(decimal_places=40, help_text='Limite superior do túnel de preço', max_digits=100)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('fake', models.BooleanField(default=False)),
+                ('alert_upper_sent', models.BooleanField(default=False)),
+                ('alert_lower_sent', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocks', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_name', models.CharField(blank=True, max_length=20, null=True)),
+                ('alert_type', models.CharField(choices=[('buy_suggestion', 'Buy Suggestion'), ('sell_suggestion', 'Sell Suggestion'), ('addition', 'Addition'), ('removal', 'Removal'), ('edition', 'Edition')], max_length=20)),
+                ('timestamp', models.DateTimeField()),
+                ('stock', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='api.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        # ativos que ja existiam ficam com next_due_at vazio e contam como vencidos no primeiro ciclo
+        migrations.AddField(
+            model_name='stock',
+            name='next_due_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['next_due_at', 'name'], name='stock_next_due_idx'),
+        ),
+    ]
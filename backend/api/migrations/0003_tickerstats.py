@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_stock_next_due_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TickerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Código do ativo, ex.: ITUB4.SA', max_length=20, unique=True)),
+                ('window', models.PositiveIntegerField(help_text='Quantidade de fechamentos considerados na volatilidade')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('mean', models.FloatField(default=0)),
+                ('m2', models.FloatField(default=0)),
+                ('first_price', models.FloatField(blank=True, help_text='Fechamento mais antigo da janela (o próximo a sair)', null=True)),
+                ('last_date', models.DateField(blank=True, help_text='Data da última barra incluída na janela', null=True)),
+                ('last_price', models.FloatField(blank=True, help_text='Fechamento da última barra incluída na janela', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
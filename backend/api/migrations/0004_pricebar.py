@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_tickerstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Código do ativo, ex.: ITUB4.SA', max_length=20)),
+                ('date', models.DateField()),
+                ('close', models.FloatField()),
+                ('volume', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('name', 'date'), name='pricebar_name_date_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:28
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_stocks(apps, schema_editor):
+    # antes do unique um usuario podia ter o mesmo ticker duas vezes: fica o mais antigo
+    # (menor id), os alertas dos outros passam pra ele e os outros sao apagados
+    Stock = apps.get_model('api', 'Stock')
+    Alert = apps.get_model('api', 'Alert')
+    duplicates = (
+        Stock.objects.values('user_id', 'name')
+        .annotate(keep=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        others = Stock.objects.filter(user_id=row['user_id'], name=row['name']).exclude(id=row['keep'])
+        Alert.objects.filter(stock__in=others).update(stock_id=row['keep'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_pricebar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # os precos antigos (100 digitos, 40 casas) sao arredondados pra 4 casas, a precisao dos limites
+        migrations.AlterField(
+            model_name='stock',
+            name='current_price',
+            field=models.DecimalField(decimal_places=4, help_text='Cotação atual', max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='stock',
+            name='lower_limit',
+            field=models.DecimalField(decimal_places=4, help_text='Limite inferior do túnel de preço', max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='stock',
+            name='upper_limit',
+            field=models.DecimalField(decimal_places=4, help_text='Limite superior do túnel de preço', max_digits=12),
+        ),
+        migrations.RunPython(merge_duplicate_stocks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stock',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='stock_user_name_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['last_updated'], name='stock_last_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['user', '-timestamp'], name='alert_user_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_stock_decimal_prices_and_indexes'),
+    ]
+
+    operations = [
+        # a paginacao por cursor ordena por (-timestamp, -id), entao o id entra no fim do indice
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='alert_user_timestamp_idx',
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='alert_user_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_alert_user_timestamp_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stock',
+            name='current_price',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Cotação atual', max_digits=12, null=True),
+        ),
+        migrations.AlterField(
+            model_name='stock',
+            name='lower_limit',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Limite inferior do túnel de preço', max_digits=12, null=True),
+        ),
+        migrations.AlterField(
+            model_name='stock',
+            name='upper_limit',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Limite superior do túnel de preço', max_digits=12, null=True),
+        ),
+        # os ativos que ja existiam tem o tunel calculado, entao entram como prontos
+        migrations.AddField(
+            model_name='stock',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='stock',
+            name='status_message',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_stock_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='periodicity_seconds',
+            field=models.PositiveIntegerField(blank=True, help_text='Frequência em segundos; quando preenchida substitui a periodicidade em minutos', null=True),
+        ),
+    ]
@@ -1,21 +1,99 @@
+import math
+import zlib
+from datetime import datetime
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Stock(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stocks')
     name = models.CharField(max_length=20, help_text="Código do ativo, ex.: ITUB4.SA")
     periodicity = models.PositiveIntegerField(help_text="Frequência (em minutos) para verificação")
-    current_price = models.DecimalField(max_digits=100, decimal_places=40, help_text="Cotação atual")
-    lower_limit = models.DecimalField(max_digits=100, decimal_places=40, help_text="Limite inferior do túnel de preço")
-    upper_limit = models.DecimalField(max_digits=100, decimal_places=40, help_text="Limite superior do túnel de preço")
+    # periodicidades abaixo de um minuto (so com o agendador por vencimento, UPDATE_SCHEDULER=due)
+    periodicity_seconds = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Frequência em segundos; quando preenchida substitui a periodicidade em minutos",
+    )
+    # precos com 4 casas decimais, a mesma precisao dos limites calculados em utils.finance
+    # ficam vazios enquanto o primeiro calculo do tunel (api.tasks.compute_stock_limits) nao termina
+    current_price = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, help_text="Cotação atual")
+    lower_limit = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, help_text="Limite inferior do túnel de preço")
+    upper_limit = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True, help_text="Limite superior do túnel de preço")
+    # pending: o tunel esta sendo calculado em background; failed: o calculo nao conseguiu a cotacao
+    # so os ativos prontos entram no agendamento das atualizacoes
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_READY)
+    status_message = models.CharField(max_length=255, blank=True, default='')
     last_updated = models.DateTimeField(auto_now=True)
     fake = models.BooleanField(default=False)
     alert_upper_sent = models.BooleanField(default=False)
     alert_lower_sent = models.BooleanField(default=False)
+    # quando o ativo volta a precisar de atualizacao (last_updated + periodicity),
+    # guardado no banco pro agendador achar os ativos vencidos numa unica query indexada
+    next_due_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # o unique de (user, name) tambem serve de indice pras buscas do ativo pelo nome na conta do usuario
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='stock_user_name_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['next_due_at', 'name'], name='stock_next_due_idx'),
+            models.Index(fields=['last_updated'], name='stock_last_updated_idx'),
+            # os limites do tunel por ticker: a busca dos tuneis cruzados por um preco novo é uma
+            # busca por faixa nesses indices, entao so as linhas cruzadas sao lidas
+            models.Index(fields=['name', 'upper_limit'], name='stock_name_upper_idx'),
+            models.Index(fields=['name', 'lower_limit'], name='stock_name_lower_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.user.username}"
 
+    @staticmethod
+    def due_filter(now):
+        # ativos sem next_due_at ainda nao foram agendados, entao tambem contam como vencidos
+        # os que ainda nao tem tunel calculado (pending/failed) ficam de fora
+        return (Q(next_due_at__lte=now) | Q(next_due_at__isnull=True)) & Q(status=Stock.STATUS_READY)
+
+    def period_seconds(self):
+        return self.periodicity_seconds or self.periodicity * 60
+
+    def schedule_next_update(self):
+        # o vencimento cai na grade do ativo (instantes k * periodo + fase), com a fase fixa por ativo e
+        # derivada do id: ativos com a mesma periodicidade vencem espalhados ao longo do periodo em vez
+        # de todos no mesmo segundo. é o primeiro instante da grade a partir de last_updated + periodo,
+        # entao o ativo nunca vence antes de completar o periodo (e no maximo dois periodos depois)
+        base = self.last_updated or timezone.now()
+        period = self.period_seconds()
+        target = base.timestamp() + period
+        if self.pk:
+            phase = zlib.crc32(str(self.pk).encode()) % (period * 1000) / 1000
+            # o arredondamento em milissegundos evita pular um periodo inteiro por erro de ponto flutuante
+            target = math.ceil(round((target - phase) / period, 6)) * period + phase
+        self.next_due_at = datetime.fromtimestamp(target, tz=base.tzinfo)
+
+    def save(self, *args, **kwargs):
+        # last_updated é auto_now, entao todo save conta como uma verificacao e reagenda o ativo
+        self.last_updated = timezone.now()
+        self.schedule_next_update()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'next_due_at'}
+        created = self.pk is None
+        super().save(*args, **kwargs)
+        if created:
+            # a fase depende do id, que so existe depois do INSERT
+            self.schedule_next_update()
+            Stock.objects.filter(pk=self.pk).update(next_due_at=self.next_due_at)
+
 
 class Alert(models.Model): 
     ALERT_CHOICES = [
@@ -32,6 +110,44 @@ class Alert(models.Model):
     alert_type = models.CharField(max_length=20, choices=ALERT_CHOICES)
     timestamp = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='alert_user_timestamp_idx'),
+        ]
+
     def __str__(self):
         stock_info = self.stock.name if self.stock else (self.asset_name or "Ativo não especificado")
-        return f"{self.get_alert_type_display()} para {stock_info} em {self.timestamp:%d/%m/%Y %H:%M:%S}"
\ No newline at end of file
+        return f"{self.get_alert_type_display()} para {stock_info} em {self.timestamp:%d/%m/%Y %H:%M:%S}"
+
+class TickerStats(models.Model):
+    # estado incremental da volatilidade de um ticker (compartilhado por todos os usuarios que o monitoram)
+    # guarda count, media e M2 da janela deslizante dos ultimos `window` fechamentos
+    name = models.CharField(max_length=20, unique=True, help_text="Código do ativo, ex.: ITUB4.SA")
+    window = models.PositiveIntegerField(help_text="Quantidade de fechamentos considerados na volatilidade")
+    count = models.PositiveIntegerField(default=0)
+    mean = models.FloatField(default=0)
+    m2 = models.FloatField(default=0)
+    first_price = models.FloatField(null=True, blank=True, help_text="Fechamento mais antigo da janela (o próximo a sair)")
+    last_date = models.DateField(null=True, blank=True, help_text="Data da última barra incluída na janela")
+    last_price = models.FloatField(null=True, blank=True, help_text="Fechamento da última barra incluída na janela")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.count}/{self.window})"
+
+
+class PriceBar(models.Model):
+    # historico local de fechamentos diarios por ticker, alimentado incrementalmente a cada fetch
+    # assim o historico sobrevive a quedas do provedor e nao precisa ser baixado inteiro de novo
+    name = models.CharField(max_length=20, help_text="Código do ativo, ex.: ITUB4.SA")
+    date = models.DateField()
+    close = models.FloatField()
+    volume = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'date'], name='pricebar_name_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} {self.date:%d/%m/%Y}: {self.close}"
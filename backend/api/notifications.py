@@ -0,0 +1,119 @@
+import json
+import time
+from django.conf import settings
+from utils.redis_client import get_redis
+
+# fila de emails de alerta
+# os alertas nao sao mais enviados dentro da atualizacao dos ativos: cada alerta entra numa lista
+# por usuario no Redis e uma task na fila "emails" junta tudo que chegou dentro da janela
+# NOTIFICATION_DIGEST_WINDOW num unico email por usuario, enviando os emails em lote pelo Resend
+
+EMAIL_SENDER = "no-reply@b3notifier.me"
+PENDING_USERS_KEY = "notifications:users"
+FLUSH_SCHEDULED_KEY = "notifications:flush-scheduled"
+
+
+def _pending_key(user_id):
+    return f"notifications:pending:{user_id}"
+
+
+def push_alert(stock, alert_type):
+    # guarda o alerta pro proximo digest do usuario
+    # devolve True quando abriu uma janela nova, e entao quem chamou precisa agendar o envio
+    item = {
+        'name': stock.name,
+        'alert_type': alert_type,
+        'current_price': float(stock.current_price),
+        'limit': float(stock.upper_limit if alert_type == 'upper' else stock.lower_limit),
+        'queued_at': time.time(),
+    }
+    client = get_redis()
+    pipe = client.pipeline(transaction=True)
+    pipe.rpush(_pending_key(stock.user_id), json.dumps(item))
+    pipe.sadd(PENDING_USERS_KEY, stock.user_id)
+    pipe.execute()
+    # a flag expira sozinha, entao se o envio agendado se perder a proxima janela agenda outro
+    window = settings.NOTIFICATION_DIGEST_WINDOW
+    return bool(client.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=window * 2 + 60))
+
+
+def drain_pending():
+    # tira da fila todos os alertas pendentes, devolve {user_id: [alertas em ordem de chegada]}
+    client = get_redis()
+    # liberamos a flag antes de ler, assim um alerta que chegar durante o envio agenda outra janela
+    client.delete(FLUSH_SCHEDULED_KEY)
+    pending = {}
+    for raw_user_id in client.smembers(PENDING_USERS_KEY):
+        user_id = int(raw_user_id)
+        pipe = client.pipeline(transaction=True)
+        pipe.lrange(_pending_key(user_id), 0, -1)
+        pipe.delete(_pending_key(user_id))
+        pipe.srem(PENDING_USERS_KEY, raw_user_id)
+        items, _, _ = pipe.execute()
+        if items:
+            pending[user_id] = [json.loads(item) for item in items]
+    return pending
+
+
+def _format_price(value):
+    # formata com duas casas decimais e virgula no lugar do ponto
+    return f"{value:.2f}".replace('.', ',')
+
+
+def _alert_paragraph(item):
+    if item['alert_type'] == 'upper':
+        return (
+            f"<p>O ativo <strong>{item['name']}</strong> atingiu o limite superior de "
+            f"<strong>{_format_price(item['limit'])}</strong>.<br>"
+            f"Sua cotação atual é <strong>{_format_price(item['current_price'])}</strong>.<br>"
+            f"Recomendamos que você avalie a venda deste ativo.</p>"
+        )
+    return (
+        f"<p>O ativo <strong>{item['name']}</strong> atingiu o limite inferior de "
+        f"<strong>{_format_price(item['limit'])}</strong>.<br>"
+        f"Sua cotação atual é <strong>{_format_price(item['current_price'])}</strong>.<br>"
+        f"Recomendamos que você avalie a compra deste ativo.</p>"
+    )
+
+
+def build_email(user, items):
+    # monta o email de um usuario; com um unico alerta fica igual ao email individual de antes
+    if len(items) == 1:
+        item = items[0]
+        action = "Vender" if item['alert_type'] == 'upper' else "Comprar"
+        subject = f"Recomendação: {action} {item['name']}"
+    else:
+        subject = f"Recomendações: {len(items)} ativos atingiram seus limites"
+
+    html_message = (
+        f"<p>Olá, {user.username}!</p>"
+        + "".join(_alert_paragraph(item) for item in items)
+        + "<p>Atenciosamente,<br>B3Notifier</p>"
+    )
+    return {
+        "from": EMAIL_SENDER,
+        "to": user.email,
+        "subject": subject,
+        "html": html_message,
+    }
+
+
+def build_otp_email(email, otp_code, user_exists):
+    # email com o codigo de verificacao do cadastro
+    message = (
+        f"Seu código de verificação é: <strong>{otp_code}</strong><br><br>"
+    )
+    if user_exists:
+        message += (
+            "Já existe uma conta com este e-mail. Após verificar o código, "
+            "você poderá atualizar seu nome de usuário e senha."
+        )
+    else:
+        message += "Use este código para continuar o cadastro da sua conta."
+
+    return {
+        "from": EMAIL_SENDER,
+        "to": email,
+        "subject": "Código de Verificação",
+        "html": f"<p>{message}</p>",
+    }
@@ -0,0 +1,102 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# paginacao por chave (keyset) pras listagens
+# em vez de OFFSET, o cursor guarda os valores da ordenacao da ultima linha da pagina e a proxima
+# pagina filtra "depois dessa linha", entao o custo de cada pagina nao cresce com a posicao e
+# linhas inseridas enquanto o usuario navega nao fazem itens repetirem ou sumirem
+# a ordenacao precisa terminar num campo unico (o id) pra desempatar linhas com o mesmo valor
+
+
+class KeysetPagination(BasePagination):
+    page_size = 100
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    # a view pode trocar a ordenacao com o atributo keyset_ordering
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(queryset.model, self.decode_cursor(cursor)))
+
+        # uma linha a mais so pra saber se existe proxima pagina
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.last_values = [self.value_of(rows[-1], field) for field in self.ordering] if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def after(self, model, values):
+        # condicao "depois da linha com esses valores" na ordem lexicografica da ordenacao:
+        # (a > x) OR (a = x AND b > y) OR ...
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            try:
+                value = model._meta.get_field(name).to_python(value)
+            except ValidationError:
+                raise NotFound("Cursor inválido.")
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    @staticmethod
+    def value_of(row, field):
+        value = getattr(row, field.lstrip('-'))
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    def encode_cursor(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise NotFound("Cursor inválido.")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound("Cursor inválido.")
+        return values
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_values))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.db.models import F, FloatField, Min, Value
+from django.db.models.functions import Abs, Cast, Least, NullIf
+from api.models import Stock
+from utils.redis_client import get_redis
+
+# fila de prioridade dos tickers vencidos (sorted set no Redis, maior score sai primeiro)
+# a cota do provedor é curta, entao quando nao da pra atualizar tudo no ciclo vao primeiro
+# os tickers mais atrasados e os que estao com o preco mais perto de algum limite
+
+QUEUE_KEY = "market-data:refresh-queue"
+
+
+def due_ticker_priorities(now, ids=None, names=None):
+    # calcula no banco, numa unica query agrupada por ticker, o atraso e a proximidade dos limites
+    # `ids` restringe a conta a esses ativos (os liberados pelo agendador por vencimento)
+    # e `names` aos ativos vencidos desses tickers
+    due = Stock.objects.filter(Stock.due_filter(now))
+    if ids is not None:
+        due = due.filter(id__in=ids)
+    if names is not None:
+        due = due.filter(name__in=names)
+    rows = (
+        due
+        .values('name')
+        .annotate(
+            oldest_due=Min('next_due_at'),
+            # distancia relativa do preco ao limite mais proximo, no ativo mais perto de disparar
+            closeness=Min(
+                Cast(
+                    Least(
+                        Abs(F('current_price') - F('upper_limit')),
+                        Abs(F('current_price') - F('lower_limit')),
+                    ),
+                    FloatField(),
+                ) / NullIf(Cast(F('current_price'), FloatField()), Value(0.0))
+            ),
+        )
+        .order_by()
+    )
+
+    priorities = {}
+    for row in rows:
+        overdue_minutes = (now - row['oldest_due']).total_seconds() / 60 if row['oldest_due'] else 0
+        # proximidade em minutos de atraso equivalentes: no limite vale o peso inteiro, 1% longe vale metade
+        proximity = 0
+        if row['closeness'] is not None:
+            proximity = settings.MARKET_DATA_PROXIMITY_WEIGHT / (1 + float(row['closeness']) * 100)
+        priorities[row['name']] = max(overdue_minutes, 0) + proximity
+    return priorities
+
+
+def replace_queue(priorities):
+    # troca a fila inteira de uma vez, assim ela sempre reflete os tickers vencidos do ciclo atual
+    pipe = get_redis().pipeline(transaction=True)
+    pipe.delete(QUEUE_KEY)
+    if priorities:
+        pipe.zadd(QUEUE_KEY, priorities)
+    pipe.execute()
+
+
+def pop(count):
+    # tira da fila os `count` tickers mais prioritarios, devolve {ticker: score}
+    return {name.decode(): score for name, score in get_redis().zpopmax(QUEUE_KEY, count)}
+
+
+def push(priorities):
+    # devolve pra fila tickers que nao couberam na cota
+    if priorities:
+        get_redis().zadd(QUEUE_KEY, priorities)
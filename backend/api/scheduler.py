@@ -0,0 +1,81 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+import redis
+from django.conf import settings
+from django.db import DatabaseError
+from api import due_index, refresh_queue
+from api.tasks import drain_refresh_queue
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# agendador por vencimento (UPDATE_SCHEDULER=due), no lugar do check_and_update_stocks_global do beat
+# em vez de juntar todos os ativos vencidos no segundo 0 de cada minuto, um processo acorda a cada
+# SCHEDULER_TICK segundos e libera so os ativos que venceram desde a ultima volta, que entram na mesma
+# fila de prioridade e passam pelo mesmo drain_refresh_queue (cota do provedor, lotes e cache)
+#
+# os vencimentos ja vem espalhados pela fase de cada ativo (Stock.schedule_next_update), entao as
+# atualizacoes saem num fluxo continuo ao longo do minuto e periodicidades em segundos funcionam
+
+
+def tick(now):
+    # libera os ativos vencidos ate `now` (epoch) e devolve quantos foram liberados
+    claimed = due_index.claim(now, settings.SCHEDULER_BATCH_SIZE)
+    if not claimed:
+        return 0
+
+    for due in claimed.values():
+        metrics.SCHEDULER_RELEASE_DELAY_SECONDS.observe(max(now - due, 0))
+    metrics.SCHEDULER_STOCKS_RELEASED.inc(len(claimed))
+
+    # o indice pode estar velho (ativo apagado, reagendado ou ainda pendente), entao a fila so recebe
+    # os tickers dos ativos que continuam vencidos no banco, e o drain so é disparado se sobrou algum
+    priorities = refresh_queue.due_ticker_priorities(datetime.fromtimestamp(now, timezone.utc), ids=list(claimed))
+    if priorities:
+        refresh_queue.push(priorities)
+        drain_refresh_queue.delay()
+    logger.debug(
+        "%s ativos liberados, %s tickers na fila.", len(claimed), len(priorities),
+        extra={'stocks': len(claimed), 'tickers': len(priorities)},
+    )
+    return len(claimed)
+
+
+def run(stop=None):
+    # loop do agendador; `stop` (threading.Event) encerra o loop
+    # o indice é recarregado do banco a cada SCHEDULER_RESYNC_INTERVAL, com os ativos que vencem
+    # ate a proxima recarga (mais uma folga), assim escritas que nao passaram pelo due_index.schedule
+    # entram com atraso de no maximo um intervalo
+    interval = settings.SCHEDULER_TICK
+    resync_every = settings.SCHEDULER_RESYNC_INTERVAL
+    last_resync = None
+    next_tick = time.monotonic()
+    logger.info("Agendador por vencimento iniciado (tick de %ss).", interval, extra={'tick': interval})
+
+    while stop is None or not stop.is_set():
+        now = time.time()
+        try:
+            if last_resync is None or now - last_resync >= resync_every:
+                until = datetime.fromtimestamp(now, timezone.utc) + timedelta(seconds=resync_every * 2)
+                loaded = due_index.resync(until)
+                last_resync = now
+                logger.info("Índice de vencimentos recarregado: %s ativos.", loaded, extra={'stocks': loaded})
+            released = tick(now)
+        except (redis.RedisError, DatabaseError) as e:
+            logger.warning("Erro no agendador, tentando de novo no próximo tick: %s", e)
+            released = 0
+
+        # com o lote cheio ainda ha ativos vencidos (por exemplo depois de uma parada), entao nao dorme
+        if released >= settings.SCHEDULER_BATCH_SIZE:
+            continue
+        next_tick += interval
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+        else:
+            # o tick atrasou (banco ou Redis lento): recomeca a contagem a partir de agora
+            next_tick = time.monotonic()
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.core.cache import cache
 
+OTP_TIMEOUT = 300  # o codigo OTP expira em 5 min
+
 class EmailSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
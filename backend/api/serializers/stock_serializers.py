@@ -1,7 +1,40 @@
+from django.conf import settings
 from rest_framework import serializers
 from api.models import Stock
 
 class StockSerializer(serializers.ModelSerializer):
     class Meta:
         model = Stock
-        fields = ['id', 'name', 'periodicity', 'current_price', 'lower_limit', 'upper_limit']
+        fields = [
+            'id', 'name', 'periodicity', 'periodicity_seconds', 'current_price', 'lower_limit', 'upper_limit',
+            'status', 'status_message',
+        ]
+        read_only_fields = ['status', 'status_message']
+        extra_kwargs = {'periodicity': {'required': False}}
+
+    def validate_periodicity_seconds(self, value):
+        # so o agendador por vencimento consegue liberar um ativo no meio do minuto
+        if value is None:
+            return value
+        if settings.UPDATE_SCHEDULER != 'due':
+            raise serializers.ValidationError("Periodicidade em segundos requer o agendador por vencimento.")
+        # periodos abaixo do QUOTE_CACHE_TTL funcionam: a atualizacao recusa cotacoes em cache mais velhas que o periodo
+        minimum = settings.SCHEDULER_MIN_PERIOD_SECONDS
+        if value < minimum:
+            raise serializers.ValidationError(f"A periodicidade mínima é de {minimum} segundos.")
+        return value
+
+    def validate(self, attrs):
+        # a periodicidade em minutos continua obrigatoria, a nao ser que venha a em segundos
+        # (nesse caso ela guarda o equivalente arredondado pra cima, pra quem so le os minutos)
+        seconds = attrs.get('periodicity_seconds')
+        if seconds:
+            attrs['periodicity'] = minutes_for(seconds)
+        elif self.instance is None and not attrs.get('periodicity'):
+            raise serializers.ValidationError({'periodicity': "Este campo é obrigatório."})
+        return attrs
+
+
+def minutes_for(seconds):
+    # periodicidade em minutos equivalente a uma em segundos, arredondada pra cima
+    return -(-seconds // 60)
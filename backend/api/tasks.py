@@ -1,202 +1,439 @@
-import os
 import logging
-from celery import shared_task
+import os
+import time
+from datetime import timedelta
+from celery import shared_task, group
+from django.conf import settings
 from django.utils import timezone
-from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from api.models import Stock
-from utils.finance import get_stock_data, calculate_limits
+from api.history import refresh_histories, refresh_history
+from api import alert_transitions, dashboard, due_index, events, notifications, refresh_queue
+from utils.finance import (
+    get_stock_data, get_many_stock_data, calculate_limits, needs_update, calculate_limits_batch, UPDATE_PERCENTAGE,
+)
+from utils import metrics
+from utils.providers import get_provider
+from utils.rate_limit import Throttled
+from utils.quote_cache import get_cached
 from dotenv import load_dotenv
 import resend
-from api.models import Alert
+from api.serializers.otp_serializers import OTP_TIMEOUT
 
 load_dotenv()
 resend.api_key = os.getenv("RESEND_API_KEY")
 
-User = get_user_model() # pega o model de usuario do Django para as taks serem por usuario
+logger = logging.getLogger(__name__)
+
 # essas tarefas sao executadas periodicamente pelo Celery, assim a gente garante que os ativos vao estar sempre atualizados
 # importante destacar que ate agora estou usando o Redis como broker
 
 def send_stock_notification(stock, alert_type):
-    # envia um email para usuario de alerta de compra ou venda
-    user_email = stock.user.email
-    user_name = stock.user.username
-
-    if alert_type == 'upper':
-        subject = f"Recomendação: Vender {stock.name}"
-        html_message = (
-            f"<p>Olá, {user_name}!</p>"
-            f"<p>O ativo <strong>{stock.name}</strong> atingiu o limite superior de "
-            f"<strong>{stock.upper_limit:.2f}</strong>.<br>"
-            f"Sua cotação atual é <strong>{stock.current_price:.2f}</strong>.<br>"
-            f"Recomendamos que você avalie a venda deste ativo.</p>"
-            f"<p>Atenciosamente,<br>B3Notifier</p>"
-        )
-        
-        # substituindo o ponto por vírgula e formatando as casas decimais
-        html_message = html_message.replace(f"{stock.upper_limit:.2f}", f"{stock.upper_limit:.2f}".replace('.', ','))
-        html_message = html_message.replace(f"{stock.current_price:.2f}", f"{stock.current_price:.2f}".replace('.', ','))
-
-    elif alert_type == 'lower':
-        subject = f"Recomendação: Comprar {stock.name}"
-        html_message = (
-            f"<p>Olá, {user_name}!</p>"
-            f"<p>O ativo <strong>{stock.name}</strong> atingiu o limite inferior de "
-            f"<strong>{stock.lower_limit:.2f}</strong>.<br>"
-            f"Sua cotação atual é <strong>{stock.current_price:.2f}</strong>.<br>"
-            f"Recomendamos que você avalie a compra deste ativo.</p>"
-            f"<p>Atenciosamente,<br>B3Notifier</p>"
-        )
-
-        html_message = html_message.replace(f"{stock.lower_limit:.2f}", f"{stock.lower_limit:.2f}".replace('.', ','))
-        html_message = html_message.replace(f"{stock.current_price:.2f}", f"{stock.current_price:.2f}".replace('.', ','))
-    else:
-        print("Alerta Inválido.")
+    # coloca o alerta de compra ou venda na fila de emails do usuario
+    # o envio acontece na fila "emails", juntando os alertas da mesma janela num unico digest
+    if alert_type not in ('upper', 'lower'):
+        logger.error("Alerta inválido: %s.", alert_type, extra={'ticker': stock.name, 'stock_id': stock.id})
         return
 
+    metrics.ALERTS_FIRED.labels(alert_type).inc()
+    if notifications.push_alert(stock, alert_type):
+        flush_notifications.apply_async(countdown=settings.NOTIFICATION_DIGEST_WINDOW)
+    logger.info(
+        "Alerta (%s) de %s enfileirado para o usuário %s.", alert_type, stock.name, stock.user_id,
+        extra={'ticker': stock.name, 'stock_id': stock.id, 'user_id': stock.user_id, 'side': alert_type},
+    )
+
+
+@shared_task
+def flush_notifications():
+    # junta os alertas pendentes num email por usuario e manda os emails em lotes pro Resend
+    pending = notifications.drain_pending()
+    if not pending:
+        return "Nenhum alerta pendente."
+
+    users = User.objects.in_bulk(list(pending))
+    messages = []
+    queued_at = []  # por email, quando cada alerta dele foi disparado (pra medir o tempo ate a entrega)
+    for user_id, items in pending.items():
+        if user_id in users and users[user_id].email:
+            messages.append(notifications.build_email(users[user_id], items))
+            queued_at.append([item['queued_at'] for item in items if 'queued_at' in item])
+    # o endpoint de lote do Resend aceita ate 100 emails por chamada
+    for i in range(0, len(messages), 100):
+        send_email_batch.delay(messages[i:i + 100], sum(queued_at[i:i + 100], []))
+
+    logger.info("%s emails de alerta enfileirados para envio.", len(messages), extra={'emails': len(messages)})
+    return f"{len(messages)} emails de alerta enfileirados."
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, retry_backoff_max=600, retry_jitter=True, max_retries=5)
+def send_email_batch(messages, queued_at=None):
+    # envia um lote de emails; em caso de falha o Celery tenta de novo com backoff exponencial
+    # queued_at: horarios (epoch) em que os alertas do digest foram disparados
+    logger.info("Enviando lote de %s emails...", len(messages), extra={'emails': len(messages)})
+    started = time.perf_counter()
+    try:
+        resend.Batch.send(messages)
+    except Exception:
+        metrics.EMAILS_SENT.labels('alert', 'error').inc(len(messages))
+        raise
+    finally:
+        metrics.EMAIL_SEND_SECONDS.labels('alert').observe(time.perf_counter() - started)
+    metrics.EMAILS_SENT.labels('alert', 'ok').inc(len(messages))
+    now = time.time()
+    for alert_time in queued_at or ():
+        metrics.ALERT_DELIVERY_SECONDS.observe(now - alert_time)
+    logger.info("Lote de %s emails enviado com sucesso.", len(messages), extra={'emails': len(messages)})
+    return f"{len(messages)} emails enviados."
+
+
+@shared_task(bind=True, max_retries=3)
+def send_otp_email(self, email, user_exists):
+    # envia o codigo OTP fora da request do SendOTPView, pela fila de alta prioridade "otp"
+    # o codigo é lido da cache na hora do envio, assim ele nao trafega pelo broker
+    otp_code = cache.get(f"otp_{email}")
+    if otp_code is None:
+        cache.set(f"otp_status_{email}", "expired", timeout=OTP_TIMEOUT)
+        return f"Código de {email} expirou antes do envio."
+
+    started = time.perf_counter()
     try:
-        print(f"Enviando email para {user_email} ({alert_type}) sobre {stock.name}...")
-        resend.Emails.send({
-            "from": "no-reply@b3notifier.me",
-            "to": user_email,
-            "subject": subject,
-            "html": html_message,
-        })
-        print(f"Email enviado com sucesso para {user_email} ({alert_type}) sobre {stock.name}.")
+        resend.Emails.send(notifications.build_otp_email(email, otp_code, user_exists))
     except Exception as e:
-        print(f"Erro ao enviar email para {user_email}: {e}")
+        metrics.EMAIL_SEND_SECONDS.labels('otp').observe(time.perf_counter() - started)
+        metrics.EMAILS_SENT.labels('otp', 'error').inc()
+        if self.request.retries >= self.max_retries:
+            logger.error("Erro ao enviar o código para %s: %s", email, e)
+            cache.set(f"otp_status_{email}", "failed", timeout=OTP_TIMEOUT)
+            raise
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
 
+    metrics.EMAIL_SEND_SECONDS.labels('otp').observe(time.perf_counter() - started)
+    metrics.EMAILS_SENT.labels('otp', 'ok').inc()
+    cache.set(f"otp_status_{email}", "sent", timeout=OTP_TIMEOUT)
+    return f"Código enviado para {email}."
 
 
 @shared_task
 def update_stock(stock_id):
-    # essa task atualiza um ativo especifico
-    # multiplos works competem pra enviar o email de alerta, 
-    # entao a gente usa uma atualizacao atomica no banco de dados pra garantir que só um faça isso
-    print(f"Iniciando atualização pro ativo ID {stock_id}...")
+    # mantida so pra tasks que ja estavam na fila: a atualizacao é sempre por ticker
+    # (update_stocks_for_ticker), que busca a cotacao uma vez pra todos os ativos dele
+    name = Stock.objects.filter(id=stock_id).values_list('name', flat=True).first()
+    if name is None:
+        return f"Stock {stock_id} não existe."
+    update_stocks_for_ticker.delay(name)
+    return f"Atualização de {name} enfileirada."
+
+
+@shared_task(bind=True, max_retries=3)
+def compute_stock_limits(self, stock_id):
+    # calcula em background o tunel de um ativo criado (ou com recalculo pedido) pelos endpoints,
+    # que ja devolveram 202 com o ativo pendente; o frontend recebe o resultado pelo stream de eventos
     try:
         stock = Stock.objects.get(id=stock_id)
     except Stock.DoesNotExist:
-        print(f"Stock {stock_id} não encontrado.")
         return f"Stock {stock_id} não existe."
+    if stock.status != Stock.STATUS_PENDING:
+        return f"Stock {stock_id} não está pendente."
 
-    # ativos fakes foram usados pra testar o sistema de envio de email, 
-    # entao eles nao podem ser atualizados com dados da api do yahoo
-    if not stock.fake:
+    # os UPDATEs abaixo sao condicionais: se o ativo foi apagado ou mudou enquanto buscavamos
+    # a cotacao, nao gravamos nada
+    try:
         stock_data = get_stock_data(stock.name)
-        if stock_data:
-            limits = calculate_limits(float(stock.current_price), stock_data)
-            if limits:
-                stock.current_price = limits['PBT']
-                stock.lower_limit = limits['buy_limit']
-                stock.upper_limit = limits['sell_limit']
-                print(f"Ativo {stock.name} atualizado com novos limites.")
-            else:
-                print(f"Variação insuficiente para atualizar {stock.name}.")
-        else:
-            print(f"Não foi possível obter dados para {stock.name}.")
-            return f"Não foi possível obter dados para {stock.name}."
-    else:
-        print(f"Ativo {stock.name} é fake. Usando dados já existentes.")
-
-    # atualiza a data da última verificao do ativo
-    stock.last_updated = timezone.now()
-    stock.save()
-
-    print(f"Verificando limites pro ativo {stock.name}...")
-    
-    if stock.current_price >= stock.upper_limit:
-        # usando um Operação atomica no BD
-        # se alert_upper_sent ainda for False, marcamos como True
-        # assim garantimos que só um worker vai enviar o email
-        rows_updated = Stock.objects.filter(id=stock.id, alert_upper_sent=False).update(alert_upper_sent=True)
-        if rows_updated == 1:
-            print(f"Ativo {stock.name} atingiu o limite superior. Enviando alerta...")
-            send_stock_notification(stock, alert_type='upper')
-            
-            # convertendo o timestamp para o timezone do usuario
-            timestamp = timezone.localtime(timezone.now())
-            try:
-                # criando um alerta de venda no bd
-                Alert.objects.create(
-                    user=stock.user,
-                    stock=stock,
-                    asset_name=stock.name,
-                    alert_type='sell_suggestion',  
-                    timestamp=timestamp
-                )
-                print(f"Alerta de venda criado para {stock.name} com timestamp {timestamp}.")
-            except Exception as e:
-                print(f"Erro ao criar alerta de venda para {stock.name}: {e}")
-        else:
-            print(f"Alerta de venda para {stock.name} já foi enviado anteriormente.")
-    
-    elif stock.current_price <= stock.lower_limit:
-        rows_updated = Stock.objects.filter(id=stock.id, alert_lower_sent=False).update(alert_lower_sent=True)
-        if rows_updated == 1:
-            print(f"Ativo {stock.name} atingiu o limite inferior. Enviando alerta...")
-            send_stock_notification(stock, alert_type='lower')
-            timestamp = timezone.localtime(timezone.now())
-            try:
-                Alert.objects.create(
-                    user=stock.user,
-                    stock=stock,
-                    asset_name=stock.name,
-                    alert_type='buy_suggestion',  
-                    timestamp=timestamp
-                )
-                print(f"Alerta de compra criado para {stock.name} com timestamp {timestamp}.")
-            except Exception as e:
-                print(f"Erro ao criar alerta de compra para {stock.name}: {e}")
+    except Throttled:
+        # sem cota no provedor agora: o ativo continua pendente e o calculo volta pra fila
+        # como uma task nova, sem gastar as tentativas reservadas pras falhas de verdade
+        compute_stock_limits.apply_async((stock_id,), countdown=settings.MARKET_DATA_THROTTLE_RETRY)
+        return f"Cota do provedor esgotada, cálculo de {stock.name} reagendado."
+    if not stock_data:
+        if self.request.retries < self.max_retries:
+            # a falha fica no cache de cotacoes por QUOTE_CACHE_NEGATIVE_TTL, esperamos ela expirar
+            raise self.retry(countdown=settings.QUOTE_CACHE_NEGATIVE_TTL)
+        logger.warning(
+            "Não foi possível obter dados para %s.", stock.name,
+            extra={'ticker': stock.name, 'stock_id': stock.id, 'user_id': stock.user_id},
+        )
+        if stock.upper_limit is None:
+            stock.status = Stock.STATUS_FAILED
+            stock.status_message = "Não foi possível obter dados do ativo."
         else:
-            print(f"Alerta de compra para {stock.name} já foi enviado anteriormente.")
-    
+            # num recalculo o ativo continua com o tunel anterior, entao volta pro agendamento normal
+            stock.status = Stock.STATUS_READY
+        updated = Stock.objects.filter(id=stock.id, status=Stock.STATUS_PENDING).update(
+            status=stock.status, status_message=stock.status_message,
+        )
     else:
-        # se estiver dentro dos limites, resetamos os alertas
-        if stock.alert_upper_sent or stock.alert_lower_sent:
-            Stock.objects.filter(id=stock.id).update(alert_upper_sent=False, alert_lower_sent=False)
-            print(f"{stock.name} voltou a ficar dentro dos limites. Resetando alertas.")
+        old_PBT = float(stock.current_price) if stock.current_price is not None else None
+        limits = calculate_limits(old_PBT, stock_data, volatility=refresh_history(stock.name, stock_data))
+        if limits:
+            # o PBT vem com a precisao do provedor, o campo guarda 4 casas como os limites
+            stock.current_price = round(limits['PBT'], 4)
+            stock.lower_limit = limits['buy_limit']
+            stock.upper_limit = limits['sell_limit']
+        stock.status = Stock.STATUS_READY
+        stock.status_message = ''
+        stock.last_updated = timezone.now()
+        stock.schedule_next_update()
+        updated = Stock.objects.filter(id=stock.id, status=Stock.STATUS_PENDING).update(
+            current_price=stock.current_price, lower_limit=stock.lower_limit, upper_limit=stock.upper_limit,
+            status=stock.status, status_message='', last_updated=stock.last_updated, next_due_at=stock.next_due_at,
+        )
+    if not updated:
+        return f"Stock {stock_id} mudou durante o cálculo."
 
-    print(f"Atualização concluída para {stock.name}.")
-    return f"Atualização concluída para {stock.name}."
+    due_index.schedule([stock])
+    dashboard.invalidate([stock.user_id])
+    events.publish_stocks([stock])
+    logger.info(
+        "Cálculo do túnel de %s concluído: %s.", stock.name, stock.status,
+        extra={'ticker': stock.name, 'stock_id': stock.id, 'user_id': stock.user_id, 'status': stock.status},
+    )
+    return f"Cálculo do túnel de {stock.name} concluído."
 
 
-@shared_task
-def check_and_update_stocks_for_user(user_id):
-    # essa task verifica se os ativos de um usuario precisam ser atualizados
-    print(f"Iniciando verificação dos ativos do usuário {user_id}...")
-    
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        print(f"Usuário {user_id} não encontrado.")
-        return f"Usuário {user_id} não existe."
+def _crossed_tunnels(due, price):
+    # devolve {id: 'upper' ou 'lower'} dos ativos vencidos com o tunel cruzado
+    # os reais sao comparados com o preco novo do ticker numa busca por faixa nos indices
+    # (name, upper_limit) e (name, lower_limit), entao so as linhas cruzadas sao lidas
+    # os fakes nao tem cotacao propria e usam o preco que ja esta gravado, numa query separada
+    # pra que a comparacao com a coluna nao tire o indice da query dos reais
+    queries = [due.filter(Q(fake=True) & (Q(upper_limit__lte=F('current_price')) | Q(lower_limit__gte=F('current_price'))))]
+    if price is not None:
+        queries.append(due.filter(Q(fake=False) & (Q(upper_limit__lte=price) | Q(lower_limit__gte=price))))
+    crossings = {}
+    for query in queries:
+        for stock_id, fake, current_price, upper_limit in query.values_list('id', 'fake', 'current_price', 'upper_limit'):
+            value = float(current_price) if fake else price
+            crossings[stock_id] = 'upper' if value >= float(upper_limit) else 'lower'
+    return crossings
+
+
+def _recentre_filter(price):
+    # ativos reais em que a variacao entre o PBT gravado e o preco novo pode passar de UPDATE_PERCENTAGE
+    # a faixa é um pouco mais larga que a conta do needs_update, que é refeita so nessas linhas
+    ratio = UPDATE_PERCENTAGE / 100
+    moved = Q(current_price__lte=price / (1 + ratio) * (1 + 1e-9))
+    if ratio < 1:
+        moved |= Q(current_price__gte=price / (1 - ratio) * (1 - 1e-9))
+    return Q(fake=False) & moved
 
+
+@shared_task
+def update_stocks_for_ticker(name):
+    # atualiza de uma vez todos os ativos (de todos os usuarios) que monitoram o mesmo ticker
+    # a serie é buscada uma unica vez, os limites sao recalculados pra cada linha
+    # e tudo volta pro banco em statements em lote, em vez de ~3 queries por ativo
+    logger.info("Iniciando atualização em lote pro ticker %s...", name, extra={'ticker': name})
     now = timezone.now()
-    stocks = Stock.objects.filter(user=user)
-    for stock in stocks:
-        if not stock.last_updated:
-            print(f"Agendando atualização para {stock.name} (sem histórico de atualização).")
-            update_stock.delay(stock.id)
-        else:
-            minutes_since_update = (now - stock.last_updated).total_seconds() / 60.0
-            if minutes_since_update >= stock.periodicity:
-                print(f"Agendando atualização para {stock.name} (última atualização há {minutes_since_update:.2f} min).")
-                update_stock.delay(stock.id)
+    stocks = list(Stock.objects.filter(Stock.due_filter(now), name=name))
+    if not stocks:
+        logger.info("Nenhum ativo %s precisa ser atualizado.", name, extra={'ticker': name})
+        return f"Nenhum ativo {name} para atualizar."
+
+    # so vamos no upstream se houver algum ativo real (os fakes usam os dados ja existentes)
+    limits = None
+    periods = [stock.period_seconds() for stock in stocks if not stock.fake]
+    if periods:
+        # a cotacao em cache so serve se for mais nova que o menor periodo entre os ativos vencidos
+        # (com periodicidade em segundos ele pode ser menor que o QUOTE_CACHE_TTL)
+        max_age = min(periods) if min(periods) < settings.QUOTE_CACHE_TTL else None
+        try:
+            stock_data = get_stock_data(name, max_age=max_age)
+        except Throttled:
+            # sem cota no provedor: o ticker volta pra fila de prioridade (os ativos continuam vencidos)
+            # e a fila é consumida de novo quando o bucket do minuto tiver enchido
+            refresh_queue.push(refresh_queue.due_ticker_priorities(now, names=[name]))
+            drain_refresh_queue.apply_async(countdown=settings.MARKET_DATA_THROTTLE_RETRY)
+            logger.info("Cota do provedor esgotada, %s volta pra fila.", name, extra={'ticker': name})
+            return f"Cota do provedor esgotada, {name} volta pra fila."
+        if not stock_data:
+            logger.warning("Não foi possível obter dados para %s.", name, extra={'ticker': name})
+            # os ativos continuam vencidos: tentamos de novo quando a falha sair do cache de cotacoes
+            due_index.retry([name], now + timedelta(seconds=settings.QUOTE_CACHE_NEGATIVE_TTL))
+            return f"Não foi possível obter dados para {name}."
+        # sem PBT anterior o calculo sempre devolve os limites, a variacao é checada por linha
+        limits = calculate_limits(None, stock_data, volatility=refresh_history(name, stock_data))
+
+    timestamp = timezone.localtime(now)
+    price = limits['PBT'] if limits else None
+    # as linhas sao filtradas pelo ticker e pelo vencimento, como na leitura acima, em vez de uma
+    # lista de ids: o custo segue os indices do ticker e nao passa do limite de parametros do banco
+    due = Stock.objects.filter(Stock.due_filter(now), name=name)
+    with transaction.atomic():
+        # primeiro os alertas: o preco novo contra o tunel que o usuario estava acompanhando
+        # as flags mudam com um UPDATE condicional por direcao, que so devolve quem fez a transicao
+        crossings = _crossed_tunnels(due, price)
+        fired, alerts = alert_transitions.fire(crossings, timestamp, price)
+        inside = Q(fake=True, lower_limit__lt=F('current_price'), upper_limit__gt=F('current_price'))
+        if price is not None:
+            inside |= Q(fake=False, lower_limit__lt=price, upper_limit__gt=price)
+        alert_transitions.reset(due.filter(inside))
 
-    print(f"Verificação concluída pro usuário {user.username}.")
-    return f"Verificação concluída para o usuário {user.username}."
+        # depois recentralizamos o tunel dos ativos reais em que a variacao do PBT justifica
+        # so essas linhas sao travadas e reescritas, pra que dois workers no mesmo ticker nao
+        # recalculem o mesmo tunel; depois do lock o banco reavalia a faixa com o PBT ja gravado
+        changed = {}
+        if price is not None:
+            for stock in due.filter(_recentre_filter(price)).select_for_update().only('id', 'current_price'):
+                if needs_update(float(stock.current_price), price):
+                    stock.current_price = price
+                    stock.lower_limit = limits['buy_limit']
+                    stock.upper_limit = limits['sell_limit']
+                    changed[stock.id] = stock
+            Stock.objects.bulk_update(changed.values(), ['current_price', 'lower_limit', 'upper_limit'])
+
+        # todos os ativos vencidos sao reagendados, sem lock (dois workers gravariam o mesmo vencimento)
+        for stock in stocks:
+            # atraso entre o ativo vencer e ser atualizado (fila de prioridade + cota do provedor)
+            if stock.next_due_at is not None:
+                metrics.STOCK_REFRESH_LAG_SECONDS.observe(max((now - stock.next_due_at).total_seconds(), 0))
+            if stock.id in changed:
+                stock.current_price = price
+                stock.lower_limit = limits['buy_limit']
+                stock.upper_limit = limits['sell_limit']
+            stock.last_updated = now
+            stock.schedule_next_update()
+        Stock.objects.bulk_update(stocks, ['last_updated', 'next_due_at'])
+
+        transaction.on_commit(lambda: dashboard.invalidate(stock.user_id for stock in stocks))
+        transaction.on_commit(lambda: due_index.schedule(stocks))
+        # o frontend recebe os precos e alertas novos pelo stream de eventos assim que o commit acontece
+        transaction.on_commit(lambda: events.publish_stocks(stocks))
+        transaction.on_commit(lambda: events.publish_alerts(alerts))
+
+    # os emails so saem depois do commit, quando os alertas ja estao gravados
+    for stock, side in fired:
+        send_stock_notification(stock, side)
+
+    metrics.STOCKS_UPDATED.inc(len(stocks))
+    logger.info(
+        "Atualização em lote concluída para %s: %s ativos, %s alertas.", name, len(stocks), len(fired),
+        extra={'ticker': name, 'stocks': len(stocks), 'alerts': len(fired)},
+    )
+    return f"Atualização em lote concluída para {name}."
 
 
 @shared_task
 def check_and_update_stocks_global():
-    # essa task é executada periodicamente (a cada minuto) e verifica quais ativos precisam ser atualizados
-    # disparando uma verificaçao individual para cada um
-    
-    # captura os ids de todos os usuários que tem pelo menos um stock
-    print("Iniciando verificação global de ativos...") 
-    user_ids = Stock.objects.values_list('user', flat=True).distinct()
-    for user_id in user_ids:
-        check_and_update_stocks_for_user.delay(user_id)
-
-    print("Verificação global concluída.")
-    return "Verificação global iniciada."
+    # essa task é executada periodicamente (a cada minuto) e coloca os tickers vencidos na fila de prioridade
+    # uma unica query agrupada por ticker (indexada por next_due_at) acha os ativos vencidos e calcula
+    # a prioridade de cada ticker, entao o custo do ciclo nao cresce com o numero de usuarios
+    logger.info("Iniciando verificação global de ativos...")
+    priorities = refresh_queue.due_ticker_priorities(timezone.now())
+    refresh_queue.replace_queue(priorities)
+    metrics.REFRESH_QUEUE_TICKERS.set(len(priorities))
+    drain_refresh_queue.delay()
+
+    logger.info("Verificação global concluída: %s tickers na fila.", len(priorities), extra={'tickers': len(priorities)})
+    return f"Verificação global iniciada para {len(priorities)} tickers."
+
+
+@shared_task
+def drain_refresh_queue():
+    # consome a fila de prioridade em lotes enquanto houver cota no provedor
+    # cada lote busca juntas as cotacoes que faltam no cache e so depois dispara as
+    # atualizacoes por ticker, que entao leem do cache em vez de ir no upstream
+    # provedores que aceitam varios tickers por request consomem lotes do tamanho da request
+    provider = get_provider()
+    dispatched = 0
+    while True:
+        batch = refresh_queue.pop(max(settings.MARKET_DATA_BATCH_SIZE, provider.batch_size))
+        if not batch:
+            break
+
+        # tickers ja em cache nao gastam cota
+        cached = [name for name in batch if get_cached(name) is not None]
+        pending = [name for name in batch if name not in cached]
+        budget = min(len(pending), provider.available())
+        to_fetch, leftover = pending[:budget], pending[budget:]
+        refresh_queue.push({name: batch[name] for name in leftover})
+
+        ready = cached
+        if to_fetch:
+            try:
+                results = get_many_stock_data(to_fetch)
+            except Exception as e:
+                logger.exception("Erro ao buscar cotações em lote: %s", e, extra={'tickers': len(to_fetch)})
+                results = {name: None for name in to_fetch}
+            ready = ready + [name for name in to_fetch if results.get(name)]
+            # os barrados pela cota nao voltam no resultado: ficam na fila, como os que nao couberam
+            throttled = [name for name in to_fetch if name not in results]
+            refresh_queue.push({name: batch[name] for name in throttled})
+            leftover = leftover + throttled
+            # os que falharam voltam pro agendador quando a falha sair do cache de cotacoes
+            failed = [name for name in to_fetch if name in results and not results[name]]
+            due_index.retry(failed, timezone.now() + timedelta(seconds=settings.QUOTE_CACHE_NEGATIVE_TTL))
+
+        if ready:
+            group(update_stocks_for_ticker.si(name) for name in ready).delay()
+            metrics.TICKERS_DISPATCHED.inc(len(ready))
+            dispatched += len(ready)
+
+        if leftover:
+            logger.info(
+                "Cota do provedor esgotada, %s tickers aguardam o próximo ciclo.", len(leftover),
+                extra={'tickers': len(leftover)},
+            )
+            break
+
+    logger.info("Fila de atualização processada: %s tickers disparados.", dispatched, extra={'tickers': dispatched})
+    return f"{dispatched} tickers disparados."
+
+
+@shared_task
+def recompute_all_limits():
+    # recalcula de uma vez os tuneis de todos os ativos reais, por exemplo depois de mudar
+    # VOLATILITY_THRESHOLD ou as bandas; os tickers sao calculados numa unica passada vetorizada
+    logger.info("Iniciando recálculo em lote dos limites...")
+    ready = Stock.objects.filter(fake=False, status=Stock.STATUS_READY)
+    names = list(ready.values_list('name', flat=True).distinct().order_by())
+    series = {}
+    for i, name in enumerate(names):
+        try:
+            stock_data = get_stock_data(name)
+        except Throttled:
+            logger.warning(
+                "Cota do provedor esgotada, %s tickers ficam com os limites atuais.", len(names) - i,
+                extra={'tickers': len(names) - i},
+            )
+            break
+        if stock_data:
+            series[name] = stock_data
+        else:
+            logger.warning("Não foi possível obter dados para %s, mantendo os limites atuais.", name, extra={'ticker': name})
+
+    if not series:
+        return "Nenhum ticker recalculado."
+
+    names = list(series)
+    data = [series[name] for name in names]
+    # a volatilidade vem do estado incremental de cada ticker, como nas atualizacoes do agendador
+    # (historico local de todos os tickers atualizado num numero fixo de queries)
+    volatility = refresh_histories(series)
+    limits = calculate_limits_batch(
+        None,
+        [d.ltp for d in data],
+        [d.best_bid for d in data],
+        [d.best_offer for d in data],
+        [d.last_volume for d in data],
+        volatility=[volatility[name] for name in names],
+    )
+    index = {name: i for i, name in enumerate(names)}
+
+    stocks = list(ready.filter(name__in=names))
+    for stock in stocks:
+        i = index[stock.name]
+        stock.current_price = float(limits['PBT'][i])
+        stock.lower_limit = float(limits['buy_limit'][i])
+        stock.upper_limit = float(limits['sell_limit'][i])
+    Stock.objects.bulk_update(stocks, ['current_price', 'lower_limit', 'upper_limit'], batch_size=500)
+    dashboard.invalidate(stock.user_id for stock in stocks)
+
+    logger.info(
+        "Recálculo concluído: %s tickers, %s ativos.", len(names), len(stocks),
+        extra={'tickers': len(names), 'stocks': len(stocks)},
+    )
+    return f"Recálculo concluído para {len(names)} tickers."
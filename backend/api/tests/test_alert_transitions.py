@@ -0,0 +1,51 @@
+import datetime
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from api import alert_transitions
+from api.models import Alert, Stock
+
+NOW = timezone.make_aware(datetime.datetime(2025, 1, 2, 10, 0))
+
+
+class AlertTransitionsTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='a', email='a@x')
+        self.stocks = [
+            Stock.objects.create(
+                user=user, name=f'T{i}.SA', periodicity=5, current_price=10, lower_limit=9, upper_limit=11,
+            )
+            for i in range(3)
+        ]
+        self.crossings = {self.stocks[0].id: 'upper', self.stocks[1].id: 'lower'}
+
+    def test_fire_is_idempotent(self):
+        fired, alerts = alert_transitions.fire(self.crossings, NOW, price=12.0)
+        self.assertEqual({(stock.id, side) for stock, side in fired}, set(self.crossings.items()))
+        self.assertEqual(len(alerts), 2)
+        self.assertEqual([stock.current_price for stock, _ in fired], [12.0, 12.0])
+
+        fired, alerts = alert_transitions.fire(self.crossings, NOW, price=12.0)
+        self.assertEqual((fired, alerts), ([], []))
+        self.assertEqual(
+            sorted(Alert.objects.values_list('stock_id', 'alert_type')),
+            sorted([(self.stocks[0].id, 'sell_suggestion'), (self.stocks[1].id, 'buy_suggestion')]),
+        )
+
+    def test_reset_rearms_both_sides(self):
+        alert_transitions.fire(self.crossings, NOW)
+        all_stocks = Stock.objects.filter(id__in=[stock.id for stock in self.stocks])
+        self.assertEqual(alert_transitions.reset(all_stocks), 2)
+        self.assertEqual(alert_transitions.reset(all_stocks), 0)
+
+        fired, _ = alert_transitions.fire(self.crossings, NOW)
+        self.assertEqual(len(fired), 2)
+        self.assertEqual(Alert.objects.count(), 4)
+
+    def test_sides_are_independent(self):
+        stock_id = self.stocks[2].id
+        alert_transitions.fire({stock_id: 'upper'}, NOW)
+        fired, _ = alert_transitions.fire({stock_id: 'lower'}, NOW)
+        self.assertEqual([side for _, side in fired], ['lower'])
+        stock = Stock.objects.get(id=stock_id)
+        self.assertTrue(stock.alert_upper_sent and stock.alert_lower_sent)
@@ -0,0 +1,47 @@
+import numpy as np
+from django.test import SimpleTestCase
+from utils.backtest import parameter_grid, run_backtest
+from utils.finance import calculate_limits, calculate_volatility, history_matrix
+from utils.timeseries import TimeSeries
+
+
+def engine_replay(closes, volumes, window):
+    # o que o app faria com o ticker dia a dia: alerta contra o tunel atual (uma vez por direcao ate o
+    # preco voltar pra dentro) e depois recalculo do tunel por calculate_limits com o PBT anterior
+    PBT = lower = upper = None
+    upper_sent = lower_sent = False
+    upper_alerts = lower_alerts = updates = 0
+    for day in range(window - 1, len(closes)):
+        price = closes[day]
+        if upper is not None:
+            if price >= upper:
+                upper_alerts += not upper_sent
+                upper_sent = True
+            elif price <= lower:
+                lower_alerts += not lower_sent
+                lower_sent = True
+            elif lower < price < upper:
+                upper_sent = lower_sent = False
+        history = closes[day - window + 1:day + 1]
+        series = TimeSeries('X', np.arange(len(history)), np.asarray(history), np.asarray(volumes[day - window + 1:day + 1]))
+        limits = calculate_limits(PBT, series, volatility=calculate_volatility(history))
+        if limits:
+            updates += PBT is not None
+            PBT, lower, upper = limits['PBT'], limits['buy_limit'], limits['sell_limit']
+    return upper_alerts, lower_alerts, updates
+
+
+class BacktestParityTests(SimpleTestCase):
+    def test_matches_engine_with_current_parameters(self):
+        rng = np.random.default_rng(5)
+        window = 20
+        grid = parameter_grid()
+        for i in range(12):
+            # volatilidades bem longe do VOLATILITY_THRESHOLD, dos dois lados dele
+            step = 0.001 if i % 2 else 0.04
+            closes = np.round(30 * np.cumprod(1 + rng.normal(0, step, 250)), 2)
+            volumes = rng.choice([50_000, 3_000_000], 250)
+            result = run_backtest(history_matrix([closes]), history_matrix([volumes]), grid, window)
+            expected = engine_replay(closes.tolist(), volumes.tolist(), window)
+            got = (int(result['upper_alerts'][0]), int(result['lower_alerts'][0]), int(result['updates'][0]))
+            self.assertEqual(got, expected, i)
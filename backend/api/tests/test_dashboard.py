@@ -0,0 +1,81 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api import dashboard, due_index, tasks
+from api.models import Alert, Stock
+from api.tests.test_tasks import LIMITS
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE, DASHBOARD_SUMMARY_TTL=60)
+class DashboardSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='a', email='a@x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patch = mock.patch.object(due_index, 'get_redis')
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def stock(self, name, price, lower, upper, **fields):
+        return Stock.objects.create(
+            user=self.user, name=name, periodicity=5, current_price=price, lower_limit=lower, upper_limit=upper, **fields,
+        )
+
+    def alert(self, alert_type, age):
+        Alert.objects.create(user=self.user, asset_name='A.SA', alert_type=alert_type, timestamp=timezone.now() - age)
+
+    def test_counts(self):
+        self.stock('OVER.SA', 11, 9, 10.5)
+        self.stock('NEAR.SA', 10.45, 9, 10.5)
+        self.stock('INSIDE.SA', 10, 9, 11)
+        pending = self.stock('PEND.SA', None, None, None, status=Stock.STATUS_PENDING)
+        Stock.objects.filter(id=pending.id).update(next_due_at=timezone.now() - timedelta(days=1))
+        Stock.objects.create(
+            user=User.objects.create(username='b', email='b@x'), name='OVER.SA', periodicity=5,
+            current_price=11, lower_limit=9, upper_limit=10.5,
+        )
+        self.alert('sell_suggestion', timedelta(hours=1))
+        self.alert('buy_suggestion', timedelta(days=2))
+        self.alert('buy_suggestion', timedelta(days=8))
+
+        with self.assertNumQueries(2):
+            summary = dashboard.compute_summary(self.user.id)
+        ready_due = Stock.objects.filter(user=self.user, status=Stock.STATUS_READY).order_by('next_due_at').first().next_due_at
+        self.assertEqual(summary['next_update'], ready_due.isoformat())
+        self.assertEqual(
+            {key: summary[key] for key in ('stock_count', 'over_limit', 'near_limit', 'alerts_24h', 'alerts_7d',
+                                           'sell_suggestions_7d', 'buy_suggestions_7d')},
+            {'stock_count': 4, 'over_limit': 1, 'near_limit': 1, 'alerts_24h': 1, 'alerts_7d': 2,
+             'sell_suggestions_7d': 1, 'buy_suggestions_7d': 1},
+        )
+
+    def test_cached_until_a_write(self):
+        stock = self.stock('A.SA', 10, 9, 11)
+        self.assertEqual(self.client.get('/api/stocks/summary/').data['stock_count'], 1)
+        with self.assertNumQueries(0):
+            dashboard.get_summary(self.user.id)
+
+        self.client.delete(f'/api/stock/delete/{stock.id}/')
+        self.assertEqual(self.client.get('/api/stocks/summary/').data['stock_count'], 0)
+        self.assertEqual(self.client.get('/api/stocks/updates-info/').status_code, 404)
+
+    def test_update_cycle_invalidates(self):
+        self.stock('PETR4.SA', 10, 9, 9.9)
+        Stock.objects.update(next_due_at=None)
+        self.assertEqual(dashboard.get_summary(self.user.id)['alerts_24h'], 0)
+        with mock.patch.object(tasks, 'get_stock_data', return_value=object()), \
+                mock.patch.object(tasks, 'refresh_history', return_value=0.0), \
+                mock.patch.object(tasks, 'calculate_limits', return_value=LIMITS), \
+                mock.patch.object(tasks, 'send_stock_notification'), \
+                mock.patch.object(tasks.events, 'publish_stocks'), \
+                mock.patch.object(tasks.events, 'publish_alerts'), \
+                self.captureOnCommitCallbacks(execute=True):
+            tasks.update_stocks_for_ticker('PETR4.SA')
+        self.assertEqual(dashboard.get_summary(self.user.id)['alerts_24h'], 1)
@@ -0,0 +1,52 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from api.views import event_views
+
+
+async def one_event(user_id):
+    yield f"event: ping\ndata: {user_id}\n\n"
+
+
+class EventTicketTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='a', email='a@x')
+
+    def test_ticket_requires_authentication(self):
+        response = APIClient().post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_issues_ticket_for_user(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(event_views.events, 'issue_ticket', return_value='abc') as issue:
+            response = client.post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ticket'], 'abc')
+        issue.assert_called_once_with(self.user.id)
+
+
+class EventStreamAuthTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='a', email='a@x')
+
+    async def test_rejects_jwt_in_query(self):
+        token = str(AccessToken.for_user(self.user))
+        response = await self.async_client.get('/api/events/stream/', {'token': token})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_opens_with_ticket(self):
+        with mock.patch.object(event_views.events, 'redeem_ticket', return_value=self.user.id) as redeem, \
+                mock.patch.object(event_views.events, 'stream', side_effect=one_event):
+            response = await self.async_client.get('/api/events/stream/', {'ticket': 'abc'})
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body.decode(), f"event: ping\ndata: {self.user.id}\n\n")
+        redeem.assert_called_once_with('abc')
+
+    async def test_rejects_used_ticket(self):
+        with mock.patch.object(event_views.events, 'redeem_ticket', return_value=None):
+            response = await self.async_client.get('/api/events/stream/', {'ticket': 'abc'})
+        self.assertEqual(response.status_code, 401)
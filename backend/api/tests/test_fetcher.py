@@ -0,0 +1,96 @@
+import asyncio
+import json
+from unittest import mock
+import httpx
+from django.test import SimpleTestCase, override_settings
+from utils import fetcher, rate_limit
+
+DAILY = {
+    "Time Series (Daily)": {
+        "2025-01-03": {"4. close": "38.40", "5. volume": "2500000"},
+        "2025-01-02": {"4. close": "38.10", "5. volume": "2100000"},
+        "2025-01-01": {"4. close": "37.90", "5. volume": "1900000"},
+    },
+}
+MINUTE_NOTE = {"Note": "Thank you for using Alpha Vantage! Our standard API rate limit is 5 requests per minute."}
+DAILY_LIMIT = {"Information": "We have detected your API key and our standard API rate limit is 25 requests per day."}
+
+
+class ParseTests(SimpleTestCase):
+    def test_parse_daily_series(self):
+        series = fetcher.parse_daily_series('PETR4.SA', DAILY)
+        self.assertEqual(series.closes.tolist(), [37.9, 38.1, 38.4])
+        self.assertEqual(series.volumes.tolist(), [1900000, 2100000, 2500000])
+        self.assertEqual(series.ltp, 38.4)
+
+    def test_provider_errors(self):
+        for data in ({"Error Message": "Invalid API call."}, MINUTE_NOTE, DAILY_LIMIT, {}):
+            self.assertIsNone(fetcher.parse_daily_series('PETR4.SA', data), data)
+
+    def test_only_the_minute_message_is_a_throttle(self):
+        self.assertTrue(fetcher.is_minute_throttle(MINUTE_NOTE))
+        self.assertTrue(fetcher.is_minute_throttle({"Information": MINUTE_NOTE["Note"]}))
+        self.assertFalse(fetcher.is_minute_throttle(DAILY_LIMIT))
+        self.assertFalse(fetcher.is_minute_throttle(DAILY))
+
+
+@override_settings(MARKET_DATA_URL='https://provider.test/query', MARKET_DATA_RATE_LIMIT_WAIT=5)
+class FetchTests(SimpleTestCase):
+    def setUp(self):
+        self.responses = {}
+        self.in_flight = self.max_in_flight = 0
+        patches = [
+            mock.patch.object(fetcher, '_get_client', return_value=self.fake_client()),
+            mock.patch.object(rate_limit, 'acquire_async', mock.AsyncMock(return_value=True)),
+            mock.patch.object(rate_limit, 'drain_minute_async', mock.AsyncMock()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def fake_client(self):
+        # cliente httpx com transporte falso, uma resposta por ticker, e o semaforo como o do fetcher
+        async def handler(request):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            response = self.responses[request.url.params['symbol']]
+            if isinstance(response, Exception):
+                raise response
+            return httpx.Response(200, content=json.dumps(response))
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler)), asyncio.Semaphore(2)
+
+    def test_fetch(self):
+        self.responses['PETR4.SA'] = DAILY
+        series = fetcher.fetch_stock_data('PETR4.SA')
+        self.assertEqual(series.closes.tolist(), [37.9, 38.1, 38.4])
+        rate_limit.acquire_async.assert_awaited_once_with(5)
+
+    def test_timeout_is_a_miss(self):
+        self.responses['PETR4.SA'] = httpx.ReadTimeout('timeout')
+        self.assertIsNone(fetcher.fetch_stock_data('PETR4.SA'))
+
+    def test_local_quota_skips_the_request(self):
+        rate_limit.acquire_async.return_value = False
+        with self.assertRaises(rate_limit.Throttled):
+            fetcher.fetch_stock_data('PETR4.SA')
+        self.assertEqual(self.max_in_flight, 0)
+
+    def test_provider_minute_limit_drains_the_bucket(self):
+        self.responses['PETR4.SA'] = MINUTE_NOTE
+        with self.assertRaises(rate_limit.Throttled):
+            fetcher.fetch_stock_data('PETR4.SA')
+        rate_limit.drain_minute_async.assert_awaited_once()
+
+    def test_fetch_many(self):
+        self.responses.update({
+            'A.SA': DAILY, 'B.SA': DAILY, 'C.SA': {"Error Message": "Invalid API call."}, 'D.SA': MINUTE_NOTE,
+        })
+        results = fetcher.fetch_many(['A.SA', 'B.SA', 'C.SA', 'D.SA', 'A.SA'])
+        # o barrado pela cota fica fora, o ticker invalido volta como None
+        self.assertEqual(sorted(results), ['A.SA', 'B.SA', 'C.SA'])
+        self.assertIsNone(results['C.SA'])
+        self.assertEqual(results['A.SA'].ltp, 38.4)
+        self.assertEqual(self.max_in_flight, 2)
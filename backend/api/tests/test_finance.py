@@ -0,0 +1,97 @@
+import numpy as np
+from django.test import SimpleTestCase
+from utils.finance import (
+    ADDITIVE_BAND, ADDITIVE_POINTS_BAND, LIQUIDITY_THRESHOLD, MULTIPLICATIVE_BAND, VOLATILITY_THRESHOLD,
+    calculate_limits, calculate_limits_batch, history_matrix, round_prices,
+)
+from utils.timeseries import TimeSeries
+
+
+def make_series(symbol, closes, volume):
+    closes = np.asarray(closes, dtype=np.float64)
+    volumes = np.full(len(closes), volume, dtype=np.int64)
+    return TimeSeries(symbol, np.arange(20000, 20000 + len(closes), dtype=np.int64), closes, volumes)
+
+
+class RoundPricesTests(SimpleTestCase):
+    def test_matches_python_round(self):
+        # empates em que o np.round e o round do Python discordam
+        values = [45.85 * 0.985, 12.35 * 0.985, 0.00005, 1.00005, float('nan')]
+        expected = [round(value, 4) for value in values]
+        np.testing.assert_array_equal(round_prices(values), expected)
+
+    def test_keeps_shape(self):
+        self.assertEqual(round_prices(np.ones((3, 4)) / 3).shape, (3, 4))
+
+
+class CalculateLimitsBatchTests(SimpleTestCase):
+    def test_batch_matches_scalar(self):
+        # precos com 2 casas, como os do provedor, nos tres metodos de calculo
+        rng = np.random.default_rng(7)
+        count = 20000
+        prices = np.round(rng.uniform(1, 200, count), 2)
+        volumes = rng.choice([10_000, 5_000_000], count)
+        # historicos bem longe do VOLATILITY_THRESHOLD, so pra exercitar os dois lados dele
+        spread = rng.choice([0.002, 0.08], count)
+        series = [
+            make_series(f"T{i}", np.append(np.round(price * (1 + rng.normal(0, sd, 30)), 2), price), volume)
+            for i, (price, volume, sd) in enumerate(zip(prices, volumes, spread))
+        ]
+
+        batch = calculate_limits_batch(
+            None,
+            [s.ltp for s in series],
+            [s.best_bid for s in series],
+            [s.best_offer for s in series],
+            [s.last_volume for s in series],
+            history_matrix([s.closes for s in series]),
+        )
+        for i, s in enumerate(series):
+            scalar = calculate_limits(None, s)
+            self.assertEqual(batch['PBT'][i], scalar['PBT'])
+            self.assertEqual(batch['buy_limit'][i], scalar['buy_limit'], s.ltp)
+            self.assertEqual(batch['sell_limit'][i], scalar['sell_limit'], s.ltp)
+
+    def test_update_flag_matches_needs_update(self):
+        series = [make_series("A", [10.0, 10.0], 10_000), make_series("B", [10.0, 10.5], 10_000)]
+        batch = calculate_limits_batch(
+            [10.0, 10.0],
+            [s.ltp for s in series],
+            [s.best_bid for s in series],
+            [s.best_offer for s in series],
+            [s.last_volume for s in series],
+            history_matrix([s.closes for s in series]),
+        )
+        self.assertEqual(list(batch['update']), [calculate_limits(10.0, s) is not None for s in series])
+
+    def test_thresholds_match_scalar(self):
+        # exatamente no VOLATILITY_THRESHOLD e no LIQUIDITY_THRESHOLD, e logo em volta deles
+        price = 45.85
+        multiplicative = (round(price * (1 - MULTIPLICATIVE_BAND), 4), round(price * (1 + MULTIPLICATIVE_BAND), 4))
+        additive = (round(price - ADDITIVE_BAND, 4), round(price + ADDITIVE_BAND, 4))
+        points = (round(price - ADDITIVE_POINTS_BAND / 100, 4), round(price + ADDITIVE_POINTS_BAND / 100, 4))
+        above = np.nextafter(VOLATILITY_THRESHOLD, np.inf)
+        below = np.nextafter(VOLATILITY_THRESHOLD, -np.inf)
+        cases = [
+            (LIQUIDITY_THRESHOLD, VOLATILITY_THRESHOLD, multiplicative),
+            (LIQUIDITY_THRESHOLD, below, multiplicative),
+            (LIQUIDITY_THRESHOLD, above, points),
+            (LIQUIDITY_THRESHOLD + 1, VOLATILITY_THRESHOLD, multiplicative),
+            (LIQUIDITY_THRESHOLD - 1, VOLATILITY_THRESHOLD, points),
+            (LIQUIDITY_THRESHOLD - 1, above, additive),
+            (LIQUIDITY_THRESHOLD - 1, below, points),
+        ]
+        series = [make_series(f"T{i}", [price, price], volume) for i, (volume, _, _) in enumerate(cases)]
+        volatility = [volatility for _, volatility, _ in cases]
+        batch = calculate_limits_batch(
+            None,
+            [s.ltp for s in series],
+            [s.best_bid for s in series],
+            [s.best_offer for s in series],
+            [s.last_volume for s in series],
+            volatility=volatility,
+        )
+        for i, (s, (volume, vol, expected)) in enumerate(zip(series, cases)):
+            scalar = calculate_limits(None, s, volatility=vol)
+            self.assertEqual((scalar['buy_limit'], scalar['sell_limit']), expected, (volume, vol))
+            self.assertEqual((batch['buy_limit'][i], batch['sell_limit'][i]), expected, (volume, vol))
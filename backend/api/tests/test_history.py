@@ -0,0 +1,71 @@
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from api.history import refresh_histories, refresh_history
+from api.models import PriceBar, TickerStats
+from utils.finance import calculate_volatility, rolling_push, rolling_replace, rolling_stats, rolling_volatility
+from utils.timeseries import TimeSeries
+
+# barras por fetch, como o compact do Alpha Vantage
+COMPACT = 100
+
+
+def compact(symbol, closes, end):
+    # as ultimas COMPACT barras ate `end` (exclusivo), com o dia de cada barra igual a posicao
+    start = max(0, end - COMPACT)
+    return TimeSeries(
+        symbol, np.arange(20000 + start, 20000 + end, dtype=np.int64),
+        np.array(closes[start:end], dtype=np.float64), np.full(end - start, 1000, dtype=np.int64),
+    )
+
+
+class RollingStatsTests(SimpleTestCase):
+    def test_incremental_matches_full_recalculation(self):
+        rng = np.random.default_rng(1)
+        prices = (50 + rng.normal(0, 2, 2000)).tolist()
+        window = 30
+        state = rolling_stats([])
+        for i, price in enumerate(prices):
+            if state[0] < window:
+                state = rolling_push(*state, price)
+            else:
+                state = rolling_replace(*state, prices[i - window], price)
+            count, mean, m2 = rolling_stats(prices[max(0, i - window + 1):i + 1])
+            self.assertEqual(state[0], count)
+            self.assertAlmostEqual(state[1], mean, places=9)
+            self.assertAlmostEqual(state[2], m2, places=6)
+        self.assertAlmostEqual(rolling_volatility(*state), calculate_volatility(prices[-window:]), places=9)
+
+
+@override_settings(VOLATILITY_WINDOW=30)
+class RefreshHistoryTests(TestCase):
+    def test_matches_volatility_of_the_window(self):
+        rng = np.random.default_rng(2)
+        closes = np.round(20 + rng.normal(0, 0.5, 400), 2).tolist()
+        for end in range(2, len(closes) + 1, 3):
+            volatility = refresh_history('X', compact('X', closes, end))
+            self.assertAlmostEqual(volatility, calculate_volatility(closes[max(0, end - 30):end]), places=9)
+
+            # o fechamento do dia muda durante o pregao e a mesma barra volta revisada
+            closes[end - 1] = round(closes[end - 1] + 0.37, 2)
+            volatility = refresh_history('X', compact('X', closes, end))
+            self.assertAlmostEqual(volatility, calculate_volatility(closes[max(0, end - 30):end]), places=9)
+
+        self.assertEqual(PriceBar.objects.filter(name='X').count(), end)
+        self.assertEqual(TickerStats.objects.get(name='X').count, 30)
+
+    def test_many_tickers_match_one_by_one(self):
+        rng = np.random.default_rng(3)
+        closes = {f"T{i}": np.round(10 + rng.normal(0, 0.3, 150), 2).tolist() for i in range(5)}
+        for end in (40, 41, 90, 150):
+            together = refresh_histories({name: compact(name, values, end) for name, values in closes.items()})
+            for name, values in closes.items():
+                self.assertAlmostEqual(together[name], calculate_volatility(values[end - 30:end]), places=9)
+
+    def test_query_count_does_not_grow_with_tickers(self):
+        rng = np.random.default_rng(4)
+        closes = {f"T{i}": np.round(10 + rng.normal(0, 0.3, 150), 2).tolist() for i in range(8)}
+        refresh_histories({name: compact(name, values, 140) for name, values in closes.items()})
+        with self.assertNumQueries(8):
+            refresh_history('T0', compact('T0', closes['T0'], 150))
+        with self.assertNumQueries(8):
+            refresh_histories({name: compact(name, values, 150) for name, values in closes.items()})
@@ -0,0 +1,92 @@
+from unittest import mock
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from api.models import Stock
+from api.views import stock_views
+from api.tests.test_finance import make_series
+
+URL = '/api/stock/import/'
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class StockImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='a', email='a@x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fetch(self, names):
+        return {
+            name: None if name == 'BAD.SA' else make_series(name, np.linspace(9, 10, 30), 2_000_000)
+            for name in names
+        }
+
+    def test_creates_each_ticker_once(self):
+        Stock.objects.create(user=self.user, name='OLD.SA', periodicity=5, current_price=10, lower_limit=9, upper_limit=11)
+        with mock.patch.object(stock_views, 'get_many_stock_data', side_effect=self.fetch) as fetch:
+            response = self.client.post(URL, {
+                'stocks': ['A.SA', {'name': 'B.SA', 'periodicity': 15}, 'A.SA', 'OLD.SA', 'BAD.SA'],
+                'periodicity': 30,
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            [(result['name'], result['status']) for result in response.data['results']],
+            [('A.SA', 'created'), ('B.SA', 'created'), ('A.SA', 'duplicate'),
+             ('OLD.SA', 'exists'), ('BAD.SA', 'failed')],
+        )
+        fetch.assert_called_once_with(['A.SA', 'B.SA', 'BAD.SA'])
+        self.assertEqual(
+            dict(Stock.objects.filter(name__in=['A.SA', 'B.SA']).values_list('name', 'periodicity')),
+            {'A.SA': 30, 'B.SA': 15},
+        )
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('carteira.csv', b'\xef\xbb\xbfname,periodicity\nA.SA,10\nB.SA\n', content_type='text/csv')
+        with mock.patch.object(stock_views, 'get_many_stock_data', side_effect=self.fetch):
+            response = self.client.post(URL, {'file': upload, 'periodicity': 5}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            dict(Stock.objects.values_list('name', 'periodicity')), {'A.SA': 10, 'B.SA': 5},
+        )
+
+    def test_rejects_non_utf8_csv(self):
+        upload = SimpleUploadedFile('carteira.csv', 'nome\nAÇÃO3.SA\n'.encode('latin-1'), content_type='text/csv')
+        response = self.client.post(URL, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.data['error'])
+
+    def test_rejects_non_object_body(self):
+        for body in (['A.SA'], 'A.SA', 10):
+            response = self.client.post(URL, body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn('error', response.data)
+
+    def test_rejects_non_text_csv_field(self):
+        response = self.client.post(URL, {'csv': ['A.SA']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_too_many_tickers(self):
+        with self.settings(STOCK_IMPORT_MAX_TICKERS=2):
+            response = self.client.post(URL, {'stocks': ['A.SA', 'B.SA', 'C.SA'], 'periodicity': 5}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_schedules_with_phase(self):
+        names = [f'T{i}.SA' for i in range(6)]
+        with mock.patch.object(stock_views, 'get_many_stock_data', side_effect=self.fetch), \
+                mock.patch.object(stock_views.due_index, 'schedule') as schedule:
+            response = self.client.post(URL, {'stocks': names, 'periodicity': 5}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        stocks = list(Stock.objects.filter(name__in=names))
+        for stock in stocks:
+            expected = Stock(pk=stock.pk, periodicity=5, last_updated=stock.last_updated)
+            expected.schedule_next_update()
+            self.assertEqual(stock.next_due_at, expected.next_due_at)
+        self.assertGreater(len({stock.next_due_at for stock in stocks}), 1)
+        scheduled = schedule.call_args.args[0]
+        self.assertEqual({stock.id: stock.next_due_at for stock in scheduled}, {stock.id: stock.next_due_at for stock in stocks})
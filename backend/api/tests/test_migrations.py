@@ -0,0 +1,37 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MergeDuplicateStocksTests(TransactionTestCase):
+    before = [('api', '0004_pricebar')]
+    after = [('api', '0005_stock_decimal_prices_and_indexes')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_keeps_oldest_and_moves_alerts(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        Stock = apps.get_model('api', 'Stock')
+        Alert = apps.get_model('api', 'Alert')
+        user = User.objects.create(username='a', email='a@x')
+        other = User.objects.create(username='b', email='b@x')
+        prices = {'current_price': '38.123456789', 'lower_limit': '37.5', 'upper_limit': '39.5'}
+        first = Stock.objects.create(user=user, name='PETR4.SA', periodicity=5, **prices)
+        second = Stock.objects.create(user=user, name='PETR4.SA', periodicity=10, **prices)
+        kept = Stock.objects.create(user=other, name='PETR4.SA', periodicity=5, **prices)
+        Alert.objects.create(user=user, stock=second, alert_type='buy_suggestion', timestamp='2025-01-02T10:00:00Z')
+
+        apps = self.migrate(self.after)
+        Stock = apps.get_model('api', 'Stock')
+        Alert = apps.get_model('api', 'Alert')
+        self.assertEqual(sorted(Stock.objects.values_list('id', flat=True)), sorted([first.id, kept.id]))
+        self.assertEqual(list(Alert.objects.values_list('stock_id', flat=True)), [first.id])
+        self.assertEqual(str(Stock.objects.get(id=first.id).current_price), '38.1235')
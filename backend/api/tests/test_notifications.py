@@ -0,0 +1,86 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from api import notifications, tasks
+from api.models import Stock
+from api.tests.test_rate_limit import RedisTestCase
+
+
+def item(name, alert_type='upper'):
+    return {'name': name, 'alert_type': alert_type, 'current_price': 10.5, 'limit': 10.0, 'queued_at': 0}
+
+
+@override_settings(NOTIFICATION_DIGEST_WINDOW=60)
+class PendingAlertsTests(RedisTestCase):
+    keys = (notifications.PENDING_USERS_KEY, notifications.FLUSH_SCHEDULED_KEY,
+            notifications._pending_key(1), notifications._pending_key(2))
+
+    def stock(self, user_id, name):
+        return Stock(user_id=user_id, name=name, current_price=10.5, lower_limit=9, upper_limit=10)
+
+    def test_one_flush_per_window(self):
+        self.assertTrue(notifications.push_alert(self.stock(1, 'A.SA'), 'upper'))
+        self.assertFalse(notifications.push_alert(self.stock(1, 'B.SA'), 'lower'))
+        self.assertFalse(notifications.push_alert(self.stock(2, 'A.SA'), 'upper'))
+
+        pending = notifications.drain_pending()
+        self.assertEqual({user_id: [item['name'] for item in items] for user_id, items in pending.items()},
+                         {1: ['A.SA', 'B.SA'], 2: ['A.SA']})
+        self.assertEqual(pending[1][1]['limit'], 9.0)
+        self.assertEqual(notifications.drain_pending(), {})
+        # depois do envio o proximo alerta abre outra janela
+        self.assertTrue(notifications.push_alert(self.stock(1, 'C.SA'), 'upper'))
+
+
+class BuildEmailTests(SimpleTestCase):
+    def test_single_and_digest(self):
+        user = User(username='ana', email='ana@x')
+        single = notifications.build_email(user, [item('A.SA')])
+        self.assertEqual(single['subject'], 'Recomendação: Vender A.SA')
+        self.assertIn('10,50', single['html'])
+
+        digest = notifications.build_email(user, [item('A.SA'), item('B.SA', 'lower')])
+        self.assertEqual(digest['subject'], 'Recomendações: 2 ativos atingiram seus limites')
+        self.assertIn('A.SA', digest['html'])
+        self.assertIn('B.SA', digest['html'])
+        self.assertEqual(digest['to'], 'ana@x')
+
+
+@override_settings(NOTIFICATION_DIGEST_WINDOW=60)
+class SendStockNotificationTests(SimpleTestCase):
+    def test_schedules_flush_when_window_opens(self):
+        stock = Stock(id=1, user_id=1, name='A.SA', current_price=10.5, lower_limit=9, upper_limit=10)
+        with mock.patch.object(tasks.notifications, 'push_alert', side_effect=[True, False]), \
+                mock.patch.object(tasks.flush_notifications, 'apply_async') as apply_async:
+            tasks.send_stock_notification(stock, 'upper')
+            tasks.send_stock_notification(stock, 'upper')
+        apply_async.assert_called_once_with(countdown=60)
+
+
+class FlushNotificationsTests(TestCase):
+    def test_one_email_per_user_in_batches_of_100(self):
+        User.objects.bulk_create(
+            [User(username=f'u{i}', email=f'u{i}@x') for i in range(150)] + [User(username='noemail', email='')]
+        )
+        users = list(User.objects.order_by('id'))
+        pending = {user.id: [item('A.SA'), item('B.SA', 'lower')] for user in users}
+        with mock.patch.object(tasks.notifications, 'drain_pending', return_value=pending), \
+                mock.patch.object(tasks.send_email_batch, 'delay') as delay:
+            tasks.flush_notifications()
+        self.assertEqual([len(call.args[0]) for call in delay.call_args_list], [100, 50])
+        self.assertEqual(sum(len(call.args[1]) for call in delay.call_args_list), 300)
+        self.assertNotIn('', [message['to'] for call in delay.call_args_list for message in call.args[0]])
+
+
+class SendEmailBatchTests(SimpleTestCase):
+    def test_retries_until_sent(self):
+        with mock.patch.object(tasks.resend.Batch, 'send', side_effect=[RuntimeError, RuntimeError, None]) as send:
+            result = tasks.send_email_batch.apply(args=([{'to': 'a@x'}],))
+        self.assertTrue(result.successful())
+        self.assertEqual(send.call_count, 3)
+
+    def test_gives_up_after_max_retries(self):
+        with mock.patch.object(tasks.resend.Batch, 'send', side_effect=RuntimeError) as send:
+            result = tasks.send_email_batch.apply(args=([{'to': 'a@x'}],))
+        self.assertTrue(result.failed())
+        self.assertEqual(send.call_count, tasks.send_email_batch.max_retries + 1)
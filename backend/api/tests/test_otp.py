@@ -0,0 +1,62 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from api import tasks
+from api.views import otp_views
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class SendOTPViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_queues_the_email_and_reports_status(self):
+        with mock.patch.object(otp_views.send_otp_email, 'delay') as delay:
+            response = self.client.post('/api/user/send-otp/', {'email': 'a@x.com'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['user_exists'])
+        # o codigo fica na cache, nunca nos argumentos da task
+        delay.assert_called_once_with('a@x.com', False)
+        self.assertRegex(cache.get('otp_a@x.com'), r'^\d{6}$')
+
+        response = self.client.get('/api/user/otp-status/', {'email': 'a@x.com'})
+        self.assertEqual(response.data, {'status': 'queued'})
+
+    def test_status_without_code(self):
+        response = self.client.get('/api/user/otp-status/', {'email': 'b@x.com'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class SendOTPEmailTaskTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_sends_code_from_cache(self):
+        cache.set('otp_a@x.com', '123456')
+        with mock.patch.object(tasks.resend.Emails, 'send') as send:
+            tasks.send_otp_email.apply(args=('a@x.com', False))
+        self.assertIn('123456', send.call_args.args[0]['html'])
+        self.assertEqual(cache.get('otp_status_a@x.com'), 'sent')
+
+    def test_expired_code_is_not_sent(self):
+        with mock.patch.object(tasks.resend.Emails, 'send') as send:
+            tasks.send_otp_email.apply(args=('a@x.com', False))
+        send.assert_not_called()
+        self.assertEqual(cache.get('otp_status_a@x.com'), 'expired')
+
+    def test_retries_then_marks_failed(self):
+        cache.set('otp_a@x.com', '123456')
+        with mock.patch.object(tasks.resend.Emails, 'send', side_effect=RuntimeError) as send:
+            result = tasks.send_otp_email.apply(args=('a@x.com', False))
+        self.assertTrue(result.failed())
+        self.assertEqual(send.call_count, tasks.send_otp_email.max_retries + 1)
+        self.assertEqual(cache.get('otp_status_a@x.com'), 'failed')
+
+    def test_routed_to_otp_queue(self):
+        route = tasks.send_otp_email.app.amqp.router.route({}, tasks.send_otp_email.name)
+        self.assertEqual(route['queue'].name, 'otp')
@@ -0,0 +1,59 @@
+import datetime
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api.models import Alert, Stock
+
+START = timezone.make_aware(datetime.datetime(2025, 1, 2, 10, 0))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='a', email='a@x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def alert(self, minutes):
+        return Alert.objects.create(
+            user=self.user, asset_name='PETR4.SA', alert_type='buy_suggestion',
+            timestamp=START + datetime.timedelta(minutes=minutes),
+        )
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_alerts_follow_timestamp_then_id(self):
+        # varios alertas no mesmo instante, pra cortar paginas no meio de um empate
+        alerts = [self.alert(minutes) for minutes in (0, 5, 5, 5, 1, 5, 3, 0)]
+        expected = [alert.id for alert in sorted(alerts, key=lambda alert: (alert.timestamp, alert.id), reverse=True)]
+        for page_size in (1, 2, 3, 8, 50):
+            self.assertEqual(self.walk(f'/api/alert/list/?page_size={page_size}'), expected, page_size)
+
+    def test_insert_while_paging_does_not_repeat(self):
+        for minutes in range(6):
+            self.alert(minutes)
+        first = self.client.get('/api/alert/list/?page_size=3')
+        seen = [row['id'] for row in first.data['results']]
+        newest = self.alert(60)
+        seen += self.walk(first.data['next'])
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 6)
+        self.assertNotIn(newest.id, seen)
+
+    def test_stocks_follow_id(self):
+        stocks = [
+            Stock.objects.create(user=self.user, name=f'T{i}.SA', periodicity=5) for i in range(5)
+        ]
+        self.assertEqual(self.walk('/api/stock/list/?page_size=2'), [stock.id for stock in stocks])
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'WzFd', 'eyJhIjogMX0='):
+            response = self.client.get('/api/alert/list/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
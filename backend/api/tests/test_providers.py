@@ -0,0 +1,37 @@
+import json
+import os
+import tempfile
+from django.test import SimpleTestCase, override_settings
+from api.benchmark import synthetic_daily_series
+from utils.providers import ReplayProvider, replay_path
+
+
+class ReplayPathTests(SimpleTestCase):
+    def test_accepts_tickers(self):
+        self.assertEqual(replay_path('/data', 'ITUB4.SA'), os.path.join('/data', 'ITUB4.SA.json'))
+
+    def test_rejects_names_outside_the_directory(self):
+        for ticker in ('../secret', 'A/B', '..', '', 'itub4.sa', 'ITUB4.SA\x00'):
+            with self.assertRaises(ValueError, msg=ticker):
+                replay_path('/data', ticker)
+
+
+class ReplayProviderLoadTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(MARKET_DATA_REPLAY_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_invalid_ticker_is_a_miss(self):
+        self.assertIsNone(ReplayProvider()._load('../ITUB4.SA'))
+
+    def test_miss_is_not_cached(self):
+        provider = ReplayProvider()
+        self.assertIsNone(provider._load('ITUB4.SA'))
+        with open(os.path.join(self.directory, 'ITUB4.SA.json'), 'w') as file:
+            json.dump(synthetic_daily_series('ITUB4.SA', bars=120), file)
+        series = provider._load('ITUB4.SA')
+        self.assertEqual(len(series), 120)
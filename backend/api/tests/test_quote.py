@@ -0,0 +1,106 @@
+import asyncio
+from unittest import mock
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from api.models import PriceBar, TickerStats
+from api.views import stock_views
+from utils import fetcher, rate_limit
+from utils.finance import calculate_volatility
+from utils.rate_limit import Throttled
+from utils.timeseries import TimeSeries
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_series(closes):
+    closes = np.asarray(closes, dtype=np.float64)
+    volumes = np.full(len(closes), 5_000_000, dtype=np.int64)
+    return TimeSeries('PETR4.SA', np.arange(20000, 20000 + len(closes), dtype=np.int64), closes, volumes)
+
+
+@override_settings(CACHES=LOCAL_CACHE, STOCK_QUOTE_CACHE_TTL=60, VOLATILITY_WINDOW=30)
+class StockQuoteViewTests(TestCase):
+    url = '/api/stock/quote/?name=PETR4&periodicity=5'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.series = make_series(np.linspace(30, 40, 120))
+        patch = mock.patch.object(stock_views, 'get_stock_data', return_value=self.series)
+        self.get_stock_data = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=', response['Cache-Control'])
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # a segunda resposta veio do cache do servidor, sem buscar a serie de novo
+        self.get_stock_data.assert_called_once_with('PETR4.SA')
+
+        # a periodicidade volta no corpo, entao outra periodicidade tem outro ETag
+        response = self.client.get('/api/stock/quote/?name=PETR4&periodicity=10', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_read_only(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(PriceBar.objects.exists())
+        self.assertFalse(TickerStats.objects.exists())
+
+    def test_volatility_uses_window(self):
+        calculate_limits = mock.Mock(return_value=None)
+        with mock.patch.object(stock_views, 'calculate_limits', calculate_limits):
+            self.client.get(self.url)
+        volatility = calculate_limits.call_args.kwargs['volatility']
+        self.assertAlmostEqual(volatility, calculate_volatility(self.series.closes[-30:]))
+
+    def test_throttled_fails_fast(self):
+        seen = []
+
+        def throttled(name):
+            seen.append(rate_limit._max_wait.get())
+            raise Throttled(name)
+
+        self.get_stock_data.side_effect = throttled
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(seen, [0])
+
+
+class NoWaitTests(TestCase):
+    def test_reaches_fetcher_loop(self):
+        async def max_wait():
+            return rate_limit._max_wait.get()
+
+        with rate_limit.no_wait():
+            self.assertEqual(fetcher.run_sync(max_wait()), 0)
+        self.assertIsNone(fetcher.run_sync(max_wait()))
+
+    @override_settings(MARKET_DATA_RATE_PER_MINUTE=5, MARKET_DATA_RATE_PER_DAY=0)
+    def test_acquire_does_not_wait(self):
+        client = mock.Mock()
+        client.eval.return_value = [2000, 0]
+        with mock.patch.object(rate_limit, 'get_redis', return_value=client), \
+                mock.patch.object(rate_limit.time, 'sleep') as sleep:
+            with rate_limit.no_wait():
+                self.assertFalse(rate_limit.acquire(5))
+        sleep.assert_not_called()
+
+    @override_settings(MARKET_DATA_RATE_PER_MINUTE=5, MARKET_DATA_RATE_PER_DAY=0)
+    def test_acquire_async_does_not_wait(self):
+        client = mock.Mock()
+        client.eval = mock.AsyncMock(return_value=[2000, 0])
+        with mock.patch.object(rate_limit, 'get_async_redis', return_value=client):
+            with rate_limit.no_wait():
+                self.assertFalse(asyncio.run(rate_limit.acquire_async(5)))
+        client.eval.assert_awaited_once()
@@ -0,0 +1,96 @@
+import threading
+import time
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from utils import quote_cache
+from utils.rate_limit import Throttled
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE, QUOTE_CACHE_TTL=60, QUOTE_CACHE_LOCAL_TTL=10, QUOTE_CACHE_NEGATIVE_TTL=15)
+class QuoteCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        quote_cache._local.clear()
+
+    def concurrent(self, fetch, waiters=5):
+        # o primeiro pedido fica preso no fetch ate os outros estarem esperando por ele
+        release = threading.Event()
+        results = []
+
+        def blocked_fetch(ticker):
+            release.wait(5)
+            return fetch(ticker)
+
+        def call():
+            try:
+                results.append(quote_cache.get_or_fetch('A.SA', blocked_fetch))
+            except Throttled as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        while 'A.SA' not in quote_cache._inflight:
+            time.sleep(0.001)
+        threads += [threading.Thread(target=call) for _ in range(waiters)]
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_single_flight(self):
+        fetch = mock.Mock(return_value='series')
+        self.assertEqual(self.concurrent(fetch), ['series'] * 6)
+        fetch.assert_called_once_with('A.SA')
+
+    def test_waiters_see_leader_throttled(self):
+        fetch = mock.Mock(side_effect=Throttled('A.SA'))
+        results = self.concurrent(fetch)
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(isinstance(result, Throttled) for result in results))
+        fetch.assert_called_once_with('A.SA')
+        self.assertIsNone(cache.get(quote_cache._key('A.SA')))
+
+    def test_negative_cache(self):
+        fetch = mock.Mock(side_effect=[None, 'series'])
+        with mock.patch.object(quote_cache.time, 'time', return_value=1000.0):
+            self.assertIsNone(quote_cache.get_or_fetch('A.SA', fetch))
+            quote_cache._local.clear()
+            self.assertIsNone(quote_cache.get_or_fetch('A.SA', fetch))
+        self.assertEqual(fetch.call_count, 1)
+
+        # a falha expira em QUOTE_CACHE_NEGATIVE_TTL e o proximo pedido volta no provedor
+        cache.delete(quote_cache._key('A.SA'))
+        quote_cache._local.clear()
+        self.assertEqual(quote_cache.get_or_fetch('A.SA', fetch), 'series')
+        self.assertEqual(fetch.call_count, 2)
+
+    @override_settings(QUOTE_CACHE_POLL_INTERVAL=0.01)
+    def test_waits_for_other_process(self):
+        # outro processo segura o lock e grava a cotacao no cache compartilhado
+        cache.add(quote_cache._lock_key('A.SA'), 'other')
+        timer = threading.Timer(0.05, lambda: cache.set(quote_cache._key('A.SA'), (time.time(), 'series')))
+        timer.start()
+        fetch = mock.Mock()
+        self.assertEqual(quote_cache.get_or_fetch('A.SA', fetch), 'series')
+        timer.join()
+        fetch.assert_not_called()
+
+    def test_max_age_refetches_older_entries(self):
+        fetch = mock.Mock(side_effect=['old', 'new'])
+        with mock.patch.object(quote_cache.time, 'time', return_value=1000.0):
+            self.assertEqual(quote_cache.get_or_fetch('A.SA', fetch), 'old')
+        with mock.patch.object(quote_cache.time, 'time', return_value=1020.0):
+            self.assertEqual(quote_cache.get_or_fetch('A.SA', fetch), 'old')
+            self.assertEqual(quote_cache.get_or_fetch('A.SA', fetch, max_age=15), 'new')
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_entries_without_fetch_time_are_ignored(self):
+        cache.set(quote_cache._key('A.SA'), 'series')
+        self.assertIsNone(quote_cache.get_cached('A.SA'))
+        self.assertEqual(quote_cache.get_or_fetch('A.SA', lambda ticker: 'fresh'), 'fresh')
@@ -0,0 +1,126 @@
+import asyncio
+import os
+from datetime import timedelta
+from unittest import mock, skipUnless
+import redis
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from api import refresh_queue
+from api.models import Stock
+from utils import rate_limit, redis_client
+
+# os testes do script Lua e do sorted set precisam de um Redis de verdade, num banco descartavel
+# (as chaves do limitador e da fila sao apagadas), ex.: TEST_REDIS_URL=redis://localhost:6379/15
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+@skipUnless(TEST_REDIS_URL, "TEST_REDIS_URL nao configurada")
+@override_settings(CACHE_REDIS_URL=TEST_REDIS_URL)
+class RedisTestCase(SimpleTestCase):
+    keys = ()
+
+    def setUp(self):
+        self.reset_clients()
+        self.addCleanup(self.reset_clients)
+        redis_client.get_redis().delete(*self.keys)
+        self.addCleanup(lambda: redis_client.get_redis().delete(*self.keys))
+
+    def reset_clients(self):
+        redis_client._client = redis_client._async_client = None
+
+
+@override_settings(MARKET_DATA_RATE_PER_MINUTE=3, MARKET_DATA_RATE_PER_DAY=100)
+class TokenBucketTests(RedisTestCase):
+    keys = rate_limit.BUCKET_KEYS
+
+    def test_minute_bucket(self):
+        self.assertEqual(rate_limit.available(), 3)
+        self.assertEqual([rate_limit.try_acquire()[0] for _ in range(3)], [True] * 3)
+        acquired, wait = rate_limit.try_acquire()
+        self.assertFalse(acquired)
+        # 3 tokens por minuto: o proximo chega em ate 20 segundos
+        self.assertGreater(wait, 15)
+        self.assertLessEqual(wait, 20)
+        self.assertEqual(rate_limit.available(), 0)
+
+    @override_settings(MARKET_DATA_RATE_PER_MINUTE=10, MARKET_DATA_RATE_PER_DAY=2)
+    def test_day_bucket_limits_too(self):
+        self.assertEqual([rate_limit.try_acquire()[0] for _ in range(3)], [True, True, False])
+        # o bucket do minuto nao perdeu token na tentativa barrada pelo do dia
+        self.assertEqual(int(float(redis_client.get_redis().hget(rate_limit.BUCKET_KEYS[0], 'tokens'))), 8)
+
+    def test_acquire_gives_up_past_the_timeout(self):
+        for _ in range(3):
+            rate_limit.try_acquire()
+        with mock.patch.object(rate_limit.time, 'sleep') as sleep:
+            self.assertFalse(rate_limit.acquire(5))
+        sleep.assert_not_called()
+
+    def test_drain_minute(self):
+        asyncio.run(rate_limit.drain_minute_async())
+        self.assertFalse(rate_limit.try_acquire()[0])
+
+
+class TokenBucketFallbackTests(SimpleTestCase):
+    @override_settings(MARKET_DATA_RATE_PER_MINUTE=3, MARKET_DATA_RATE_PER_DAY=100, MARKET_DATA_BATCH_SIZE=7)
+    def test_redis_down_lets_requests_through(self):
+        client = mock.Mock()
+        client.eval.side_effect = redis.ConnectionError("down")
+        with mock.patch.object(rate_limit, 'get_redis', return_value=client):
+            self.assertEqual(rate_limit.try_acquire(), (True, 0.0))
+            self.assertEqual(rate_limit.available(), 7)
+
+    @override_settings(MARKET_DATA_RATE_PER_MINUTE=0, MARKET_DATA_RATE_PER_DAY=0)
+    def test_disabled(self):
+        with mock.patch.object(rate_limit, 'get_redis') as get_redis:
+            self.assertEqual(rate_limit.try_acquire(), (True, 0.0))
+        get_redis.assert_not_called()
+
+
+class RefreshQueueTests(RedisTestCase):
+    keys = (refresh_queue.QUEUE_KEY,)
+
+    def test_pop_in_priority_order(self):
+        refresh_queue.replace_queue({'A.SA': 1.0, 'B.SA': 5.0, 'C.SA': 3.0})
+        self.assertEqual(refresh_queue.pop(2), {'B.SA': 5.0, 'C.SA': 3.0})
+        refresh_queue.push({'B.SA': 5.0})
+        self.assertEqual(list(refresh_queue.pop(5)), ['B.SA', 'A.SA'])
+        self.assertEqual(refresh_queue.pop(5), {})
+
+    def test_replace_drops_the_previous_cycle(self):
+        refresh_queue.replace_queue({'A.SA': 1.0})
+        refresh_queue.replace_queue({'B.SA': 2.0})
+        self.assertEqual(refresh_queue.pop(5), {'B.SA': 2.0})
+
+
+@override_settings(MARKET_DATA_PROXIMITY_WEIGHT=10)
+class DueTickerPrioritiesTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create(username='a', email='a@x')
+
+    def stock(self, name, minutes_late, price=10, lower=5, upper=15, **fields):
+        stock = Stock.objects.create(
+            user=self.user, name=name, periodicity=5, current_price=price, lower_limit=lower, upper_limit=upper, **fields,
+        )
+        Stock.objects.filter(id=stock.id).update(next_due_at=self.now - timedelta(minutes=minutes_late))
+        return stock
+
+    def test_overdue_and_close_to_a_limit_come_first(self):
+        self.stock('LATE.SA', 30)
+        self.stock('CLOSE.SA', 1, upper=10.01)
+        self.stock('FAR.SA', 1)
+        self.stock('LATER.SA', -5)
+        priorities = refresh_queue.due_ticker_priorities(self.now)
+        self.assertEqual(sorted(priorities, key=priorities.get, reverse=True), ['LATE.SA', 'CLOSE.SA', 'FAR.SA'])
+        # no limite vale o peso inteiro, 0,1% longe vale um pouco menos
+        self.assertAlmostEqual(priorities['CLOSE.SA'] - 1, 10 / 1.1, places=3)
+
+    def test_filters(self):
+        a = self.stock('A.SA', 1)
+        self.stock('B.SA', 1)
+        self.stock('P.SA', 1, status=Stock.STATUS_PENDING)
+        self.assertEqual(set(refresh_queue.due_ticker_priorities(self.now)), {'A.SA', 'B.SA'})
+        self.assertEqual(set(refresh_queue.due_ticker_priorities(self.now, ids=[a.id])), {'A.SA'})
+        self.assertEqual(set(refresh_queue.due_ticker_priorities(self.now, names=['B.SA'])), {'B.SA'})
@@ -0,0 +1,140 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from api import due_index, scheduler, tasks
+from api.models import Stock
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def create_stock(user, name, due=True, **fields):
+    stock = Stock.objects.create(
+        user=user, name=name, periodicity=5, current_price=10, lower_limit=9, upper_limit=11, **fields,
+    )
+    if due:
+        Stock.objects.filter(id=stock.id).update(next_due_at=timezone.now() - timedelta(seconds=5))
+    return stock
+
+
+class TickTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='a', email='a@x')
+        patches = {
+            'push': mock.patch.object(scheduler.refresh_queue, 'push'),
+            'delay': mock.patch.object(scheduler.drain_refresh_queue, 'delay'),
+        }
+        self.mocks = {name: patch.start() for name, patch in patches.items()}
+        self.addCleanup(mock.patch.stopall)
+
+    def tick(self, claimed):
+        with mock.patch.object(scheduler.due_index, 'claim', return_value=claimed):
+            return scheduler.tick(timezone.now().timestamp())
+
+    def test_nothing_claimed(self):
+        self.assertEqual(self.tick({}), 0)
+        self.mocks['push'].assert_not_called()
+        self.mocks['delay'].assert_not_called()
+
+    def test_claimed_but_no_longer_due(self):
+        stock = create_stock(self.user, 'A.SA', due=False)
+        self.assertEqual(self.tick({stock.id: 0.0}), 1)
+        self.mocks['push'].assert_not_called()
+        self.mocks['delay'].assert_not_called()
+
+    def test_claimed_and_due(self):
+        stock = create_stock(self.user, 'A.SA')
+        self.assertEqual(self.tick({stock.id: 0.0}), 1)
+        self.assertEqual(list(self.mocks['push'].call_args.args[0]), ['A.SA'])
+        self.mocks['delay'].assert_called_once_with()
+
+
+@override_settings(UPDATE_SCHEDULER='due')
+class DueIndexRetryTests(TestCase):
+    def test_readds_due_stocks_of_failed_tickers(self):
+        user = User.objects.create(username='a', email='a@x')
+        other = User.objects.create(username='b', email='b@x')
+        due = create_stock(user, 'A.SA')
+        create_stock(other, 'A.SA', due=False)
+        create_stock(other, 'B.SA')
+        at = timezone.now() + timedelta(seconds=15)
+        client = mock.Mock()
+        with mock.patch.object(due_index, 'get_redis', return_value=client):
+            due_index.retry(['A.SA'], at)
+        client.zadd.assert_called_once_with(due_index.DUE_KEY, {str(due.id): at.timestamp()})
+
+
+@override_settings(UPDATE_SCHEDULER='due', QUOTE_CACHE_TTL=60, SCHEDULER_MIN_PERIOD_SECONDS=10, CACHES=LOCAL_CACHE)
+class PeriodicitySecondsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='a', email='a@x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patch = mock.patch.object(due_index, 'get_redis')
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_floor_is_min_period(self):
+        stock = create_stock(self.user, 'A.SA')
+        response = self.client.put(f'/api/stock/update/{stock.id}/', {'periodicity_seconds': 5}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(f'/api/stock/update/{stock.id}/', {'periodicity_seconds': 30}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_minutes_follow_seconds(self):
+        stock = create_stock(self.user, 'A.SA')
+        response = self.client.put(f'/api/stock/update/{stock.id}/', {'periodicity_seconds': 90}, format='json')
+        self.assertEqual(response.status_code, 200)
+        stock.refresh_from_db()
+        self.assertEqual((stock.periodicity, stock.periodicity_seconds), (2, 90))
+
+        response = self.client.put(f'/api/stock/update/{stock.id}/', {'periodicity': 7}, format='json')
+        self.assertEqual(response.status_code, 200)
+        stock.refresh_from_db()
+        self.assertEqual((stock.periodicity, stock.periodicity_seconds), (7, None))
+
+
+class ScheduleNextUpdateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='a', email='a@x')
+
+    def test_due_within_one_to_two_periods(self):
+        for seconds in (10, 45, 300):
+            stock = create_stock(self.user, f'S{seconds}.SA', due=False, periodicity_seconds=seconds)
+            for offset in range(0, 3000, 7):
+                stock.last_updated = timezone.now() + timedelta(milliseconds=offset)
+                stock.schedule_next_update()
+                delay = (stock.next_due_at - stock.last_updated).total_seconds()
+                self.assertGreaterEqual(delay, seconds - 1e-3)
+                self.assertLess(delay, 2 * seconds)
+
+    def test_create_applies_phase(self):
+        stocks = [create_stock(self.user, f'P{i}.SA', due=False, periodicity_seconds=60) for i in range(5)]
+        phases = set()
+        for stock in stocks:
+            stored = Stock.objects.get(id=stock.id).next_due_at
+            self.assertEqual(stored, stock.next_due_at)
+            phases.add(round(stored.timestamp() % 60, 3))
+        self.assertGreater(len(phases), 1)
+
+
+@override_settings(QUOTE_CACHE_TTL=60, CACHES=LOCAL_CACHE)
+class QuoteMaxAgeTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='a', email='a@x')
+        self.stock = create_stock(user, 'A.SA', periodicity_seconds=15)
+
+    def run_update(self):
+        with mock.patch.object(tasks, 'get_stock_data', return_value=None) as get_stock_data, \
+                mock.patch.object(tasks.due_index, 'retry'):
+            tasks.update_stocks_for_ticker('A.SA')
+        return get_stock_data.call_args.kwargs['max_age']
+
+    def test_short_period_caps_quote_age(self):
+        self.assertEqual(self.run_update(), 15)
+
+    def test_long_period_uses_cache_ttl(self):
+        Stock.objects.filter(id=self.stock.id).update(periodicity_seconds=None)
+        self.assertIsNone(self.run_update())
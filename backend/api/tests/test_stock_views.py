@@ -0,0 +1,97 @@
+from decimal import Decimal
+from unittest import mock
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from api import due_index, tasks
+from api.models import Stock
+from api.views import stock_views
+from api.tests.test_finance import make_series
+from utils.rate_limit import Throttled
+
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class BackgroundLimitsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='a', email='a@x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        patches = {
+            'redis': mock.patch.object(due_index, 'get_redis'),
+            'delay': mock.patch.object(stock_views.compute_stock_limits, 'delay'),
+            # nenhum endpoint pode buscar a cotacao dentro do request
+            'view_fetch': mock.patch.object(stock_views, 'get_stock_data', side_effect=AssertionError),
+            'publish': mock.patch.object(tasks.events, 'publish_stocks'),
+        }
+        self.mocks = {name: patch.start() for name, patch in patches.items()}
+        self.addCleanup(mock.patch.stopall)
+
+    def ready_stock(self, **fields):
+        return Stock.objects.create(
+            user=self.user, name='PETR4.SA', periodicity=5, current_price=10, lower_limit=9, upper_limit=11, **fields,
+        )
+
+    def test_create_returns_202(self):
+        response = self.client.post('/api/stock/create/', {'name': 'PETR4.SA', 'periodicity': 5}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'], '/api/stock/profile/PETR4.SA/')
+        self.assertEqual(response.data['status'], Stock.STATUS_PENDING)
+        self.assertIsNone(response.data['upper_limit'])
+        self.mocks['delay'].assert_called_once_with(response.data['id'])
+
+        response = self.client.post('/api/stock/create/', {'name': 'PETR4.SA', 'periodicity': 5}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_periodicity_only_put_does_not_fetch(self):
+        stock = self.ready_stock()
+        response = self.client.put(f'/api/stock/update/{stock.id}/', {'periodicity': 15}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], Stock.STATUS_READY)
+        self.mocks['delay'].assert_not_called()
+        stock.refresh_from_db()
+        self.assertEqual((stock.periodicity, stock.upper_limit), (15, Decimal('11')))
+
+    def test_refresh_put_returns_202(self):
+        stock = self.ready_stock()
+        response = self.client.put(f'/api/stock/update/{stock.id}/', {'refresh': True}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.mocks['delay'].assert_called_once_with(stock.id)
+        stock.refresh_from_db()
+        # o tunel anterior continua valendo enquanto o recalculo nao termina
+        self.assertEqual((stock.status, stock.upper_limit), (Stock.STATUS_PENDING, Decimal('11')))
+
+    def compute(self, stock, **patch):
+        with mock.patch.object(tasks, 'get_stock_data', **patch) as get_stock_data, \
+                mock.patch.object(tasks, 'refresh_history', return_value=0.0):
+            tasks.compute_stock_limits.apply(args=(stock.id,))
+        stock.refresh_from_db()
+        return get_stock_data
+
+    def test_compute_fills_the_tunnel(self):
+        stock = Stock.objects.create(user=self.user, name='PETR4.SA', periodicity=5, status=Stock.STATUS_PENDING)
+        self.compute(stock, return_value=make_series('PETR4.SA', np.linspace(9, 10, 30), 2_000_000))
+        self.assertEqual(stock.status, Stock.STATUS_READY)
+        self.assertEqual(stock.current_price, Decimal('10'))
+        self.assertEqual((stock.lower_limit, stock.upper_limit), (Decimal('9.85'), Decimal('10.15')))
+        self.assertIsNotNone(stock.next_due_at)
+
+    def test_compute_throttled_stays_pending(self):
+        stock = Stock.objects.create(user=self.user, name='PETR4.SA', periodicity=5, status=Stock.STATUS_PENDING)
+        with mock.patch.object(tasks.compute_stock_limits, 'apply_async') as apply_async:
+            self.compute(stock, side_effect=Throttled('PETR4.SA'))
+        self.assertEqual(stock.status, Stock.STATUS_PENDING)
+        apply_async.assert_called_once()
+
+    def test_compute_without_data(self):
+        new = Stock.objects.create(user=self.user, name='NEW.SA', periodicity=5, status=Stock.STATUS_PENDING)
+        get_stock_data = self.compute(new, return_value=None)
+        self.assertEqual(new.status, Stock.STATUS_FAILED)
+        self.assertEqual(get_stock_data.call_count, tasks.compute_stock_limits.max_retries + 1)
+
+        # num recalculo o ativo volta pro tunel anterior
+        old = self.ready_stock(status=Stock.STATUS_PENDING)
+        self.compute(old, return_value=None)
+        self.assertEqual((old.status, old.upper_limit), (Stock.STATUS_READY, Decimal('11')))
@@ -0,0 +1,82 @@
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from api import tasks
+from api.models import Alert, Stock
+
+LIMITS = {'PBT': 10.0, 'buy_limit': 9.5, 'sell_limit': 10.5}
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class UpdateStocksForTickerTests(TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(tasks, 'get_stock_data', return_value=object()),
+            mock.patch.object(tasks, 'refresh_history', return_value=0.0),
+            mock.patch.object(tasks, 'calculate_limits', return_value=LIMITS),
+            mock.patch.object(tasks, 'send_stock_notification'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def stock(self, price, lower, upper, due=True, **fields):
+        stock = Stock.objects.create(
+            user=User.objects.create(username=f'u{Stock.objects.count()}', email='u@x'),
+            name='PETR4.SA', periodicity=5, current_price=price, lower_limit=lower, upper_limit=upper, **fields,
+        )
+        if due:
+            Stock.objects.filter(id=stock.id).update(next_due_at=None)
+        return stock
+
+    def test_alerts_recentre_and_reschedule(self):
+        inside = self.stock(10.0, 9.8, 10.2, alert_upper_sent=True)
+        upper = self.stock(10.0, 9.0, 9.9)
+        lower = self.stock(10.5, 10.1, 11.0)
+        fake = self.stock(12.0, 9.0, 11.0, fake=True)
+        below_threshold = self.stock(10.1, 5.0, 20.0)
+        at_threshold = self.stock(10.1011, 5.0, 20.0)
+        not_due = self.stock(20.0, 9.0, 9.5, due=False)
+
+        tasks.update_stocks_for_ticker('PETR4.SA')
+
+        alerts = {(alert.stock_id, alert.alert_type) for alert in Alert.objects.all()}
+        self.assertEqual(alerts, {
+            (upper.id, 'sell_suggestion'), (lower.id, 'buy_suggestion'), (fake.id, 'sell_suggestion'),
+        })
+        inside.refresh_from_db()
+        self.assertFalse(inside.alert_upper_sent)
+
+        recentred = Stock.objects.filter(lower_limit=Decimal('9.5'), upper_limit=Decimal('10.5'))
+        self.assertEqual(set(recentred.values_list('id', flat=True)), {lower.id, at_threshold.id})
+        below_threshold.refresh_from_db()
+        self.assertEqual(below_threshold.current_price, Decimal('10.1'))
+
+        now = timezone.now()
+        due = Stock.objects.exclude(id=not_due.id)
+        self.assertFalse(due.filter(next_due_at__lte=now).exists())
+        self.assertFalse(Stock.objects.filter(next_due_at__isnull=True).exists())
+        not_due.refresh_from_db()
+        self.assertFalse(not_due.alert_lower_sent or not_due.alert_upper_sent)
+
+    def test_second_run_is_idempotent(self):
+        stock = self.stock(10.0, 9.0, 9.9)
+        tasks.update_stocks_for_ticker('PETR4.SA')
+        Stock.objects.filter(id=stock.id).update(next_due_at=None)
+        tasks.update_stocks_for_ticker('PETR4.SA')
+        self.assertEqual(Alert.objects.count(), 1)
+
+    @skipUnless(connection.vendor == 'sqlite', 'plano de execucao do SQLite')
+    def test_crossings_read_the_limit_indexes(self):
+        due = Stock.objects.filter(Stock.due_filter(timezone.now()), name='PETR4.SA')
+        with CaptureQueriesContext(connection) as queries:
+            tasks._crossed_tunnels(due, 10.0)
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries[-1]['sql']}")
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('stock_name_upper_idx', plan)
+        self.assertIn('stock_name_lower_idx', plan)
@@ -0,0 +1,53 @@
+import datetime
+import numpy as np
+from django.test import SimpleTestCase
+from api.benchmark import synthetic_daily_series
+from utils.timeseries import TimeSeries
+
+DAILY = {
+    "2025-01-06": {"1. open": "38.00", "4. close": "38.40", "5. volume": "2500000"},
+    "2025-01-03": {"1. open": "37.80", "4. close": "38.10", "5. volume": "2100000"},
+    "2025-01-02": {"1. open": "37.50", "4. close": "37.90", "5. volume": "1900000"},
+}
+
+
+class TimeSeriesTests(SimpleTestCase):
+    def test_from_daily_json(self):
+        series = TimeSeries.from_daily_json('PETR4.SA', DAILY)
+        self.assertEqual(series.date_list(), [datetime.date(2025, 1, 2), datetime.date(2025, 1, 3), datetime.date(2025, 1, 6)])
+        self.assertEqual(series.closes.dtype, np.float64)
+        self.assertEqual(series.volumes.dtype, np.int64)
+        self.assertEqual((series.ltp, series.best_bid, series.best_offer, series.last_volume), (38.4, 38.4, 38.4, 2500000))
+
+    def test_round_trip(self):
+        for data in (DAILY, synthetic_daily_series('PETR4.SA', bars=120)["Time Series (Daily)"]):
+            series = TimeSeries.from_daily_json('PETR4.SA', data)
+            again = TimeSeries.from_daily_json('PETR4.SA', series.to_daily_json())
+            np.testing.assert_array_equal(again.dates, series.dates)
+            np.testing.assert_array_equal(again.closes, series.closes)
+            np.testing.assert_array_equal(again.volumes, series.volumes)
+            self.assertEqual(list(series.to_daily_json()), sorted(data, reverse=True))
+
+    def test_unordered_keys(self):
+        data = {day: DAILY[day] for day in ("2025-01-03", "2025-01-06", "2025-01-02")}
+        series = TimeSeries.from_daily_json('PETR4.SA', data)
+        self.assertEqual(series.closes.tolist(), [37.9, 38.1, 38.4])
+
+    def test_bad_bars(self):
+        data = {**DAILY, "2025-01-03": {"4. close": "n/a", "5. volume": "1"}}
+        series = TimeSeries.from_daily_json('PETR4.SA', data)
+        self.assertEqual(series.closes.tolist(), [37.9, 38.4])
+
+        # sem a ultima barra nao ha cotacao atual confiavel
+        data = {**DAILY, "2025-01-06": {"5. volume": "1"}}
+        self.assertIsNone(TimeSeries.from_daily_json('PETR4.SA', data))
+
+    def test_missing_volume(self):
+        data = {day: {"4. close": bar["4. close"]} for day, bar in DAILY.items()}
+        self.assertEqual(TimeSeries.from_daily_json('PETR4.SA', data).volumes.tolist(), [0, 0, 0])
+
+    def test_tail_shares_arrays(self):
+        series = TimeSeries.from_daily_json('PETR4.SA', DAILY)
+        tail = series.tail(2)
+        self.assertEqual(tail.closes.tolist(), [38.1, 38.4])
+        self.assertTrue(np.shares_memory(tail.closes, series.closes))
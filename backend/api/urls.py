@@ -1,12 +1,15 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views.user_views import UserProfileView, UserCreate, UserListView
-from .views.otp_views import SendOTPView, VerifyOTPView
-from .views.stock_views import StockCreateView, StockUpdateView, StockListView, StockDeleteView, StockProfileView, StockQuoteView, StockUpdatesInfoView, StockTurnOnFakeView, StockUpdateLimitsView
+from .views.otp_views import SendOTPView, VerifyOTPView, OTPStatusView
+from .views.stock_views import StockCreateView, StockImportView, StockUpdateView, StockListView, StockDeleteView, StockProfileView, StockQuoteView, StockUpdatesInfoView, StockSummaryView, StockTurnOnFakeView, StockUpdateLimitsView
 from .views.alert_views import AlertCreateView, UserAlertListView
+from .views.event_views import EventTicketView, event_stream_view
 urlpatterns = [
     # envia o codigo OTP por email
     path('user/send-otp/', SendOTPView.as_view(), name='send_otp'),
+    # situacao do envio do codigo OTP
+    path('user/otp-status/', OTPStatusView.as_view(), name='otp_status'),
     # verifica se o código OTP é válido
     path('user/verify-otp/', VerifyOTPView.as_view(), name='verify_otp'),
     path('user/register/', UserCreate.as_view(), name='register'),
@@ -20,16 +23,25 @@ urlpatterns = [
 
     # endpoints pros ativos
     path('stock/create/', StockCreateView.as_view(), name='stock_create'),
+    # adiciona varios ativos de uma vez (lista de tickers ou carteira CSV)
+    path('stock/import/', StockImportView.as_view(), name='stock_import'),
     path('stock/update/<int:pk>/', StockUpdateView.as_view(), name='stock_update'),
     path('stock/list/', StockListView.as_view(), name='stock_list'),
     path('stock/delete/<int:pk>/', StockDeleteView.as_view(), name='stock_delete'),
     path('stock/profile/<str:name>/', StockProfileView.as_view(), name='stock_profile'),
     path('stock/quote/', StockQuoteView.as_view(), name='stock_quote'),
     path("stocks/updates-info/", StockUpdatesInfoView.as_view(), name="stocks-updates-info"),
+    # resumo do painel (atualizacoes, ativos perto dos limites e alertas recentes)
+    path("stocks/summary/", StockSummaryView.as_view(), name="stocks-summary"),
     
     # endpoints dos alertas
     path('alert/create/', AlertCreateView.as_view(), name='alert_create'),
     path('alert/list/', UserAlertListView.as_view(), name='alert_list'),
+
+    # stream (SSE) com atualizacoes dos ativos e alertas novos em tempo real
+    # o stream é aberto com um ticket de uso unico pedido no events/ticket/
+    path('events/ticket/', EventTicketView.as_view(), name='event_ticket'),
+    path('events/stream/', event_stream_view, name='event_stream'),
     
     # aapenas para desenvolvimento
     # transforma o stock em fake para testar sistema de envio de email
@@ -3,7 +3,14 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.generics import ListAPIView
+from rest_framework.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+import datetime
 from ..models import Alert
+from ..pagination import KeysetPagination
+from .. import dashboard
 from ..serializers.alert_serializers import AlertCreateSerializer, AlertListSerializer
 
 class AlertCreateView(APIView):
@@ -14,15 +21,48 @@ class AlertCreateView(APIView):
         serializer = AlertCreateSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             alert = serializer.save()
+            dashboard.invalidate([request.user.id])
             return Response(AlertListSerializer(alert).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _parse_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    date = parse_date(value)
+    if date is None:
+        raise ValidationError({name: "Data inválida, use o formato AAAA-MM-DD."})
+    return date
+
+
 class UserAlertListView(ListAPIView):
-    # lista todos os alertas do usuario 
+    # lista os alertas do usuario, do mais recente pro mais antigo, paginados por (timestamp, id)
+    # filtros opcionais: ?ticker=ITUB4.SA, ?start=AAAA-MM-DD e ?end=AAAA-MM-DD (inclusivo)
     permission_classes = [IsAuthenticated]
     serializer_class = AlertListSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-timestamp', '-id')
 
     def get_queryset(self):
         user = self.request.user
-        return Alert.objects.filter(user=user).order_by('-timestamp')
+        # o serializer usa stock.name, entao o ativo vem no mesmo SELECT em vez de uma query por alerta
+        queryset = Alert.objects.filter(user=user).select_related('stock')
+
+        ticker = self.request.query_params.get('ticker')
+        if ticker:
+            queryset = queryset.filter(Q(asset_name=ticker) | Q(stock__name=ticker))
+
+        # as datas sao do fuso local, igual ao alert_date devolvido pelo serializer
+        tz = timezone.get_current_timezone()
+        start = _parse_date_param(self.request, 'start')
+        if start:
+            queryset = queryset.filter(
+                timestamp__gte=timezone.make_aware(datetime.datetime.combine(start, datetime.time.min), tz)
+            )
+        end = _parse_date_param(self.request, 'end')
+        if end:
+            queryset = queryset.filter(
+                timestamp__lt=timezone.make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min), tz)
+            )
+        return queryset
@@ -0,0 +1,65 @@
+import logging
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from api import events
+
+logger = logging.getLogger(__name__)
+
+
+class EventTicketView(APIView):
+    # ticket de uso unico pra abrir o stream de eventos (o navegador nao manda o header com o JWT)
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            ticket = events.issue_ticket(request.user.id)
+        except redis.RedisError as e:
+            logger.warning("Não foi possível emitir o ticket do stream: %s", e, extra={'user_id': request.user.id})
+            return Response({"error": "Stream indisponível no momento."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"ticket": ticket, "expires_in": settings.EVENTS_TICKET_TTL})
+
+
+async def _authenticate(request):
+    # o JWT so é aceito no header; o EventSource do navegador manda um ticket de uso unico em ?ticket=
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else None
+    if raw_token is not None:
+        try:
+            validated = auth.get_validated_token(raw_token)
+            return await sync_to_async(auth.get_user)(validated)
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    ticket = request.GET.get('ticket')
+    if not ticket:
+        return None
+    user_id = await sync_to_async(events.redeem_ticket)(ticket)
+    if user_id is None:
+        return None
+    return await User.objects.filter(id=user_id, is_active=True).afirst()
+
+
+@require_GET
+async def event_stream_view(request):
+    # stream SSE com as atualizacoes dos ativos e os alertas novos do usuario (api.events)
+    # é uma view async do Django (fora do DRF), entao precisa ser servida pelo ASGI
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({"error": "Ticket inválido, expirado ou ausente."}, status=401)
+
+    response = StreamingHttpResponse(events.stream(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # desliga o buffer do nginx, senao os eventos so chegam quando o buffer enche
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,18 @@
+import hmac
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from utils import metrics
+
+
+@require_GET
+def metrics_view(request):
+    # exposicao das metricas pro Prometheus (fora do DRF, o scraper nao usa JWT)
+    # sem METRICS_TOKEN o endpoint fica desligado: as metricas nunca sao publicas por padrao
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
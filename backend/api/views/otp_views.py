@@ -4,14 +4,9 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth.models import User
 from django.core.cache import cache
-import os
 import random
-import resend
-from dotenv import load_dotenv
-from ..serializers.otp_serializers import EmailSerializer, OTPVerificationSerializer
-
-load_dotenv()
-resend.api_key = os.getenv("RESEND_API_KEY")
+from ..serializers.otp_serializers import EmailSerializer, OTPVerificationSerializer, OTP_TIMEOUT
+from ..tasks import send_otp_email
 
 class SendOTPView(APIView):
     permission_classes = [AllowAny]
@@ -24,27 +19,11 @@ class SendOTPView(APIView):
 
             user_exists = User.objects.filter(email=email).exists()
             # salva o código OTP na cache (expira em 5 min)
-            cache.set(f"otp_{email}", otp_code, timeout=300)
-
-            # monta a mensagem de e-mail
-            message = (
-                f"Seu código de verificação é: <strong>{otp_code}</strong><br><br>"
-            )
-            if user_exists:
-                message += (
-                    "Já existe uma conta com este e-mail. Após verificar o código, "
-                    "você poderá atualizar seu nome de usuário e senha."
-                )
-            else:
-                message += "Use este código para continuar o cadastro da sua conta."
+            cache.set(f"otp_{email}", otp_code, timeout=OTP_TIMEOUT)
 
-            # envia o e-mail usando Resend
-            resend.Emails.send({
-                "from": "no-reply@b3notifier.me",
-                "to": email,
-                "subject": "Código de Verificação",
-                "html": f"<p>{message}</p>"
-            })
+            # o envio do e-mail fica com o Celery, entao a resposta nao espera o Resend
+            cache.set(f"otp_status_{email}", "queued", timeout=OTP_TIMEOUT)
+            send_otp_email.delay(email, user_exists)
 
             return Response(
                 {"message": "Código enviado com sucesso!", "user_exists": user_exists},
@@ -53,6 +32,22 @@ class SendOTPView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class OTPStatusView(APIView):
+    # situacao do envio do codigo OTP (queued, sent, failed ou expired), pro frontend consultar se precisar
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        serializer = EmailSerializer(data=request.query_params)
+        if serializer.is_valid():
+            email = serializer.validated_data["email"]
+            delivery_status = cache.get(f"otp_status_{email}")
+            if delivery_status is None:
+                return Response({"error": "Nenhum código pendente para este e-mail."},
+                                status=status.HTTP_404_NOT_FOUND)
+            return Response({"status": delivery_status}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class VerifyOTPView(APIView):
     permission_classes = [AllowAny]
 
@@ -63,6 +58,7 @@ class VerifyOTPView(APIView):
             # ao chegar aqui, já passou pela validação de OTP
             # então podemos deletar da cache
             cache.delete(f"otp_{email}")
+            cache.delete(f"otp_status_{email}")
             return Response({"message": "Código verificado com sucesso!"},
                             status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
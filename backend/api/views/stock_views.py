@@ -4,18 +4,42 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.generics import ListAPIView
 from api.models import Stock
-from api.serializers.stock_serializers import StockSerializer
-from utils.finance import get_stock_data, calculate_limits
+from api.serializers.stock_serializers import StockSerializer, minutes_for
+from api.pagination import KeysetPagination
+from api import dashboard, due_index
+from api.tasks import compute_stock_limits
+from api.history import refresh_histories
+from utils.finance import get_stock_data, get_many_stock_data, calculate_limits, calculate_limits_batch, calculate_volatility
+from utils import rate_limit
+from utils.rate_limit import Throttled
 from datetime import timedelta
+import csv
+import hashlib
+import io
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+def _accepted(stock):
+    # 202 com o ativo pendente; o resultado chega pelo stream de eventos ou consultando o Location
+    response = Response(StockSerializer(stock).data, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = reverse('stock_profile', args=[stock.name])
+    return response
 
 class StockCreateView(APIView):
-    # cria um novo ativo na conta do usuario com base nos dados fornecidos e funcoes do utils.finance
+    # cria um novo ativo na conta do usuario; o ativo é gravado na hora como pendente e o tunel
+    # (cotacao e limites do utils.finance) é calculado em background por compute_stock_limits,
+    # assim o request nao fica preso esperando o provedor de cotacoes
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        data = request.data.copy()
-        asset_name = data.get('name')
+        asset_name = request.data.get('name')
         if not asset_name:
             return Response({"error": "O campo 'name' é obrigatório."}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -23,27 +47,200 @@ class StockCreateView(APIView):
         if Stock.objects.filter(user=request.user, name=asset_name).exists():
             return Response({"error": "Este ativo já está sendo monitorado."}, status=status.HTTP_400_BAD_REQUEST)
         
-        stock_data = get_stock_data(asset_name)
-        if not stock_data:
-            return Response({"error": "Não foi possível obter dados do ativo."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # calcula os valores iniciais (PBT e limites)
-        limits = calculate_limits(None, stock_data)
-        if limits is None:
-            return Response({"error": "Variação insuficiente para atualização."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        data['current_price'] = limits['PBT']
-        data['lower_limit'] = limits['buy_limit']
-        data['upper_limit'] = limits['sell_limit']
-        
+        data = {'name': asset_name, 'periodicity': request.data.get('periodicity')}
+        if request.data.get('periodicity_seconds') is not None:
+            # com a periodicidade em segundos a em minutos é opcional
+            data['periodicity_seconds'] = request.data.get('periodicity_seconds')
+            if data['periodicity'] is None:
+                del data['periodicity']
         serializer = StockSerializer(data=data)
         if serializer.is_valid():
-            serializer.save(user=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            # outro request pode ter criado o mesmo ativo entre a checagem e o insert
+            try:
+                stock = serializer.save(user=request.user, status=Stock.STATUS_PENDING)
+            except IntegrityError:
+                return Response({"error": "Este ativo já está sendo monitorado."}, status=status.HTTP_400_BAD_REQUEST)
+            dashboard.invalidate([request.user.id])
+            compute_stock_limits.delay(stock.id)
+            return _accepted(stock)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _parse_import_entries(request):
+    # le os tickers da importacao como lista de (nome, periodicidade) na ordem enviada
+    # aceita JSON {"stocks": ["ITUB4.SA", {"name": "PETR4.SA", "periodicity": 15}], "periodicity": 30}
+    # ou uma carteira CSV (upload em "file" ou texto em "csv") com as colunas nome[,periodicidade]
+    # um corpo que nao da pra ler levanta ValueError com a mensagem pro usuario
+    if not hasattr(request.data, 'get'):
+        raise ValueError("O corpo da requisição tem que ser um objeto JSON.")
+    default_periodicity = request.data.get('periodicity')
+    upload = request.FILES.get('file')
+    if upload:
+        try:
+            text = upload.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError("A carteira CSV tem que estar em UTF-8 (no Excel, salve como 'CSV UTF-8').")
+    else:
+        text = request.data.get('csv')
+        if text is not None and not isinstance(text, str):
+            raise ValueError("O campo 'csv' tem que ser o texto da carteira.")
+    if text:
+        entries = []
+        for row in csv.reader(io.StringIO(text)):
+            row = [cell.strip() for cell in row]
+            if not row or not row[0] or row[0].lower() in ('name', 'nome', 'ticker'):
+                continue
+            entries.append((row[0], row[1] if len(row) > 1 and row[1] else default_periodicity))
+        return entries
+
+    stocks = request.data.get('stocks')
+    if not isinstance(stocks, list):
+        return None
+    entries = []
+    for item in stocks:
+        if isinstance(item, dict):
+            entries.append((str(item.get('name') or '').strip(), item.get('periodicity', default_periodicity)))
+        else:
+            entries.append((str(item).strip(), default_periodicity))
+    return entries
+
+class StockImportView(APIView):
+    # adiciona varios ativos de uma vez (lista de tickers ou carteira em CSV)
+    # os tickers sao deduplicados, os que ja estao no cache compartilhado nao vao no upstream e os que
+    # faltam sao buscados em paralelo; os limites saem de uma unica passada vetorizada e as linhas
+    # entram num unico bulk_create; a resposta traz o resultado de cada ticker
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            entries = _parse_import_entries(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not entries:
+            return Response(
+                {"error": "Envie a lista 'stocks' ou uma carteira CSV ('file' ou 'csv')."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(entries) > settings.STOCK_IMPORT_MAX_TICKERS:
+            return Response(
+                {"error": f"No máximo {settings.STOCK_IMPORT_MAX_TICKERS} ativos por importação."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = []
+        pending = {}  # nome -> (resultado, periodicidade) dos tickers que ainda vao ser criados
+        for name, periodicity in entries:
+            result = {"name": name}
+            results.append(result)
+            if not name or len(name) > Stock._meta.get_field('name').max_length:
+                result.update(status="invalid", error="Código do ativo inválido.")
+                continue
+            if name in pending:
+                result.update(status="duplicate", error="Ativo repetido na importação.")
+                continue
+            try:
+                periodicity = int(periodicity)
+            except (TypeError, ValueError):
+                periodicity = 0
+            if periodicity <= 0:
+                result.update(status="invalid", error="A periodicidade tem que ser um número inteiro positivo.")
+                continue
+            pending[name] = (result, periodicity)
+
+        # uma unica query pros ativos que o usuario ja monitora
+        for name in Stock.objects.filter(user=request.user, name__in=list(pending)).values_list('name', flat=True):
+            result, _ = pending.pop(name)
+            result.update(status="exists", error="Este ativo já está sendo monitorado.")
+
+        series = get_many_stock_data(list(pending)) if pending else {}
+        names = []
+        throttled = []  # sem cota no provedor agora: entram pendentes e o tunel sai pelo compute_stock_limits
+        for name in list(pending):
+            if series.get(name):
+                names.append(name)
+            elif name not in series:
+                throttled.append(name)
+            else:
+                result, _ = pending.pop(name)
+                result.update(status="failed", error="Não foi possível obter dados do ativo.")
+
+        created = []
+        stocks = []
+        if names:
+            data = [series[name] for name in names]
+            # a volatilidade vem do estado incremental de cada ticker, como nos outros calculos do tunel
+            # (historico local de todos os tickers atualizado num numero fixo de queries)
+            volatility = refresh_histories({name: series[name] for name in names})
+            limits = calculate_limits_batch(
+                None,
+                [d.ltp for d in data],
+                [d.best_bid for d in data],
+                [d.best_offer for d in data],
+                [d.last_volume for d in data],
+                volatility=[volatility[name] for name in names],
+            )
+            now = timezone.now()
+            for i, name in enumerate(names):
+                stock = Stock(
+                    user=request.user,
+                    name=name,
+                    periodicity=pending[name][1],
+                    current_price=round(float(limits['PBT'][i]), 4),
+                    lower_limit=float(limits['buy_limit'][i]),
+                    upper_limit=float(limits['sell_limit'][i]),
+                    last_updated=now,
+                )
+                stocks.append(stock)
+        stocks += [
+            Stock(user=request.user, name=name, periodicity=pending[name][1], status=Stock.STATUS_PENDING)
+            for name in throttled
+        ]
+
+        if stocks:
+            try:
+                with transaction.atomic():
+                    created = Stock.objects.bulk_create(stocks)
+                    # o bulk_create nao passa pelo Stock.save, entao agendamos aqui, depois do INSERT:
+                    # a fase de cada ativo na grade de vencimentos vem do id
+                    ready = [stock for stock in created if stock.status == Stock.STATUS_READY]
+                    for stock in ready:
+                        stock.schedule_next_update()
+                    Stock.objects.bulk_update(ready, ['next_due_at'])
+            except IntegrityError:
+                # outro request criou algum desses ativos enquanto buscavamos as cotacoes,
+                # entao inserimos um por um pra saber quais entraram
+                created = []
+                for stock in stocks:
+                    try:
+                        with transaction.atomic():
+                            stock.save()
+                        created.append(stock)
+                    except IntegrityError:
+                        stock.pk = None
+                        result, _ = pending[stock.name]
+                        result.update(status="exists", error="Este ativo já está sendo monitorado.")
+
+            for stock in created:
+                result, _ = pending[stock.name]
+                result.update(
+                    status="created" if stock.status == Stock.STATUS_READY else "pending",
+                    data=StockSerializer(stock).data,
+                )
+                if stock.status == Stock.STATUS_PENDING:
+                    compute_stock_limits.delay(stock.id)
+
+        if created:
+            due_index.schedule(created)
+            dashboard.invalidate([request.user.id])
+
+        return Response(
+            {"created": len(created), "results": results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
 class StockUpdateView(APIView):
-    # atualiza os dados do ativo caso necessario
+    # atualiza a periodicidade do ativo (em minutos e/ou em segundos) e/ou pede o recalculo do tunel
+    # mudar so a periodicidade nunca vai no provedor; o recalculo ({"refresh": true}, ou um PUT sem
+    # periodicidade) marca o ativo como pendente e roda em background, devolvendo 202
     permission_classes = [IsAuthenticated]
 
     def put(self, request, pk):
@@ -52,39 +249,68 @@ class StockUpdateView(APIView):
         except Stock.DoesNotExist:
             return Response({"error": "Ativo não encontrado."}, status=status.HTTP_404_NOT_FOUND)
         
-        # da upadte ma periodicidade antes de calcular os novos valores
         new_periodicity = request.data.get("periodicity")
+        changes_seconds = "periodicity_seconds" in request.data
+        refresh = (
+            (new_periodicity is None and not changes_seconds)
+            or str(request.data.get("refresh", "")).lower() in ("1", "true")
+        )
+        update_fields = []
         if new_periodicity is not None:
             try:
                 stock.periodicity = int(new_periodicity)
-            except ValueError:
+            except (TypeError, ValueError):
                 return Response({"error": "A periodicidade tem que ser um número inteiro válido."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        stock_data = get_stock_data(stock.name)
-        if not stock_data:
-            return Response({"error": "Não foi possível obter dados do ativo."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        limits = calculate_limits(float(stock.current_price), stock_data)
-        if limits is None:
-            # mesmo a variaçao seja insuficiente, salvamos a nova periodicidade
-            stock.save()
-            serializer = StockSerializer(stock)
-            return Response({"message": "Variação insuficiente para atualização.", "data": serializer.data}, status=status.HTTP_200_OK)
-        
-        # da update no ativo com os novos valores
-        stock.current_price = limits['PBT']
-        stock.lower_limit = limits['buy_limit']
-        stock.upper_limit = limits['sell_limit']
-        stock.save()
+            if stock.periodicity <= 0:
+                return Response({"error": "A periodicidade tem que ser um número inteiro válido."}, status=status.HTTP_400_BAD_REQUEST)
+            # o save reagenda o proximo update com a periodicidade nova
+            update_fields += ['periodicity', 'last_updated']
+            if not changes_seconds and stock.periodicity_seconds is not None:
+                # so os minutos vieram: a periodicidade em segundos deixaria de valer o que o usuario pediu
+                stock.periodicity_seconds = None
+                update_fields += ['periodicity_seconds']
+        if changes_seconds:
+            # null volta pra periodicidade em minutos
+            serializer = StockSerializer(
+                stock, data={'periodicity_seconds': request.data.get("periodicity_seconds")}, partial=True,
+            )
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            stock.periodicity_seconds = serializer.validated_data['periodicity_seconds']
+            update_fields += ['periodicity_seconds', 'last_updated']
+            if stock.periodicity_seconds:
+                # os minutos guardam o equivalente arredondado pra cima, como na criacao
+                stock.periodicity = minutes_for(stock.periodicity_seconds)
+                update_fields += ['periodicity']
+        if refresh and not stock.fake:
+            stock.status = Stock.STATUS_PENDING
+            stock.status_message = ''
+            update_fields += ['status', 'status_message']
+
+        if update_fields:
+            stock.save(update_fields=update_fields)
+            due_index.schedule([stock])
+            dashboard.invalidate([request.user.id])
+        if refresh and stock.status == Stock.STATUS_PENDING:
+            compute_stock_limits.delay(stock.id)
+        if stock.status == Stock.STATUS_PENDING:
+            return _accepted(stock)
         serializer = StockSerializer(stock)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 class StockListView(ListAPIView):
+    # lista os ativos do usuario paginados por id, com filtro opcional ?ticker=ITUB4.SA
     permission_classes = [IsAuthenticated]
     serializer_class = StockSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
     def get_queryset(self):
-        return Stock.objects.filter(user=self.request.user)
+        queryset = Stock.objects.filter(user=self.request.user)
+        ticker = self.request.query_params.get('ticker')
+        if ticker:
+            queryset = queryset.filter(name=ticker)
+        return queryset
 
 class StockDeleteView(APIView):
     permission_classes = [IsAuthenticated]
@@ -95,7 +321,10 @@ class StockDeleteView(APIView):
         except Stock.DoesNotExist:
             return Response({"error": "Ativo não encontrado!"}, status=status.HTTP_404_NOT_FOUND)
         
+        stock_id = stock.id
         stock.delete()
+        due_index.remove(stock_id)
+        dashboard.invalidate([request.user.id])
         return Response({"message": "Ativo removido com sucesso!"}, status=status.HTTP_200_OK)
 
 class StockProfileView(APIView):
@@ -111,8 +340,50 @@ class StockProfileView(APIView):
         serializer = StockSerializer(stock)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+def _quote_cache_key(asset_name):
+    return f"stock-quote:{asset_name}"
+
+
+def _get_public_quote(asset_name):
+    # cotacao e limites calculados do ticker, guardados por STOCK_QUOTE_CACHE_TTL
+    # no miss a serie vem do cache de cotacoes (utils.quote_cache), que ja junta pedidos
+    # simultaneos do mesmo ticker numa unica request pro provedor
+    # o endpoint é publico, entao ele so le: sem cota no provedor sai na hora com Throttled (503)
+    # e a volatilidade é a da janela de VOLATILITY_WINDOW da propria serie, o mesmo valor do estado
+    # incremental (api.history), sem gravar historico de tickers que ninguem monitora
+    key = _quote_cache_key(asset_name)
+    quote = cache.get(key)
+    if quote is not None:
+        return quote
+
+    with rate_limit.no_wait():
+        stock_data = get_stock_data(asset_name)
+    if not stock_data:
+        return None
+    volatility = calculate_volatility(stock_data.closes[-settings.VOLATILITY_WINDOW:])
+    limits = calculate_limits(None, stock_data, volatility=volatility)
+    if limits is None:
+        return None
+
+    payload = {
+        "name": asset_name,
+        "current_price": stock_data.ltp,
+        "buy_limit": limits['buy_limit'],
+        "sell_limit": limits['sell_limit'],
+    }
+    quote = {
+        "payload": payload,
+        "etag": hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest(),
+        "computed_at": int(time.time()),
+    }
+    cache.set(key, quote, timeout=settings.STOCK_QUOTE_CACHE_TTL)
+    return quote
+
+
 class StockQuoteView(APIView):
-    # retorna informações do ativo com base nos dados do Yahoo Finance e calcula os limites de compra/venda
+    # retorna a cotação do ativo e calcula os limites de compra/venda
+    # é publica (usada na landing page), entao a resposta é cacheada no servidor por ticker e vai
+    # com Cache-Control, ETag e Last-Modified, permitindo 304 pro navegador e pra CDN
     permission_classes = [AllowAny]
 
     def get(self, request):
@@ -131,48 +402,57 @@ class StockQuoteView(APIView):
         if not asset_name.endswith(".SA"):
             asset_name += ".SA"
 
-        stock_data = get_stock_data(asset_name)
-        if not stock_data:
+        try:
+            quote = _get_public_quote(asset_name)
+        except Throttled:
+            response = Response(
+                {"error": "Muitas consultas no momento, tente de novo em instantes."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response['Retry-After'] = str(settings.MARKET_DATA_THROTTLE_RETRY)
+            return response
+        if quote is None:
             return Response({"error": "Não foi possível obter dados do ativo."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # calcula os limites de compra e venda
-        limits = calculate_limits(None, stock_data)
-        if limits is None:
-            return Response({"error": "Variação insuficiente para calcular os limites."}, status=status.HTTP_400_BAD_REQUEST)
+        # a periodicidade volta no corpo, entao ela tambem entra no ETag
+        etag = quote_etag(f"{quote['etag']}-{periodicity}")
+        max_age = max(0, quote['computed_at'] + settings.STOCK_QUOTE_CACHE_TTL - int(time.time()))
+        response = get_conditional_response(request, etag=etag, last_modified=quote['computed_at'])
+        if response is None:
+            response = Response({**quote['payload'], "periodicity": periodicity}, status=status.HTTP_200_OK)
 
-        return Response({
-            "name": asset_name,
-            "current_price": stock_data['LTP'],
-            "buy_limit": limits['buy_limit'],
-            "sell_limit": limits['sell_limit'],
-            "periodicity": periodicity
-        }, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(quote['computed_at'])
+        patch_cache_control(response, public=True, max_age=max_age)
+        return response
+
+class StockSummaryView(APIView):
+    # resumo do painel: ultima e proxima atualizacao, ativos perto/alem dos limites e alertas recentes
+    # agregado no banco e cacheado por usuario (api.dashboard)
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(dashboard.get_summary(request.user.id), status=status.HTTP_200_OK)
 
 class StockUpdatesInfoView(APIView):
-    # retorna a data da última atualização geral e a previsão da próxima atualizaçao
+    # retorna a data da última atualização geral, a partir do mesmo resumo cacheado do painel
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        stocks = Stock.objects.filter(user=request.user)
+        summary = dashboard.get_summary(request.user.id)
 
-        if not stocks.exists():
+        if not summary['stock_count']:
             return Response({
                 "message": "Nenhum ativo monitorado encontrado."
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # captura todas as ultimas atualizações dos ativos
-        last_updates = [stock.last_updated for stock in stocks if stock.last_updated]
-
-        if not last_updates:
+        if not summary['last_update']:
             return Response({
                 "message": "Nenhuma atualização registrada ainda."
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # útima atualizacao geral
-        last_update_overall = max(last_updates)
-
         return Response({
-            "last_update": last_update_overall.isoformat()
+            "last_update": summary['last_update']
         }, status=status.HTTP_200_OK)
         
 class StockTurnOnFakeView(APIView):
@@ -185,8 +465,11 @@ class StockTurnOnFakeView(APIView):
         except Stock.DoesNotExist:
             return Response({"error": "Ativo não encontrado."}, status=status.HTTP_404_NOT_FOUND)
         
+        if stock.current_price is None:
+            return Response({"error": "O túnel do ativo ainda não foi calculado."}, status=status.HTTP_400_BAD_REQUEST)
         stock.fake = True
         stock.save()
+        dashboard.invalidate([request.user.id])
         serializer = StockSerializer(stock)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -213,5 +496,6 @@ class StockUpdateLimitsView(APIView):
             stock.upper_limit = new_upper_limit
         
         stock.save()
+        dashboard.invalidate([request.user.id])
         serializer = StockSerializer(stock)
         return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
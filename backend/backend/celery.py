@@ -1,6 +1,14 @@
+import logging
 import os
+import time
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import task_prerun, task_postrun, worker_process_shutdown, worker_ready
+from dotenv import load_dotenv
+from prometheus_client import start_http_server
+from utils import metrics
+
+logger = logging.getLogger('api.celery')
 
 # variavel de ambiente com as configs do Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
@@ -11,11 +19,52 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 # cofigs de agendamento (Celery Beat)
-app.conf.beat_schedule = {
-    'check-stocks-every-minute': {
+# com UPDATE_SCHEDULER=due quem agenda as atualizacoes é o run_scheduler, e o beat nao dispara o ciclo
+# (lido do ambiente: este modulo é importado junto com o pacote backend, antes das settings)
+load_dotenv()
+app.conf.beat_schedule = {}
+if os.getenv("UPDATE_SCHEDULER", "beat") == 'beat':
+    app.conf.beat_schedule['check-stocks-every-minute'] = {
         'task': 'api.tasks.check_and_update_stocks_global', 
         'schedule': crontab(),  
-    },
-}
+    }
+
+
+# metricas das tasks: duracao e estado final de cada execucao
+_task_started = {}
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None and task is not None:
+        metrics.TASK_SECONDS.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+@worker_ready.connect
+def _start_metrics_exporter(sender=None, **kwargs):
+    # exporter do worker pro Prometheus; com PROMETHEUS_MULTIPROC_DIR ele soma os processos filhos
+    # ele nao tem autenticacao, entao escuta so no WORKER_METRICS_ADDR (localhost por padrao)
+    from django.conf import settings
+    port = settings.WORKER_METRICS_PORT
+    if not port:
+        return
+    try:
+        start_http_server(port, addr=settings.WORKER_METRICS_ADDR, registry=metrics.registry())
+        logger.info(
+            "Exporter de métricas do worker em %s:%s.", settings.WORKER_METRICS_ADDR, port,
+            extra={'port': port, 'addr': settings.WORKER_METRICS_ADDR},
+        )
+    except OSError as e:
+        # outro worker da mesma maquina ja expoe as metricas nessa porta
+        logger.warning("Não foi possível abrir o exporter de métricas: %s", e, extra={'port': port})
 
 
+@worker_process_shutdown.connect
+def _worker_process_shutdown(pid=None, **kwargs):
+    metrics.mark_process_dead(pid or os.getpid())
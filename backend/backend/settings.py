@@ -124,6 +124,68 @@ else:
     }
 
 
+# cache compartilhado entre o gunicorn e os workers do Celery (codigos OTP, cotacoes e limitador de requests)
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/1")
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    }
+}
+
+# cache de cotacoes por ticker (em segundos)
+QUOTE_CACHE_TTL = int(os.getenv("QUOTE_CACHE_TTL", "60"))  # tempo no Redis
+QUOTE_CACHE_LOCAL_TTL = int(os.getenv("QUOTE_CACHE_LOCAL_TTL", "10"))  # tempo na memoria do processo
+QUOTE_CACHE_NEGATIVE_TTL = int(os.getenv("QUOTE_CACHE_NEGATIVE_TTL", "15"))  # falhas do upstream
+QUOTE_CACHE_LOCK_TIMEOUT = int(os.getenv("QUOTE_CACHE_LOCK_TIMEOUT", "30"))  # espera maxima pelo fetch de outro worker
+QUOTE_CACHE_POLL_INTERVAL = float(os.getenv("QUOTE_CACHE_POLL_INTERVAL", "0.2"))
+# cotacao publica ja calculada (stock/quote/), tambem usada como max-age do Cache-Control
+# por padrao segue o TTL da serie, ja que o resultado so muda quando a serie muda
+STOCK_QUOTE_CACHE_TTL = int(os.getenv("STOCK_QUOTE_CACHE_TTL", str(QUOTE_CACHE_TTL)))
+# resumo do painel por usuario; as escritas invalidam antes, o TTL so limita a idade das janelas de tempo
+DASHBOARD_SUMMARY_TTL = int(os.getenv("DASHBOARD_SUMMARY_TTL", "300"))
+
+# maximo de tickers por importacao em lote (stock/import/)
+STOCK_IMPORT_MAX_TICKERS = int(os.getenv("STOCK_IMPORT_MAX_TICKERS", "100"))
+
+# stream de eventos em tempo real (events/stream/)
+EVENTS_HEARTBEAT = int(os.getenv("EVENTS_HEARTBEAT", "15"))  # segundos entre pings numa conexao parada
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))  # eventos pendentes por conexao antes de descartar
+EVENTS_TICKET_TTL = int(os.getenv("EVENTS_TICKET_TTL", "30"))  # segundos que o ticket de abertura do stream vale
+
+# provedor de cotacoes: alphavantage, yfinance (varios tickers por request) ou replay (series gravadas)
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "alphavantage")
+# a URL do Alpha Vantage pode apontar pro servidor stub_market_data nos benchmarks
+MARKET_DATA_URL = os.getenv("MARKET_DATA_URL", "https://www.alphavantage.co/query")
+MARKET_DATA_SYMBOLS_PER_REQUEST = int(os.getenv("MARKET_DATA_SYMBOLS_PER_REQUEST", "200"))  # tickers por request do yfinance
+MARKET_DATA_REPLAY_DIR = os.getenv("MARKET_DATA_REPLAY_DIR", str(BASE_DIR / "replay"))  # gravacoes do record_market_data
+# velocidade do replay: 1 = uma barra por dia (tempo real), 1440 = uma barra por minuto
+MARKET_DATA_REPLAY_SPEED = float(os.getenv("MARKET_DATA_REPLAY_SPEED", "1"))
+MARKET_DATA_TIMEOUT = float(os.getenv("MARKET_DATA_TIMEOUT", "10"))  # segundos por request
+MARKET_DATA_CONNECT_TIMEOUT = float(os.getenv("MARKET_DATA_CONNECT_TIMEOUT", "5"))
+MARKET_DATA_CONCURRENCY = int(os.getenv("MARKET_DATA_CONCURRENCY", "8"))  # requests simultaneas por processo
+MARKET_DATA_BATCH_SIZE = int(os.getenv("MARKET_DATA_BATCH_SIZE", "100"))  # tickers por lote do agendador
+# cota do provedor, compartilhada por todos os processos (0 desliga o limite)
+MARKET_DATA_RATE_PER_MINUTE = int(os.getenv("MARKET_DATA_RATE_PER_MINUTE", "5"))
+MARKET_DATA_RATE_PER_DAY = int(os.getenv("MARKET_DATA_RATE_PER_DAY", "500"))
+MARKET_DATA_RATE_LIMIT_WAIT = float(os.getenv("MARKET_DATA_RATE_LIMIT_WAIT", "5"))  # espera maxima por um token (as requests HTTP nao esperam)
+# segundos ate tentar de novo um calculo ou uma fila barrados pela cota (o bucket do minuto enche de novo)
+MARKET_DATA_THROTTLE_RETRY = int(os.getenv("MARKET_DATA_THROTTLE_RETRY", "60"))
+# peso da proximidade do preco aos limites na fila de prioridade, em minutos de atraso equivalentes
+MARKET_DATA_PROXIMITY_WEIGHT = float(os.getenv("MARKET_DATA_PROXIMITY_WEIGHT", "10"))
+
+# agendamento das atualizacoes: beat (check_and_update_stocks_global a cada minuto) ou due
+# (processo run_scheduler liberando cada ativo no proprio vencimento, aceita periodicidade em segundos)
+UPDATE_SCHEDULER = os.getenv("UPDATE_SCHEDULER", "beat")
+SCHEDULER_TICK = float(os.getenv("SCHEDULER_TICK", "1"))  # segundos entre as voltas do agendador
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "5000"))  # ativos liberados por volta
+SCHEDULER_RESYNC_INTERVAL = int(os.getenv("SCHEDULER_RESYNC_INTERVAL", "60"))  # segundos entre recargas do indice
+SCHEDULER_MIN_PERIOD_SECONDS = int(os.getenv("SCHEDULER_MIN_PERIOD_SECONDS", "10"))  # menor periodicidade em segundos
+
+# quantidade de fechamentos diarios usados no calculo da volatilidade de cada ticker
+VOLATILITY_WINDOW = int(os.getenv("VOLATILITY_WINDOW", "100"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -173,3 +235,40 @@ CORS_ALLOW_CREDENTIALS = True
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+# os emails tem filas proprias, assim uma lentidao do Resend nao segura a atualizacao das cotacoes
+# e os codigos OTP (que tem alguem esperando na tela) passam na frente dos alertas
+CELERY_TASK_ROUTES = {
+    'api.tasks.send_otp_email': {'queue': 'otp'},
+    'api.tasks.flush_notifications': {'queue': 'emails'},
+    'api.tasks.send_email_batch': {'queue': 'emails'},
+}
+
+# alertas do mesmo usuario dentro dessa janela (em segundos) viram um unico email
+NOTIFICATION_DIGEST_WINDOW = int(os.getenv("NOTIFICATION_DIGEST_WINDOW", "60"))
+
+# logs estruturados (JSON, uma linha por evento) das tasks e da camada de cotacoes
+# LOG_FORMAT=text volta pro formato legivel, util rodando local
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'utils.log_format.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': LOG_FORMAT},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'utils': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# metricas do Prometheus: /metrics no web e, se WORKER_METRICS_PORT estiver definido, um exporter em cada worker
+# o /metrics exige "Authorization: Bearer <token>" e fica desligado (404) enquanto METRICS_TOKEN estiver vazio
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+# o exporter do worker nao tem token: por padrao so escuta no localhost (use o IP da rede interna pra abrir)
+WORKER_METRICS_ADDR = os.getenv("WORKER_METRICS_ADDR", "127.0.0.1")
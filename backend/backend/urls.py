@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
+from api.views.metrics_views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),  
+    # metricas pro Prometheus, no caminho padrao do scraper
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -8,8 +8,25 @@ while ! nc -z redis.com 6379; do
 done
 echo "Redis disponível!"
 
+# metricas do Prometheus: os processos (gunicorn e workers do Celery) gravam num diretorio compartilhado
+# e o /metrics do web soma todos; o diretorio é limpo a cada deploy
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/b3notifier-metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # inicia o deploy
-gunicorn backend.wsgi &
+# ASGI (uvicorn) pra servir o stream de eventos em tempo real sem prender um worker por conexao
+gunicorn backend.asgi -k uvicorn.workers.UvicornWorker &
+
+# agendador por vencimento (UPDATE_SCHEDULER=due), no lugar do ciclo de minuto do beat
+if [ "$UPDATE_SCHEDULER" = "due" ]; then
+  python manage.py run_scheduler &
+fi
+
+# worker so do OTP: o codigo de login nunca espera atras de resumos e alertas
+celery -A backend worker -l INFO -Q otp -c 1 -n otp@%h &
+
+# worker dedicado pros emails de alerta e resumo
+celery -A backend worker -l INFO -Q emails -n emails@%h &
 
 # worker do Celery
 celery -A backend worker -l INFO
@@ -0,0 +1,178 @@
+import itertools
+import numpy as np
+from utils import finance
+
+# backtest dos parametros do tunel sobre historicos diarios
+# reproduz, barra a barra, o que update_stocks_for_ticker faria com cada ticker:
+#   1. o fechamento do dia é comparado com o tunel atual: acima do limite superior dispara o alerta de
+#      venda, abaixo do inferior o de compra, cada um so uma vez ate o preco voltar pra dentro do tunel
+#      (que reseta as duas flags)
+#   2. o tunel é recentralizado no fechamento quando a variacao do PBT passa de UPDATE_PERCENTAGE,
+#      com a banda escolhida pela liquidez e pela volatilidade da janela, como em calculate_limits
+#
+# o estado de cada ticker depende do dia anterior, entao o loop é sobre os dias; dentro de cada dia as
+# contas sao vetorizadas sobre uma matriz (configuracoes x tickers), assim uma grade inteira de
+# parametros roda numa unica passada pelo historico. a volatilidade da janela nao depende dos
+# parametros e é calculada uma vez so, com somas acumuladas
+#
+# as series vem de utils.finance.history_matrix (tickers x dias, NaN no inicio das mais curtas)
+
+# parametros do tunel e o valor atual de cada um em utils.finance
+PARAMETERS = {
+    'liquidity_threshold': finance.LIQUIDITY_THRESHOLD,
+    'volatility_threshold': finance.VOLATILITY_THRESHOLD,
+    'update_percentage': finance.UPDATE_PERCENTAGE,
+    'multiplicative_band': finance.MULTIPLICATIVE_BAND,
+    'additive_band': finance.ADDITIVE_BAND,
+    'additive_points_band': finance.ADDITIVE_POINTS_BAND,
+}
+
+# pregoes por ano, pra normalizar as contagens
+TRADING_DAYS = 252
+
+
+def parameter_grid(**values):
+    # produto cartesiano dos valores de cada parametro (os omitidos ficam com o valor atual)
+    # devolve {parametro: array com um valor por configuracao}
+    names = list(PARAMETERS)
+    for name in values:
+        if name not in PARAMETERS:
+            raise ValueError(f"Parâmetro desconhecido: {name}")
+    choices = [values.get(name) or [PARAMETERS[name]] for name in names]
+    combos = list(itertools.product(*choices))
+    return {name: np.array([combo[i] for combo in combos], dtype=np.float64) for i, name in enumerate(names)}
+
+
+def rolling_volatility_matrix(closes, window):
+    # volatilidade em % (a mesma de calculate_volatility) dos ultimos `window` fechamentos ate cada dia
+    # os precos sao centralizados pela media do ticker antes das somas acumuladas, o que reduz o erro
+    # de cancelamento na variancia
+    closes = np.asarray(closes, dtype=np.float64)
+    valid = ~np.isnan(closes)
+    with np.errstate(invalid='ignore'):
+        center = np.nanmean(np.where(valid.any(axis=1, keepdims=True), closes, 0.0), axis=1, keepdims=True)
+    deviations = np.where(valid, closes - center, 0.0)
+
+    def windowed(values):
+        sums = np.cumsum(values, axis=1)
+        sums[:, window:] -= sums[:, :-window].copy()
+        return sums
+
+    count = windowed(valid.astype(np.float64))
+    total = windowed(deviations)
+    squares = windowed(deviations * deviations)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        variance = np.maximum(squares - total * mean, 0.0) / (count - 1)
+        volatility = np.sqrt(variance) / (mean + center) * 100
+    return np.where(count >= 2, volatility, 0.0)
+
+
+def run_backtest(closes, volumes, grid, window, warmup=None, horizon=5):
+    # closes/volumes: matrizes (tickers x dias); grid: saida de parameter_grid
+    # cada ticker entra na simulacao quando tem `warmup` barras (padrao: a janela), com o tunel
+    # calculado sobre o fechamento daquele dia, como no cadastro do ativo
+    # um alerta "acerta" quando, `horizon` pregoes depois, o preco andou na direcao sugerida
+    # (subiu depois de um alerta de compra, caiu depois de um de venda)
+    # devolve {metrica: array com um valor por configuracao}
+    closes = np.asarray(closes, dtype=np.float64)
+    volumes = np.nan_to_num(np.asarray(volumes, dtype=np.float64))
+    tickers, days = closes.shape
+    warmup = window if warmup is None else warmup
+
+    def column(name):
+        return np.asarray(grid[name], dtype=np.float64)[:, None]
+
+    liquidity_threshold = column('liquidity_threshold')
+    volatility_threshold = column('volatility_threshold')
+    update_percentage = column('update_percentage')
+    multiplicative_band = column('multiplicative_band')
+    additive_band = column('additive_band')
+    additive_points_band = column('additive_points_band')
+    shape = (len(grid['update_percentage']), tickers)
+
+    volatility = rolling_volatility_matrix(closes, window)
+    available = np.cumsum(~np.isnan(closes), axis=1)
+    future = np.full(closes.shape, np.nan)
+    if horizon < days:
+        future[:, :days - horizon] = closes[:, horizon:]
+
+    PBT = np.full(shape, np.nan)
+    lower = np.full(shape, np.nan)
+    upper = np.full(shape, np.nan)
+    upper_sent = np.zeros(shape, dtype=bool)
+    lower_sent = np.zeros(shape, dtype=bool)
+    upper_alerts = np.zeros(shape, dtype=np.int64)
+    lower_alerts = np.zeros(shape, dtype=np.int64)
+    hits = np.zeros(shape, dtype=np.int64)
+    scored = np.zeros(shape, dtype=np.int64)
+    updates = np.zeros(shape, dtype=np.int64)
+    active_days = np.zeros(tickers, dtype=np.int64)
+
+    for day in range(days):
+        price = closes[:, day]
+        active = (available[:, day] >= warmup) & ~np.isnan(price)
+        if not active.any():
+            continue
+        active_days += active
+
+        # alertas contra o tunel atual (NaN = ticker ainda sem tunel, nenhuma comparacao passa)
+        with np.errstate(invalid='ignore'):
+            crossed_up = active & (price >= upper)
+            crossed_down = active & (price <= lower) & ~crossed_up
+            inside = active & (lower < price) & (price < upper)
+        fired_up = crossed_up & ~upper_sent
+        fired_down = crossed_down & ~lower_sent
+        upper_sent = (upper_sent | crossed_up) & ~inside
+        lower_sent = (lower_sent | crossed_down) & ~inside
+        upper_alerts += fired_up
+        lower_alerts += fired_down
+
+        outcome = future[:, day]
+        has_outcome = ~np.isnan(outcome)
+        scored += (fired_up | fired_down) & has_outcome
+        with np.errstate(invalid='ignore'):
+            hits += (fired_up & (outcome < price)) | (fired_down & (outcome > price))
+
+        # recentralizacao do tunel, como needs_update + calculate_limits
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variation = np.where(PBT > 0, np.abs(price - PBT) / PBT * 100, 100.0)
+        update = active & (variation >= update_percentage)
+        if not update.any():
+            continue
+        high_liquidity = volumes[:, day] >= liquidity_threshold
+        multiplicative = high_liquidity & (volatility[:, day] <= volatility_threshold)
+        additive = ~high_liquidity & (volatility[:, day] > volatility_threshold)
+        buy_limit = np.where(
+            multiplicative, price * (1 - multiplicative_band),
+            np.where(additive, price - additive_band, price - additive_points_band / 100),
+        )
+        sell_limit = np.where(
+            multiplicative, price * (1 + multiplicative_band),
+            np.where(additive, price + additive_band, price + additive_points_band / 100),
+        )
+        # o cadastro do ativo nao conta como troca de tunel
+        updates += update & ~np.isnan(PBT)
+        PBT = np.where(update, price, PBT)
+        # mesmo arredondamento de calculate_limits, so nas posicoes recentralizadas
+        lower[update] = finance.round_prices(buy_limit[update])
+        upper[update] = finance.round_prices(sell_limit[update])
+
+    ticker_years = active_days.sum() / TRADING_DAYS
+    alerts = upper_alerts.sum(axis=1) + lower_alerts.sum(axis=1)
+    scored = scored.sum(axis=1)
+    hits = hits.sum(axis=1)
+    updates = updates.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'alerts': alerts,
+            'upper_alerts': upper_alerts.sum(axis=1),
+            'lower_alerts': lower_alerts.sum(axis=1),
+            'hits': hits,
+            'scored': scored,
+            'hit_rate': np.where(scored > 0, hits / scored, np.nan),
+            'updates': updates,
+            'alerts_per_ticker_year': alerts / ticker_years if ticker_years else np.zeros(len(alerts)),
+            'churn': updates / ticker_years if ticker_years else np.zeros(len(updates)),
+            'ticker_days': np.full(len(alerts), active_days.sum()),
+        }
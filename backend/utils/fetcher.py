@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import httpx
+from django.conf import settings
+from utils import metrics, rate_limit
+from utils.timeseries import TimeSeries
+
+logger = logging.getLogger(__name__)
+
+# camada de acesso ao ALPHA VANTAGE
+# todas as requests passam por um unico httpx.AsyncClient por processo, que mantem as conexoes
+# TLS abertas entre as chamadas, tem timeout por request e um semaforo limitando quantas
+# requests ficam em voo ao mesmo tempo
+#
+# o cliente vive num event loop rodando numa thread dedicada, assim o codigo sincrono (views e
+# tasks do Celery) reaproveita o mesmo pool via fetch_stock_data/fetch_many
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+_client = None
+_semaphore = None
+
+
+def _background_loop():
+    # o loop é criado sob demanda e recriado depois de um fork (workers prefork do Celery),
+    # ja que threads e conexoes nao sobrevivem ao fork
+    global _loop, _loop_pid, _client, _semaphore
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _client = None
+            _semaphore = None
+            threading.Thread(target=_loop.run_forever, name="market-data-loop", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro):
+    # executa a corrotina no loop de background e espera o resultado
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+
+
+def _get_client():
+    global _client, _semaphore
+    if _client is None:
+        concurrency = settings.MARKET_DATA_CONCURRENCY
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.MARKET_DATA_TIMEOUT, connect=settings.MARKET_DATA_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        _semaphore = asyncio.Semaphore(concurrency)
+    return _client, _semaphore
+
+
+def is_minute_throttle(data):
+    # o Alpha Vantage responde 200 com "Note" (ou "Information") quando passa da cota por minuto
+    # o "Information" tambem vem pra chave invalida, endpoint premium e cota diaria esgotada,
+    # entao so a mensagem que fala da cota por minuto conta como limite do minuto
+    message = data.get("Note") or data.get("Information") or ""
+    return "per minute" in str(message).lower()
+
+
+def parse_daily_series(stock, data):
+    # transforma a resposta do TIME_SERIES_DAILY num utils.timeseries.TimeSeries
+    # ve se o provedor respondeu com erro (ticker invalido, chave invalida, cota diaria...)
+    if "Error Message" in data or "Note" in data or "Information" in data:
+        logger.warning("Erro do provedor ao buscar %s: %s", stock, data, extra={'ticker': stock})
+        return None
+
+    time_series = data.get("Time Series (Daily)")
+    if not time_series:
+        return None
+    return TimeSeries.from_daily_json(stock, time_series)
+
+
+async def fetch_stock_data_async(stock):
+    # outputsize=compact traz so as ultimas 100 barras; o historico mais antigo fica no banco (PriceBar)
+    # levanta rate_limit.Throttled quando a cota acabou, aqui ou no provedor
+    client, semaphore = _get_client()
+    params = {
+        'function': 'TIME_SERIES_DAILY',
+        'symbol': stock,
+        'outputsize': 'compact',
+        'apikey': os.getenv("ALPHA_VANTAGE_API_KEY"),
+    }
+    # a cota do provedor é compartilhada pelo cluster inteiro, entao esperamos um token antes da request
+    if not await rate_limit.acquire_async(settings.MARKET_DATA_RATE_LIMIT_WAIT):
+        metrics.MARKET_DATA_RATE_LIMITED.labels('local').inc()
+        logger.info("Cota do provedor esgotada, %s fica pro próximo ciclo.", stock, extra={'ticker': stock})
+        raise rate_limit.Throttled(stock)
+
+    started = time.perf_counter()
+    try:
+        async with semaphore:
+            response = await client.get(settings.MARKET_DATA_URL, params=params)
+        data = response.json()
+    except httpx.TimeoutException:
+        metrics.MARKET_DATA_FETCH_SECONDS.labels('timeout').observe(time.perf_counter() - started)
+        logger.warning("Timeout ao buscar os dados de %s.", stock, extra={'ticker': stock})
+        return None
+    except Exception as e:
+        metrics.MARKET_DATA_FETCH_SECONDS.labels('error').observe(time.perf_counter() - started)
+        logger.warning("Erro ao tentar acessar os dados de %s: %s", stock, e, extra={'ticker': stock})
+        return None
+
+    elapsed = time.perf_counter() - started
+
+    # o provedor avisou que a cota do minuto estourou: zeramos o bucket do minuto pra todos os
+    # workers pararem juntos ate ele encher de novo
+    if is_minute_throttle(data):
+        metrics.MARKET_DATA_FETCH_SECONDS.labels('rate_limited').observe(elapsed)
+        metrics.MARKET_DATA_RATE_LIMITED.labels('provider').inc()
+        logger.info("Provedor avisou que a cota do minuto acabou, %s fica pro próximo ciclo.", stock, extra={'ticker': stock})
+        await rate_limit.drain_minute_async()
+        raise rate_limit.Throttled(stock)
+
+    stock_data = parse_daily_series(stock, data)
+    metrics.MARKET_DATA_FETCH_SECONDS.labels('ok' if stock_data is not None else 'invalid').observe(elapsed)
+    return stock_data
+
+
+async def fetch_many_async(tickers):
+    tickers = list(dict.fromkeys(tickers))
+    results = await asyncio.gather(*(fetch_stock_data_async(ticker) for ticker in tickers), return_exceptions=True)
+    fetched = {}
+    for ticker, result in zip(tickers, results):
+        # os tickers barrados pela cota ficam fora do resultado
+        if isinstance(result, rate_limit.Throttled):
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        fetched[ticker] = result
+    return fetched
+
+
+def fetch_stock_data(stock):
+    # versao sincrona, usada pelas views e pelo cache de cotacoes (levanta rate_limit.Throttled sem cota)
+    return run_sync(fetch_stock_data_async(stock))
+
+
+def fetch_many(tickers):
+    # busca varios tickers em paralelo (limitado por MARKET_DATA_CONCURRENCY), devolve {ticker: dados ou None}
+    # sem os tickers barrados pela cota
+    return run_sync(fetch_many_async(tickers))
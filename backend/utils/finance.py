@@ -1,106 +1,134 @@
-import statistics
-import requests
-import os
+import math
+import time
+import numpy as np
+from utils import metrics
+from utils.providers import get_provider
+from utils.quote_cache import get_or_fetch, get_or_fetch_many
+from utils.rate_limit import Throttled
 
 # constantes pro calculo de limites
 LIQUIDITY_THRESHOLD = 1000000      # volume ≥ 1.000.000 → alta liquidez
 VOLATILITY_THRESHOLD = 2.0         # limite de volatilidade em %
 UPDATE_PERCENTAGE = 1.0            # é para atualizar se variação do PBT for ≥ 1%
 
+# bandas de cada metodo de calculo
+MULTIPLICATIVE_BAND = 0.015        # ±1,5% sobre o PBT
+ADDITIVE_BAND = 0.15               # ±0,15 sobre o PBT
+ADDITIVE_POINTS_BAND = 1.5         # ±1,5 pontos-base sobre o PBT
+
 # os calculos foram baseados principalmente neste documento da B3:
 # https://www.b3.com.br/data/files/B7/04/ED/E1/87A7061099BE5706790D8AA8/Metodologia-de-Calculo-de-Tuneis-de-Negociacao.pdf
 # e no conteudo encaminhado no desafio
 
-def get_stock_data(stock):
-    # captura os dados da api do ALPHA VANTAGE pro ativo especificado
-    API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
-    url = f'https://www.alphavantage.co/query?function=TIME_SERIES_DAILY&symbol={stock}&apikey={API_KEY}'
-    
-    try:
-        response = requests.get(url)
-        data = response.json()
-    except Exception as e:
-        print(f"Erro ao tentar acessar o ticker.info: {e}") 
-        return None
+def get_stock_data(stock, max_age=None):
+    # devolve os dados do ativo passando pelo cache compartilhado de cotacoes,
+    # assim varios usuarios monitorando o mesmo ticker geram uma unica request pro upstream
+    # max_age (segundos) recusa cotacoes em cache mais velhas que isso (periodicidades curtas)
+    # a metrica separa os acertos no cache das buscas no provedor (e das que nao trouxeram dados)
+    fetched = False
 
-    # ve se houve erro ou se foi atingido o limite de requests
-    if "Error Message" in data or "Note" in data:
-        print("Erro ou limite de requisições atingido, aguarde alguns minutos:", data)
-        return None
-
-    time_series = data.get("Time Series (Daily)")
-    if not time_series:
-        return None
-
-    # pega os dados mais recentes do ativo
-    sorted_dates = sorted(time_series.keys())
-    last_date = sorted_dates[-1]
-    last_data = time_series[last_date]
+    def fetch(ticker):
+        nonlocal fetched
+        fetched = True
+        return get_provider().fetch(ticker)
 
+    started = time.perf_counter()
     try:
-        last_traded_price = float(last_data.get("4. close"))
-        volume = int(last_data.get("5. volume"))
-    except (TypeError, ValueError) as e:
-        print(f"Erro ao converter os dados do ativo: {e}")
-        return None
+        stock_data = get_or_fetch(stock, fetch, max_age)
+    except Throttled:
+        # sem cota no provedor: quem chama devolve o ticker pra fila (nada vai pro cache)
+        metrics.QUOTE_LOOKUP_SECONDS.labels('throttled').observe(time.perf_counter() - started)
+        raise
+    result = 'miss' if stock_data is None else 'fetched' if fetched else 'hit'
+    metrics.QUOTE_LOOKUP_SECONDS.labels(result).observe(time.perf_counter() - started)
+    return stock_data
 
-    # como essa nova API nao fornece best bid e best offer, vamos pegar o último preço negociado
-    best_bid = last_traded_price
-    best_offer = last_traded_price
-
-    historical_prices = []
-    for date in sorted_dates:
-        try:
-            price = float(time_series[date].get("4. close"))
-            historical_prices.append(price)
-        except Exception as e:
-            print(f"Erro ao processar o preço do dia {date}: {e}")
-            continue
-
-    if not historical_prices:
-        historical_prices = [last_traded_price]
-    return {
-        'LTP': last_traded_price,
-        'BestBid': best_bid,
-        'BestOffer': best_offer,
-        'Volume': volume,
-        'HistoricalPrices': historical_prices
-    }
+def get_many_stock_data(stocks):
+    # mesma coisa que get_stock_data pra varios tickers, buscando os que faltam no cache juntos
+    # (em paralelo ou, nos provedores que aceitam, varios tickers por request)
+    # os tickers barrados pela cota do provedor ficam fora do resultado
+    provider = get_provider()
+    return get_or_fetch_many(stocks, provider.fetch_many, provider.fetch)
 
 def calculate_volatility(historical_prices):
-    # calcula a volatilidade em % a partir de uma lista de precos historicos, com o desvio padrao da media
-    if len(historical_prices) < 2:
+    # calcula a volatilidade em % a partir dos precos historicos, com o desvio padrao da media
+    # aceita lista ou array; o array float64 de TimeSeries.closes é usado direto, sem copia
+    prices = np.asarray(historical_prices, dtype=np.float64)
+    if len(prices) < 2:
         return 0 # nao ha volatilidade com um numero tao pequeno de precos
-    
-    mean_price = statistics.mean(historical_prices)
-    std_dev = statistics.stdev(historical_prices)
-    return (std_dev / mean_price) * 100
 
-def calculate_limits(old_PBT, stock_data):
-    # calcula o PBT (preço base de referencia) e os limites de compra e venda com base nos dados do yahoo 
+    return float(prices.std(ddof=1) / prices.mean() * 100)
+
+# estatisticas incrementais (Welford) numa janela deslizante de precos
+# o estado é (count, mean, m2), com m2 = soma dos quadrados dos desvios da media,
+# e cada barra nova custa O(1) em vez de percorrer o historico inteiro
+
+def rolling_stats(prices):
+    # recalculo completo do estado, usado no cold start e pra validar o estado incremental
+    count = len(prices)
+    if count == 0:
+        return 0, 0.0, 0.0
+    mean = math.fsum(prices) / count
+    m2 = math.fsum((price - mean) ** 2 for price in prices)
+    return count, mean, m2
+
+def rolling_push(count, mean, m2, price):
+    # adiciona um preco enquanto a janela ainda nao esta cheia
+    count += 1
+    delta = price - mean
+    mean += delta / count
+    m2 += delta * (price - mean)
+    return count, mean, m2
+
+def rolling_replace(count, mean, m2, old_price, new_price):
+    # troca o preco que sai da janela pelo que entra, mantendo o tamanho da janela
+    delta = new_price - old_price
+    new_mean = mean + delta / count
+    m2 += delta * (new_price - new_mean + old_price - mean)
+    return count, new_mean, max(m2, 0.0)
+
+def rolling_volatility(count, mean, m2):
+    # mesma volatilidade de calculate_volatility, a partir do estado incremental
+    if count < 2 or not mean:
+        return 0
+    return math.sqrt(m2 / (count - 1)) / mean * 100
+
+def needs_update(old_PBT, PBT):
+    # diz se a variacao do PBT justifica recalcular os limites
+    if old_PBT:
+        percentage_variation = abs(PBT - old_PBT) / old_PBT * 100
+    else:
+        percentage_variation = 100  # assume 100% de variacao pra forcar o update
+    return percentage_variation >= UPDATE_PERCENTAGE
+
+def calculate_limits(old_PBT, stock_data, volatility=None):
+    # calcula o PBT (preço base de referencia) e os limites de compra e venda a partir da serie do ativo (TimeSeries)
+    # o app sempre passa a volatilidade do estado incremental do ticker (api.history.refresh_history),
+    # assim todos os caminhos chegam no mesmo tunel; sem ela é recalculada sobre a serie recebida
     
     # para escolher o melhor metodo de calculo vamos nos basear na liquidez e volatilidade
-    liquidity = "high" if stock_data.get('Volume') and stock_data['Volume'] >= LIQUIDITY_THRESHOLD else "low"
-    volatility = calculate_volatility(stock_data['HistoricalPrices'])
+    liquidity = "high" if stock_data.last_volume >= LIQUIDITY_THRESHOLD else "low"
+    if volatility is None:
+        volatility = calculate_volatility(stock_data.closes)
     
     # determinando as bandas
     if liquidity == "high" and volatility <= VOLATILITY_THRESHOLD:
         calculation_method = "multiplicative"
-        buy_band = -0.015  # -1,5%
-        sell_band = 0.015  # +1,5%
+        buy_band = -MULTIPLICATIVE_BAND
+        sell_band = MULTIPLICATIVE_BAND
     elif liquidity == "low" and volatility > VOLATILITY_THRESHOLD:
         calculation_method = "additive"
-        buy_band = -0.15
-        sell_band = 0.15
+        buy_band = -ADDITIVE_BAND
+        sell_band = ADDITIVE_BAND
     else:
         calculation_method = "additive_points"
-        buy_band = -1.5
-        sell_band = 1.5
+        buy_band = -ADDITIVE_POINTS_BAND
+        sell_band = ADDITIVE_POINTS_BAND
     
     # ultimo preco negociado do ativo
-    LTP = stock_data['LTP']
-    best_bid = stock_data['BestBid']
-    best_offer = stock_data['BestOffer']
+    LTP = stock_data.ltp
+    best_bid = stock_data.best_bid
+    best_offer = stock_data.best_offer
 
     # calculo do PBT 
     if best_bid <= LTP <= best_offer:
@@ -110,13 +138,8 @@ def calculate_limits(old_PBT, stock_data):
     else:
         PBT = best_offer
 
-    if old_PBT:
-        percentage_variation = abs(PBT - old_PBT) / old_PBT * 100
-    else:
-        percentage_variation = 100  # assume 100% de variacao pra forcar o update
-    
     # nao atualiza se a variacao for insignificante
-    if percentage_variation < UPDATE_PERCENTAGE:
+    if not needs_update(old_PBT, PBT):
         return None
 
     # calculo dos limites de compra e venda com base no metodo escolhido
@@ -138,3 +161,87 @@ def calculate_limits(old_PBT, stock_data):
         'volatility': volatility,
         'liquidity': liquidity
     }
+
+# versoes vetorizadas (NumPy) dos calculos acima, pra processar milhares de tickers de uma vez
+# cada posicao dos arrays é um ticker, e os limites saem iguais aos de calculate_limits
+
+def history_matrix(series):
+    # monta a matriz 2-D (tickers x dias) a partir de series de precos de tamanhos diferentes,
+    # completando com NaN no inicio das series mais curtas
+    width = max((len(prices) for prices in series), default=0)
+    matrix = np.full((len(series), width), np.nan)
+    for i, prices in enumerate(series):
+        if len(prices):
+            matrix[i, width - len(prices):] = prices
+    return matrix
+
+def round_prices(values):
+    # arredonda pra 4 casas com o round do Python, o mesmo de calculate_limits, elemento a elemento
+    # o np.round multiplica por 10^4 antes de arredondar e cai do outro lado de alguns empates
+    # (45.1622 em vez de 45.1623), entao o lote gravaria limites diferentes do calculo escalar
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.fromiter((round(value, 4) for value in values.ravel().tolist()), dtype=np.float64, count=values.size)
+    return rounded.reshape(values.shape)
+
+def calculate_volatility_batch(history):
+    # volatilidade em % de cada linha da matriz de precos (NaN = dia sem preco)
+    history = np.asarray(history, dtype=np.float64)
+    valid = ~np.isnan(history)
+    counts = valid.sum(axis=1)
+    prices = np.where(valid, history, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = prices.sum(axis=1) / counts
+        deviations = np.where(valid, history - mean[:, None], 0.0)
+        std_dev = np.sqrt((deviations ** 2).sum(axis=1) / (counts - 1))
+        volatility = std_dev / mean * 100
+
+    # nao ha volatilidade com menos de dois precos
+    return np.where(counts < 2, 0.0, volatility)
+
+def calculate_limits_batch(old_PBT, LTP, best_bid, best_offer, volume, history=None, volatility=None):
+    # calcula PBT e limites de varios tickers numa unica passada vetorizada
+    # old_PBT pode ser None (forca o update de todos) ou um array com NaN/0 onde nao ha PBT anterior
+    # a volatilidade de cada ticker pode vir pronta do estado incremental (api.history.refresh_history),
+    # senao é calculada sobre a matriz `history`
+    # devolve um dict de arrays; 'update' é False onde calculate_limits devolveria None
+    LTP = np.asarray(LTP, dtype=np.float64)
+    best_bid = np.asarray(best_bid, dtype=np.float64)
+    best_offer = np.asarray(best_offer, dtype=np.float64)
+    volume = np.nan_to_num(np.asarray(volume, dtype=np.float64))
+    if old_PBT is None:
+        old_PBT = np.full(LTP.shape, np.nan)
+    old_PBT = np.nan_to_num(np.asarray(old_PBT, dtype=np.float64))
+
+    high_liquidity = volume >= LIQUIDITY_THRESHOLD
+    if volatility is None:
+        volatility = calculate_volatility_batch(history)
+    volatility = np.asarray(volatility, dtype=np.float64)
+    multiplicative = high_liquidity & (volatility <= VOLATILITY_THRESHOLD)
+    additive = ~high_liquidity & (volatility > VOLATILITY_THRESHOLD)
+
+    PBT = np.where(
+        (best_bid <= LTP) & (LTP <= best_offer), LTP,
+        np.where(LTP < best_bid, best_bid, best_offer),
+    )
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percentage_variation = np.where(old_PBT != 0, np.abs(PBT - old_PBT) / old_PBT * 100, 100.0)
+
+    buy_limit = np.where(
+        multiplicative, PBT * (1 - MULTIPLICATIVE_BAND),
+        np.where(additive, PBT - ADDITIVE_BAND, PBT - ADDITIVE_POINTS_BAND / 100),
+    )
+    sell_limit = np.where(
+        multiplicative, PBT * (1 + MULTIPLICATIVE_BAND),
+        np.where(additive, PBT + ADDITIVE_BAND, PBT + ADDITIVE_POINTS_BAND / 100),
+    )
+
+    return {
+        'PBT': PBT,
+        'buy_limit': round_prices(buy_limit),
+        'sell_limit': round_prices(sell_limit),
+        'volatility': volatility,
+        'liquidity': np.where(high_liquidity, "high", "low"),
+        'update': percentage_variation >= UPDATE_PERCENTAGE,
+    }
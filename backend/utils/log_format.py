@@ -0,0 +1,26 @@
+import json
+import logging
+from datetime import datetime, timezone
+
+# formatter de log em JSON, uma linha por evento
+# os campos passados em extra (ticker, stock_id, user_id, ...) viram chaves do JSON, assim da pra
+# filtrar os logs por ativo sem procurar texto na mensagem
+
+# atributos que todo LogRecord tem; o que sobrar veio do extra
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
@@ -0,0 +1,103 @@
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# metricas do caminho quente (cotacoes, tasks, fila de atualizacao e entrega dos alertas) no formato do Prometheus
+#
+# os workers do gunicorn e os processos filhos do Celery (prefork) sao processos separados, entao com
+# PROMETHEUS_MULTIPROC_DIR definido cada processo grava as metricas num arquivo desse diretorio e quem
+# expoe (/metrics no web ou o exporter do worker) soma todos; sem ele cada processo so ve as proprias
+
+# buckets em segundos, do acerto no cache local (~ms) ate uma request lenta no provedor
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# atraso de minutos/horas: espera na fila de atualizacao e do alerta ate o email
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+MARKET_DATA_FETCH_SECONDS = Histogram(
+    'b3notifier_market_data_fetch_seconds',
+    "Duração das requests ao provedor de cotações",
+    ['outcome'], buckets=LATENCY_BUCKETS,
+)
+MARKET_DATA_RATE_LIMITED = Counter(
+    'b3notifier_market_data_rate_limited_total',
+    "Requests barradas pela cota do provedor (local: bucket vazio, provider: aviso do provedor)",
+    ['source'],
+)
+QUOTE_LOOKUP_SECONDS = Histogram(
+    'b3notifier_quote_lookup_seconds',
+    "Duração do get_stock_data, passando pelo cache de cotações",
+    ['result'], buckets=LATENCY_BUCKETS,
+)
+TASK_SECONDS = Histogram(
+    'b3notifier_task_seconds',
+    "Duração das tasks do Celery",
+    ['task', 'state'], buckets=LATENCY_BUCKETS,
+)
+STOCK_REFRESH_LAG_SECONDS = Histogram(
+    'b3notifier_stock_refresh_lag_seconds',
+    "Tempo entre o ativo vencer (next_due_at) e ser atualizado",
+    buckets=LAG_BUCKETS,
+)
+REFRESH_QUEUE_TICKERS = Gauge(
+    'b3notifier_refresh_queue_tickers',
+    "Tickers vencidos colocados na fila de atualização no último ciclo",
+    multiprocess_mode='mostrecent',
+)
+TICKERS_DISPATCHED = Counter(
+    'b3notifier_tickers_dispatched_total',
+    "Tickers disparados pra atualização pela fila",
+)
+STOCKS_UPDATED = Counter(
+    'b3notifier_stocks_updated_total',
+    "Ativos verificados pelas tasks de atualização",
+)
+ALERTS_FIRED = Counter(
+    'b3notifier_alerts_fired_total',
+    "Alertas de compra ou venda disparados",
+    ['side'],
+)
+SCHEDULER_STOCKS_RELEASED = Counter(
+    'b3notifier_scheduler_stocks_released_total',
+    "Ativos liberados pelo agendador por vencimento",
+)
+SCHEDULER_RELEASE_DELAY_SECONDS = Histogram(
+    'b3notifier_scheduler_release_delay_seconds',
+    "Atraso entre o vencimento do ativo e a liberação pelo agendador",
+    buckets=LATENCY_BUCKETS,
+)
+EMAILS_SENT = Counter(
+    'b3notifier_emails_sent_total',
+    "Emails enviados pro Resend",
+    ['kind', 'outcome'],
+)
+EMAIL_SEND_SECONDS = Histogram(
+    'b3notifier_email_send_seconds',
+    "Duração das chamadas de envio ao Resend",
+    ['kind'], buckets=LATENCY_BUCKETS,
+)
+ALERT_DELIVERY_SECONDS = Histogram(
+    'b3notifier_alert_delivery_seconds',
+    "Tempo entre o alerta ser disparado e o email dele sair",
+    buckets=LAG_BUCKETS,
+)
+
+
+def registry():
+    # registry com as metricas de todos os processos (modo multiprocesso) ou so as deste processo
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+def render():
+    # devolve (corpo, content type) da exposicao de todas as metricas
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    # limpa os gauges de um processo filho que saiu (so faz diferenca no modo multiprocesso)
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
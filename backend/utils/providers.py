@@ -0,0 +1,252 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import numpy as np
+import redis
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from utils import fetcher, metrics, rate_limit
+from utils.redis_client import get_redis
+from utils.timeseries import TimeSeries
+
+logger = logging.getLogger(__name__)
+
+# provedores de cotacoes: todos devolvem um utils.timeseries.TimeSeries por ticker (ou None),
+# entao o cache de cotacoes, o calculo dos tuneis e as tasks nao dependem de onde vieram os dados
+# - alphavantage: um ticker por request (utils.fetcher), varias em paralelo
+# - yfinance: baixa muitos tickers numa unica chamada, cada chamada gasta um token da cota
+# - replay: series gravadas em disco (record_market_data), servidas no ritmo do relogio ou acelerado,
+#   pra rodar o pipeline inteiro sem rede
+#
+# o provedor é escolhido por MARKET_DATA_PROVIDER
+
+# barras devolvidas por ticker, o mesmo que o outputsize=compact do Alpha Vantage
+COMPACT_BARS = 100
+
+
+class MarketDataProvider:
+    # fetch devolve a serie ou None (ticker sem dados) e levanta rate_limit.Throttled quando a cota
+    # acabou; fetch_many deixa os tickers barrados pela cota fora do resultado
+    name = None
+    # tickers por request ao upstream
+    batch_size = 1
+
+    def fetch(self, ticker):
+        raise NotImplementedError
+
+    def fetch_many(self, tickers):
+        # devolve {ticker: dados ou None}
+        results = {}
+        for ticker in dict.fromkeys(tickers):
+            try:
+                results[ticker] = self.fetch(ticker)
+            except rate_limit.Throttled:
+                break
+        return results
+
+    def available(self):
+        # quantos tickers cabem agora na cota, sem consumir nada (dimensiona os lotes do agendador)
+        return rate_limit.available() * self.batch_size
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    name = 'alphavantage'
+
+    def fetch(self, ticker):
+        return fetcher.fetch_stock_data(ticker)
+
+    def fetch_many(self, tickers):
+        return fetcher.fetch_many(tickers)
+
+
+def series_from_frame(symbol, frame, bars=COMPACT_BARS):
+    # converte o DataFrame diario do yfinance (indice de datas, colunas Close e Volume) num TimeSeries
+    # com as ultimas `bars` barras (None = todas)
+    frame = frame.dropna(subset=['Close'])
+    if frame.empty:
+        return None
+    dates = frame.index.values.astype('datetime64[D]').astype(np.int64)
+    closes = frame['Close'].to_numpy(dtype=np.float64)
+    volumes = frame['Volume'].fillna(0).to_numpy(dtype=np.int64)
+    order = np.argsort(dates, kind='stable')
+    series = TimeSeries(symbol, dates[order], closes[order], volumes[order])
+    return series.tail(bars) if bars else series
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = 'yfinance'
+
+    def __init__(self):
+        self.batch_size = settings.MARKET_DATA_SYMBOLS_PER_REQUEST
+
+    def fetch(self, ticker):
+        results = self.fetch_many([ticker])
+        if ticker not in results:
+            raise rate_limit.Throttled(ticker)
+        return results[ticker]
+
+    def fetch_many(self, tickers):
+        tickers = list(dict.fromkeys(tickers))
+        results = {}
+        for i in range(0, len(tickers), self.batch_size):
+            chunk = tickers[i:i + self.batch_size]
+            results.update(self._download(chunk))
+        return results
+
+    def _download(self, tickers):
+        # import tardio: o yfinance (e o pandas) so sao carregados quando esse provedor é usado
+        import yfinance
+
+        if not rate_limit.acquire(settings.MARKET_DATA_RATE_LIMIT_WAIT):
+            metrics.MARKET_DATA_RATE_LIMITED.labels('local').inc()
+            logger.info(
+                "Cota do provedor esgotada, %s tickers ficam pro próximo ciclo.", len(tickers),
+                extra={'tickers': len(tickers)},
+            )
+            return {}
+
+        started = time.perf_counter()
+        try:
+            # ~6 meses de pregoes cobrem as 100 barras do modo compacto
+            frame = yfinance.download(
+                tickers, period='6mo', interval='1d', group_by='ticker', auto_adjust=False,
+                actions=False, threads=True, progress=False, timeout=settings.MARKET_DATA_TIMEOUT,
+            )
+        except Exception as e:
+            metrics.MARKET_DATA_FETCH_SECONDS.labels('error').observe(time.perf_counter() - started)
+            logger.warning("Erro ao baixar os dados de %s tickers: %s", len(tickers), e, extra={'tickers': len(tickers)})
+            return {ticker: None for ticker in tickers}
+
+        results = {}
+        for ticker in tickers:
+            try:
+                results[ticker] = series_from_frame(ticker, frame[ticker] if frame.columns.nlevels > 1 else frame)
+            except (KeyError, ValueError) as e:
+                logger.warning("Erro ao converter os dados do ativo %s: %s", ticker, e, extra={'ticker': ticker})
+                results[ticker] = None
+        outcome = 'ok' if any(value is not None for value in results.values()) else 'invalid'
+        metrics.MARKET_DATA_FETCH_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+        return results
+
+
+# inicio do relogio do replay, compartilhado por todos os processos
+REPLAY_STARTED_KEY = "market-data:replay:started"
+# de quanto em quanto tempo cada processo rele o inicio do relogio (pra pegar um restart_replay)
+REPLAY_CLOCK_REFRESH = 60
+
+
+# nomes aceitos pras gravacoes do replay: o ticker vira o nome do arquivo, entao nada de '/' ou '..'
+REPLAY_TICKER = re.compile(r"[A-Z0-9.]+")
+
+
+def replay_path(directory, ticker):
+    # caminho da gravacao do ticker dentro do diretorio; ValueError pra nomes fora do padrao
+    if not REPLAY_TICKER.fullmatch(ticker) or not ticker.strip('.'):
+        raise ValueError(f"Ticker inválido pro replay: {ticker!r}")
+    return os.path.join(directory, f"{ticker}.json")
+
+
+class ReplayProvider(MarketDataProvider):
+    # serve as series gravadas em MARKET_DATA_REPLAY_DIR (<TICKER>.json, no formato do TIME_SERIES_DAILY)
+    # cada ticker comeca com as primeiras COMPACT_BARS barras e ganha uma barra por dia de replay;
+    # MARKET_DATA_REPLAY_SPEED acelera o relogio (1 = tempo real, 1440 = uma barra por minuto)
+    # quando a gravacao acaba, o ticker fica parado na ultima barra
+    name = 'replay'
+
+    def __init__(self):
+        self.directory = settings.MARKET_DATA_REPLAY_DIR
+        self.speed = settings.MARKET_DATA_REPLAY_SPEED
+        self._series = {}
+        self._lock = threading.Lock()
+        self._started = None
+        self._started_checked = 0.0
+
+    def available(self):
+        # os dados sao locais, nao gastam cota
+        return math.inf
+
+    def path(self, ticker):
+        return replay_path(self.directory, ticker)
+
+    def _load(self, ticker):
+        # as series encontradas sao lidas uma vez por processo; os misses nao ficam guardados aqui
+        # (o ticker vem de quem chama e a gravacao pode aparecer depois), o cache de cotacoes ja
+        # segura o resultado negativo por QUOTE_CACHE_NEGATIVE_TTL
+        with self._lock:
+            if ticker in self._series:
+                return self._series[ticker]
+        try:
+            path = self.path(ticker)
+        except ValueError:
+            return None
+        try:
+            with open(path) as file:
+                time_series = json.load(file).get("Time Series (Daily)")
+            series = TimeSeries.from_daily_json(ticker, time_series) if time_series else None
+        except FileNotFoundError:
+            series = None
+        except (OSError, ValueError) as e:
+            logger.warning("Erro ao ler a gravação de %s: %s", ticker, e, extra={'ticker': ticker})
+            series = None
+        if series is not None:
+            with self._lock:
+                self._series[ticker] = series
+        return series
+
+    def started(self):
+        now = time.time()
+        if self._started is None or now - self._started_checked > REPLAY_CLOCK_REFRESH:
+            try:
+                client = get_redis()
+                client.set(REPLAY_STARTED_KEY, now, nx=True)
+                self._started = float(client.get(REPLAY_STARTED_KEY) or now)
+            except redis.RedisError as e:
+                # sem Redis cada processo usa o proprio relogio
+                logger.warning("Relógio compartilhado do replay indisponível: %s", e)
+                self._started = self._started or now
+            self._started_checked = now
+        return self._started
+
+    def elapsed_bars(self):
+        # o inicio pode ter sido gravado por outra maquina, com o relogio um pouco adiantado
+        return max(0, int((time.time() - self.started()) * self.speed // 86400))
+
+    def fetch(self, ticker):
+        series = self._load(ticker)
+        if series is None:
+            return None
+        visible = min(len(series), COMPACT_BARS + self.elapsed_bars())
+        return TimeSeries(
+            ticker, series.dates[:visible], series.closes[:visible], series.volumes[:visible],
+        ).tail(COMPACT_BARS)
+
+
+def restart_replay():
+    # volta o relogio do replay pro inicio das gravacoes; os processos rodando percebem em ate
+    # REPLAY_CLOCK_REFRESH segundos
+    get_redis().delete(REPLAY_STARTED_KEY)
+
+
+PROVIDERS = {
+    AlphaVantageProvider.name: AlphaVantageProvider,
+    YFinanceProvider.name: YFinanceProvider,
+    ReplayProvider.name: ReplayProvider,
+}
+
+_provider = None
+
+
+def get_provider():
+    # um provedor por processo, escolhido por MARKET_DATA_PROVIDER
+    global _provider
+    if _provider is None or _provider.name != settings.MARKET_DATA_PROVIDER:
+        if settings.MARKET_DATA_PROVIDER not in PROVIDERS:
+            raise ImproperlyConfigured(
+                f"MARKET_DATA_PROVIDER inválido: {settings.MARKET_DATA_PROVIDER} (use {', '.join(PROVIDERS)})"
+            )
+        _provider = PROVIDERS[settings.MARKET_DATA_PROVIDER]()
+    return _provider
@@ -0,0 +1,209 @@
+import logging
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from utils.rate_limit import Throttled
+
+logger = logging.getLogger(__name__)
+
+# cache compartilhado de cotacoes, com chave pelo ticker
+# - camada local: dicionario no proprio processo, evita ir ate o Redis quando o mesmo worker repete o ticker
+# - camada compartilhada: cache do Django (Redis), vale pra todos os workers do Celery e do gunicorn
+# - single-flight: quando varios processos pedem o mesmo ticker ao mesmo tempo so um deles
+#   vai no upstream, os outros esperam o resultado aparecer no cache
+#
+# os valores devolvidos sao compartilhados entre quem chamou, entao nao devem ser modificados
+# uma busca barrada pela cota do provedor (utils.rate_limit.Throttled) nao entra no cache: nao
+# diz nada sobre o ticker, entao a proxima tentativa vai no provedor assim que houver cota
+
+# marca uma falha do upstream (limite de requests, ticker invalido), assim quem esta esperando
+# nao dispara outra request logo em seguida
+_MISS = "__quote_miss__"
+
+# as entradas das duas camadas sao (horario da busca, valor), pra que quem chama possa recusar
+# uma cotacao mais velha que o seu proprio periodo (max_age) mesmo dentro do TTL do cache
+# entradas sem o horario (gravadas por versoes anteriores) contam como ausentes
+
+_local = {}  # ticker -> (expira_em, entrada)
+_local_lock = threading.Lock()
+_inflight = {}  # ticker -> {'event': threading.Event, 'error': Throttled ou None} do fetch em andamento neste processo
+
+
+def _key(ticker):
+    return f"quote:{ticker}"
+
+
+def _lock_key(ticker):
+    return f"quote-lock:{ticker}"
+
+
+def _get_local(ticker):
+    entry = _local.get(ticker)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        _local.pop(ticker, None)
+        return None
+    return value
+
+
+def _set_local(ticker, entry):
+    ttl = settings.QUOTE_CACHE_NEGATIVE_TTL if _unwrap(entry) is None else settings.QUOTE_CACHE_LOCAL_TTL
+    _local[ticker] = (time.monotonic() + ttl, entry)
+
+
+def _unwrap(entry):
+    value = entry[1]
+    return None if isinstance(value, str) and value == _MISS else value
+
+
+def _fresh(entry, max_age):
+    return isinstance(entry, tuple) and (max_age is None or time.time() - entry[0] <= max_age)
+
+
+def _lookup(ticker, max_age=None):
+    # devolve a entrada do ticker (local ou compartilhada) se ela existir e nao passar de max_age
+    entry = _get_local(ticker)
+    if _fresh(entry, max_age):
+        return entry
+    entry = cache.get(_key(ticker))
+    if not _fresh(entry, max_age):
+        return None
+    _set_local(ticker, entry)
+    return entry
+
+
+def _store(ticker, value):
+    if value is None:
+        entry = (time.time(), _MISS)
+        cache.set(_key(ticker), entry, timeout=settings.QUOTE_CACHE_NEGATIVE_TTL)
+    else:
+        entry = (time.time(), value)
+        cache.set(_key(ticker), entry, timeout=settings.QUOTE_CACHE_TTL)
+    _set_local(ticker, entry)
+
+
+def get_cached(ticker, max_age=None):
+    # devolve a cotacao em cache sem ir no upstream (None se nao houver)
+    entry = _lookup(ticker, max_age)
+    return None if entry is None else _unwrap(entry)
+
+
+def invalidate(ticker):
+    _local.pop(ticker, None)
+    cache.delete(_key(ticker))
+
+
+def get_or_fetch(ticker, fetch, max_age=None):
+    # devolve a cotacao do ticker, chamando fetch(ticker) so se nenhuma camada tiver o valor
+    # max_age (segundos) recusa entradas mais velhas que isso, pra periodicidades abaixo do QUOTE_CACHE_TTL
+    # o Throttled do fetch passa direto pra quem chamou
+    entry = _lookup(ticker, max_age)
+    if entry is not None:
+        return _unwrap(entry)
+
+    # single-flight dentro do processo: threads do mesmo worker esperam pelo mesmo fetch
+    with _local_lock:
+        flight = _inflight.get(ticker)
+        leader = flight is None
+        if leader:
+            flight = {'event': threading.Event(), 'error': None}
+            _inflight[ticker] = flight
+
+    if not leader:
+        flight['event'].wait(settings.QUOTE_CACHE_LOCK_TIMEOUT)
+        # o fetch barrado pela cota nao grava nada no cache: sem isso quem esperou leria None,
+        # que pra quem chama é uma falha do ticker e nao um "tente de novo depois"
+        if flight['error'] is not None:
+            raise Throttled(ticker) from flight['error']
+        return get_cached(ticker)
+
+    try:
+        return _fetch_single_flight(ticker, fetch, max_age)
+    except Throttled as e:
+        flight['error'] = e
+        raise
+    finally:
+        with _local_lock:
+            _inflight.pop(ticker, None)
+        flight['event'].set()
+
+
+def _fetch_single_flight(ticker, fetch, max_age):
+    # single-flight entre processos: o lock e um cache.add (SET NX no Redis) com expiracao,
+    # entao se o worker que pegou o lock morrer ele e liberado sozinho
+    lock_key = _lock_key(ticker)
+    token = uuid.uuid4().hex
+    lock_timeout = settings.QUOTE_CACHE_LOCK_TIMEOUT
+    deadline = time.monotonic() + lock_timeout
+
+    while True:
+        if cache.add(lock_key, token, timeout=lock_timeout):
+            try:
+                # outro worker pode ter preenchido o cache enquanto a gente esperava o lock
+                entry = _lookup(ticker, max_age)
+                if entry is not None:
+                    return _unwrap(entry)
+                value = fetch(ticker)
+                _store(ticker, value)
+                return value
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        entry = _lookup(ticker, max_age)
+        if entry is not None:
+            return _unwrap(entry)
+
+        if time.monotonic() >= deadline:
+            # quem esta com o lock demorou demais, buscamos nos mesmos pra nao travar o worker
+            logger.warning("Lock da cotação de %s expirou, buscando diretamente.", ticker, extra={'ticker': ticker})
+            value = fetch(ticker)
+            _store(ticker, value)
+            return value
+
+        time.sleep(settings.QUOTE_CACHE_POLL_INTERVAL)
+
+
+def get_or_fetch_many(tickers, fetch_many, fetch):
+    # versao em lote do get_or_fetch: os tickers que faltam no cache sao buscados juntos com
+    # fetch_many(tickers); os que ja estao sendo buscados por outro worker esperam pelo resultado dele
+    # os tickers barrados pela cota ficam fora do resultado
+    results = {}
+    missing = []
+    for ticker in dict.fromkeys(tickers):
+        entry = _lookup(ticker)
+        if entry is None:
+            missing.append(ticker)
+        else:
+            results[ticker] = _unwrap(entry)
+
+    token = uuid.uuid4().hex
+    lock_timeout = settings.QUOTE_CACHE_LOCK_TIMEOUT
+    owned = [ticker for ticker in missing if cache.add(_lock_key(ticker), token, timeout=lock_timeout)]
+    throttled = set()
+    try:
+        if owned:
+            fetched = fetch_many(owned)
+            for ticker in owned:
+                if ticker not in fetched:
+                    throttled.add(ticker)
+                    continue
+                value = fetched[ticker]
+                _store(ticker, value)
+                results[ticker] = value
+    finally:
+        for ticker in owned:
+            if cache.get(_lock_key(ticker)) == token:
+                cache.delete(_lock_key(ticker))
+
+    for ticker in missing:
+        if ticker not in results and ticker not in throttled:
+            try:
+                results[ticker] = get_or_fetch(ticker, fetch)
+            except Throttled:
+                pass
+    return results
@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import logging
+import math
+import time
+from contextlib import contextmanager
+import redis
+from django.conf import settings
+from utils.redis_client import get_redis, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+# limitador de requests pro provedor de cotacoes (token bucket no Redis)
+# o Alpha Vantage tem cota por minuto e por dia, entao usamos dois buckets; como o estado fica no
+# Redis, a cota é compartilhada por todos os workers do Celery e processos do gunicorn
+# cada request consome um token dos dois buckets, ou de nenhum se algum deles estiver vazio
+#
+# o script roda atomicamente no Redis e usa o relogio do proprio Redis, entao nao depende
+# dos relogios das maquinas dos workers estarem sincronizados
+
+BUCKET_KEYS = ("market-data:bucket:minute", "market-data:bucket:day")
+
+# teto da espera por um token no contexto atual (None: vale o timeout de quem pede)
+# o contexto acompanha a corrotina ate o loop do utils.fetcher, entao o teto vale pros dois caminhos
+_max_wait = contextvars.ContextVar("market_data_max_wait", default=None)
+
+
+class Throttled(Exception):
+    # a request nao saiu porque a cota do provedor acabou (no limitador daqui ou no proprio provedor)
+    # nao é falha do ticker: quem chama devolve o trabalho pra fila em vez de cachear ou marcar erro
+    pass
+
+
+# KEYS: buckets; ARGV: consumir (1/0), e pra cada bucket a capacidade e os tokens por milissegundo
+# devolve {espera em ms ate haver token, tokens disponiveis no bucket mais vazio}
+_TOKEN_BUCKET_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local consume = tonumber(ARGV[1])
+local wait = 0
+local available = -1
+local tokens = {}
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local current = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    current = math.min(capacity, current + math.max(0, now - ts) * rate)
+    tokens[i] = current
+    if current < 1 then
+        wait = math.max(wait, math.ceil((1 - current) / rate))
+    end
+    if available < 0 or current < available then
+        available = current
+    end
+end
+if consume == 1 and wait == 0 then
+    available = available - 1
+    for i = 1, #KEYS do
+        tokens[i] = tokens[i] - 1
+    end
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i]), 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate) + 1000)
+end
+return {wait, math.floor(available)}
+"""
+
+# zera o bucket quando o provedor avisa que estourou a cota do minuto (nossa conta saiu de sincronia com a dele)
+_DRAIN_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+for i = 1, #KEYS do
+    redis.call('HSET', KEYS[i], 'tokens', '0', 'ts', now)
+end
+return 1
+"""
+
+def _buckets():
+    # (chave, capacidade, tokens por ms) dos buckets habilitados; cota 0 desliga o bucket
+    buckets = []
+    for key, quota, period_ms in (
+        (BUCKET_KEYS[0], settings.MARKET_DATA_RATE_PER_MINUTE, 60_000),
+        (BUCKET_KEYS[1], settings.MARKET_DATA_RATE_PER_DAY, 86_400_000),
+    ):
+        if quota > 0:
+            buckets.append((key, quota, quota / period_ms))
+    return buckets
+
+
+def _args(consume):
+    buckets = _buckets()
+    keys = [key for key, _, _ in buckets]
+    args = [1 if consume else 0]
+    for _, capacity, rate in buckets:
+        args += [capacity, repr(rate)]
+    return keys, args
+
+
+def _result(reply):
+    wait_ms, available = (int(value) for value in reply)
+    return wait_ms, max(available, 0)
+
+
+@contextmanager
+def no_wait():
+    # dentro do bloco ninguem espera por token: sem cota o fetch sai na hora com Throttled
+    # usado nas requests HTTP, que devolvem 503 em vez de segurar o worker do gunicorn
+    token = _max_wait.set(0)
+    try:
+        yield
+    finally:
+        _max_wait.reset(token)
+
+
+def _timeout(timeout):
+    limit = _max_wait.get()
+    return timeout if limit is None else min(timeout, limit)
+
+
+def try_acquire():
+    # tenta consumir um token sem esperar; devolve (conseguiu, espera em segundos ate o proximo token)
+    keys, args = _args(consume=True)
+    if not keys:
+        return True, 0.0
+    client = get_redis()
+    try:
+        wait_ms, _ = _result(client.eval(_TOKEN_BUCKET_LUA, len(keys), *keys, *args))
+    except redis.RedisError as e:
+        # sem Redis nao da pra coordenar a cota, entao deixamos a request seguir
+        logger.warning("Limitador de requests indisponível: %s", e)
+        return True, 0.0
+    return wait_ms == 0, wait_ms / 1000
+
+
+def acquire(timeout):
+    # espera ate `timeout` segundos por um token
+    deadline = time.monotonic() + _timeout(timeout)
+    while True:
+        acquired, wait = try_acquire()
+        if acquired:
+            return True
+        if time.monotonic() + wait > deadline:
+            return False
+        time.sleep(wait)
+
+
+async def acquire_async(timeout):
+    # mesma coisa que acquire, pro loop do utils.fetcher
+    keys, args = _args(consume=True)
+    if not keys:
+        return True
+    client = get_async_redis()
+    deadline = time.monotonic() + _timeout(timeout)
+    while True:
+        try:
+            wait_ms, _ = _result(await client.eval(_TOKEN_BUCKET_LUA, len(keys), *keys, *args))
+        except redis.RedisError as e:
+            logger.warning("Limitador de requests indisponível: %s", e)
+            return True
+        if wait_ms == 0:
+            return True
+        wait = wait_ms / 1000
+        if time.monotonic() + wait > deadline:
+            return False
+        await asyncio.sleep(wait)
+
+
+def available():
+    # quantas requests cabem agora na cota, sem consumir nada (usado pra dimensionar os lotes)
+    keys, args = _args(consume=False)
+    if not keys:
+        return math.inf
+    client = get_redis()
+    try:
+        _, tokens = _result(client.eval(_TOKEN_BUCKET_LUA, len(keys), *keys, *args))
+    except redis.RedisError as e:
+        logger.warning("Limitador de requests indisponível: %s", e)
+        return settings.MARKET_DATA_BATCH_SIZE
+    return tokens
+
+
+async def drain_minute_async():
+    # so o bucket do minuto: a cota diaria continua valendo, o aviso do provedor é sobre o minuto
+    if settings.MARKET_DATA_RATE_PER_MINUTE <= 0:
+        return
+    client = get_async_redis()
+    try:
+        await client.eval(_DRAIN_LUA, 1, BUCKET_KEYS[0])
+    except redis.RedisError as e:
+        logger.warning("Limitador de requests indisponível: %s", e)
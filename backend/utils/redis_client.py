@@ -0,0 +1,31 @@
+import os
+import redis
+import redis.asyncio as redis_async
+from django.conf import settings
+
+# conexoes com o Redis usado pelo cache compartilhado, pra estruturas que o cache do Django nao oferece
+# (scripts Lua, sorted sets, pub/sub); conexoes nao sobrevivem ao fork dos workers prefork,
+# entao os clientes sao recriados por processo
+
+_client = None
+_async_client = None
+_client_pid = None
+
+
+def _ensure_clients():
+    global _client, _async_client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = redis.Redis.from_url(settings.CACHE_REDIS_URL)
+        _async_client = redis_async.Redis.from_url(settings.CACHE_REDIS_URL)
+        _client_pid = os.getpid()
+
+
+def get_redis():
+    _ensure_clients()
+    return _client
+
+
+def get_async_redis():
+    # só deve ser usado dentro de um unico event loop (o do utils.fetcher)
+    _ensure_clients()
+    return _async_client
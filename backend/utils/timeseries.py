@@ -0,0 +1,99 @@
+import datetime
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+class TimeSeries:
+    # serie diaria de um ticker guardada em arrays tipados, em vez de dicts e floats soltos
+    # dates: dias desde 1970-01-01 (int64), closes: fechamentos (float64), volumes: volumes (int64)
+    # as barras ficam em ordem cronologica, entao a ultima posicao é a cotacao mais recente
+    __slots__ = ('symbol', 'dates', 'closes', 'volumes')
+
+    def __init__(self, symbol, dates, closes, volumes):
+        self.symbol = symbol
+        self.dates = dates
+        self.closes = closes
+        self.volumes = volumes
+
+    def __len__(self):
+        return len(self.closes)
+
+    def __repr__(self):
+        return f"TimeSeries({self.symbol}, {len(self)} barras)"
+
+    # a API diaria nao fornece best bid e best offer, entao os tres usam o ultimo preco negociado
+    @property
+    def ltp(self):
+        return float(self.closes[-1])
+
+    @property
+    def best_bid(self):
+        return self.ltp
+
+    @property
+    def best_offer(self):
+        return self.ltp
+
+    @property
+    def last_volume(self):
+        return int(self.volumes[-1])
+
+    def tail(self, count):
+        # ultimas `count` barras, sem copiar os arrays
+        return TimeSeries(self.symbol, self.dates[-count:], self.closes[-count:], self.volumes[-count:])
+
+    def date_list(self):
+        return [EPOCH + datetime.timedelta(days=int(day)) for day in self.dates]
+
+    def to_daily_json(self):
+        # o inverso do from_daily_json (mais recente primeiro, como o Alpha Vantage), usado nas gravacoes do replay
+        # so o fechamento e o volume sao guardados, sao os unicos campos lidos
+        return {
+            day.isoformat(): {"4. close": repr(float(close)), "5. volume": str(int(volume))}
+            for day, close, volume in reversed(list(zip(self.date_list(), self.closes, self.volumes)))
+        }
+
+    @classmethod
+    def from_daily_json(cls, symbol, time_series):
+        # monta a serie a partir do "Time Series (Daily)" do Alpha Vantage numa unica passada,
+        # convertendo as datas de uma vez pro formato numpy
+        count = len(time_series)
+        try:
+            dates = np.array(list(time_series.keys()), dtype='datetime64[D]').astype(np.int64)
+            bars = time_series.values()
+            closes = np.fromiter((bar["4. close"] for bar in bars), dtype=np.float64, count=count)
+            volumes = np.fromiter((bar.get("5. volume") or 0 for bar in bars), dtype=np.int64, count=count)
+        except (KeyError, TypeError, ValueError):
+            return cls._from_daily_json_skipping_errors(symbol, time_series)
+
+        # o Alpha Vantage manda a serie da data mais recente pra mais antiga
+        if count > 1 and dates[0] > dates[-1]:
+            dates, closes, volumes = dates[::-1].copy(), closes[::-1].copy(), volumes[::-1].copy()
+        if count > 2 and np.any(np.diff(dates) <= 0):
+            order = np.argsort(dates, kind='stable')
+            dates, closes, volumes = dates[order], closes[order], volumes[order]
+        return cls(symbol, dates, closes, volumes)
+
+    @classmethod
+    def _from_daily_json_skipping_errors(cls, symbol, time_series):
+        # caminho lento, so quando alguma barra veio com valor invalido: descarta as barras ruins,
+        # mas se a ultima barra estiver ruim nao ha cotacao atual confiavel
+        last_date = max(time_series)
+        rows = []
+        for date, bar in time_series.items():
+            try:
+                rows.append((date, float(bar.get("4. close")), int(bar.get("5. volume") or 0)))
+            except (TypeError, ValueError) as e:
+                if date == last_date:
+                    logger.warning("Erro ao converter os dados do ativo %s: %s", symbol, e, extra={'ticker': symbol})
+                    return None
+                logger.warning("Erro ao processar o preço do dia %s: %s", date, e, extra={'ticker': symbol})
+        rows.sort()
+        dates = np.array([row[0] for row in rows], dtype='datetime64[D]').astype(np.int64)
+        closes = np.array([row[1] for row in rows], dtype=np.float64)
+        volumes = np.array([row[2] for row in rows], dtype=np.int64)
+        return cls(symbol, dates, closes, volumes)
@@ -96,9 +96,20 @@ export const getUserProfile = async () => {
   return handleRequest(() => api.get("/user/profile/"));
 };
 
+// percorre todas as paginas de uma listagem paginada e devolve os itens juntos
+const getAllPages = async (url) => {
+  const items = [];
+  while (url) {
+    const page = await handleRequest(() => api.get(url));
+    items.push(...page.results);
+    url = page.next;
+  }
+  return items;
+};
+
 // busca os ativos monitorados do usuario
 export const getStocks = async () => {
-  return handleRequest(() => api.get("/stock/list/"));
+  return getAllPages("/stock/list/");
 };
 
 // adiciona um novo ativo ao monitoramento
@@ -106,6 +117,12 @@ export const addStock = async (data) => {
   return handleRequest(() => api.post("/stock/create/", data));
 };
 
+// adiciona varios ativos de uma vez: { stocks: [...], periodicity } ou um FormData com a carteira CSV em "file"
+// a resposta traz o resultado de cada ticker (created, exists, duplicate, failed ou invalid)
+export const importStocks = async (data) => {
+  return handleRequest(() => api.post("/stock/import/", data));
+};
+
 // captura dados um ativo antes diretamente do yahoo finance
 export const fetchStockQuote = async (name, periodicity) => {
   return handleRequest(() => api.get(`/stock/quote/?name=${name}&periodicity=${periodicity}`));
@@ -121,9 +138,9 @@ export const deleteStock = async (id) => {
   return handleRequest(() => api.delete(`/stock/delete/${id}/`));
 };
 
-// captura info sobre a ultima e a proxima atualizcao dos ativos
+// captura o resumo do painel: ultima e proxima atualizacao dos ativos, ativos perto dos limites e alertas recentes
 export const getStockUpdatesInfo = async () => {
-  return handleRequest(() => api.get("/stocks/updates-info/"));
+  return handleRequest(() => api.get("/stocks/summary/"));
 };
 
 // adiciona alerta no historico de alertas
@@ -131,9 +148,46 @@ export const addAlert = async (data) => {
   return handleRequest(() => api.post("/alert/create/", data));
 };
 
-// captura os alertas do usuario
-export const getAlerts = async () => {
-  return handleRequest(() => api.get("/alert/list/"));
+// captura uma pagina dos alertas do usuario (mais recentes primeiro)
+// devolve { results, next }; pra pagina seguinte, chame de novo passando o next
+export const getAlerts = async (next = null) => {
+  return handleRequest(() => api.get(next || "/alert/list/"));
+};
+
+// abre o stream de eventos em tempo real (precos atualizados e alertas novos)
+// o EventSource nao manda headers, entao a query leva um ticket de uso unico pedido com o token JWT
+// (o token nunca vai na URL); como o ticket so abre uma conexao, quando ela cai pedimos outro e reabrimos
+// devolve a funcao que fecha o stream
+export const subscribeEvents = ({ onStock, onAlert }) => {
+  let source = null;
+  let retry = null;
+  let closed = false;
+
+  const reconnect = () => {
+    if (!closed) retry = setTimeout(open, 3000);
+  };
+  const open = async () => {
+    try {
+      const { data } = await api.post("/events/ticket/");
+      if (closed) return;
+      source = new EventSource(`${API_BASE_URL}/events/stream/?ticket=${encodeURIComponent(data.ticket)}`);
+      if (onStock) source.addEventListener("stock", (event) => onStock(JSON.parse(event.data)));
+      if (onAlert) source.addEventListener("alert", (event) => onAlert(JSON.parse(event.data)));
+      source.onerror = () => {
+        source.close();
+        reconnect();
+      };
+    } catch (error) {
+      reconnect();
+    }
+  };
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    if (source) source.close();
+  };
 };
 
 export default api;
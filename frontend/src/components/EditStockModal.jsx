@@ -166,10 +166,11 @@ const EditStockModal = ({ isOpen, onClose, stock, onStockUpdated }) => {
         {stock && (
           <StockCard
             ticker={stock.name}
-            price={Number(stock.current_price)}
-            buy={Number(stock.lower_limit)}
-            sell={Number(stock.upper_limit)}
+            price={stock.current_price}
+            buy={stock.lower_limit}
+            sell={stock.upper_limit}
             periodicity={stock.periodicity}
+            status={stock.status}
           />
         )}
 
@@ -2,7 +2,16 @@ import React from "react";
 import { Card } from "@/components/ui/card";
 import { SquareArrowUp, SquareArrowDown, Clock, Pencil } from "lucide-react";
 
-const StockCard = ({ ticker, price, buy, sell, periodicity, isEditMode, onEdit }) => {
+// precos chegam vazios enquanto o tunel do ativo esta sendo calculado no backend
+const formatPrice = (value) =>
+  value === null || value === undefined ? "—" : `R$ ${Number(value).toFixed(2).replace(".", ",")}`;
+
+const statusLabels = {
+  pending: "Calculando túnel...",
+  failed: "Não foi possível obter a cotação",
+};
+
+const StockCard = ({ ticker, price, buy, sell, periodicity, status, isEditMode, onEdit }) => {
   return (
     <Card 
       className="relative p-6 bg-[hsl(var(--card))] border border-[hsl(var(--border))] shadow-md rounded-2xl cursor-pointer"
@@ -18,7 +27,7 @@ const StockCard = ({ ticker, price, buy, sell, periodicity, isEditMode, onEdit }
       
       <div className="flex items-center justify-between">
         <span className="text-lg font-semibold text-[hsl(var(--foreground))]">Cotação Atual</span>
-        <span className="text-lg font-bold text-[hsl(var(--foreground))]">R$ {price.toFixed(2).replace(".", ",")}</span>
+        <span className="text-lg font-bold text-[hsl(var(--foreground))]">{formatPrice(price)}</span>
       </div>
 
       <div className="flex items-center justify-between mt-2 text-[hsl(var(--muted-foreground))]">
@@ -33,12 +42,16 @@ const StockCard = ({ ticker, price, buy, sell, periodicity, isEditMode, onEdit }
         <span className="text-2xl font-extrabold text-[hsl(var(--foreground))] uppercase">{ticker}</span>
       </div>
 
+      {statusLabels[status] && (
+        <div className="mt-1 text-sm text-[hsl(var(--muted-foreground))]">{statusLabels[status]}</div>
+      )}
+
       <div className="flex items-center justify-between mt-4">
         <div className="flex items-center space-x-1">
           <SquareArrowUp className="w-5 h-5 text-[hsl(var(--lightgrey))]" />
           <span className="text-base text-[hsl(var(--lightgrey))]">Vender</span>
         </div>
-        <span className="text-lg font-bold text-[hsl(var(--green))]">R$ {sell.toFixed(2).replace(".", ",")}</span>
+        <span className="text-lg font-bold text-[hsl(var(--green))]">{formatPrice(sell)}</span>
       </div>
 
       <div className="flex items-center justify-between mt-2">
@@ -46,7 +59,7 @@ const StockCard = ({ ticker, price, buy, sell, periodicity, isEditMode, onEdit }
           <SquareArrowDown className="w-5 h-5 text-[hsl(var(--lightgrey))]" />
           <span className="text-base text-[hsl(var(--lightgrey))]">Comprar</span>
         </div>
-        <span className="text-lg font-bold text-[hsl(var(--red))]">R$ {buy.toFixed(2).replace(".", ",")}</span>
+        <span className="text-lg font-bold text-[hsl(var(--red))]">{formatPrice(buy)}</span>
       </div>
     </Card>
   );
@@ -1,13 +1,15 @@
 import React, { useState, useEffect } from "react";
 import { Badge } from "@/components/ui/badge";
+import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Alert, AlertTitle, AlertDescription } from "@/components/ui/alert";
 import { Clock, Search, Bell } from "lucide-react";
 import { Separator } from "@/components/ui/separator";
-import { getAlerts, getStockUpdatesInfo, getStocks } from "@/api";
+import { getAlerts, getStockUpdatesInfo, getStocks, subscribeEvents } from "@/api";
 
 const Alerts = () => {
   const [alerts, setAlerts] = useState([]);
+  const [nextAlerts, setNextAlerts] = useState(null);
   const [searchQuery, setSearchQuery] = useState("");
   const [stocks, setStocks] = useState([]); 
   const [loading, setLoading] = useState(true);
@@ -61,20 +63,25 @@ const Alerts = () => {
       return () => clearInterval(interval);
     }, []);
 
-  useEffect(() => {
-    const fetchAlerts = async () => {
-      try {
-        const response = await getAlerts();
-        // se a resposta já for um array: response
-        // caso contrário usamos response.data
-        setAlerts(response.data || response || []);
-      } catch (error) {
-        console.error("Erro ao buscar alertas:", error);
-        setAlerts([]);
-      }
-    };
+  // os alertas vem paginados; "next" aponta pra proxima pagina, ou null na ultima
+  const fetchAlerts = async (next = null) => {
+    try {
+      const response = await getAlerts(next);
+      setAlerts((previous) => (next ? [...previous, ...response.results] : response.results));
+      setNextAlerts(response.next);
+    } catch (error) {
+      console.error("Erro ao buscar alertas:", error);
+      if (!next) setAlerts([]);
+    }
+  };
 
+  useEffect(() => {
     fetchAlerts();
+
+    // alertas novos chegam pelo stream de eventos e entram no topo da lista
+    return subscribeEvents({
+      onAlert: (alert) => setAlerts((prev) => [alert, ...prev.filter((item) => item.id !== alert.id)]),
+    });
   }, []);
 
   // converte a data pro formato brasileiro
@@ -234,6 +241,13 @@ const Alerts = () => {
         ) : (
           <p>Nenhum alerta encontrado</p>
         )}
+        {nextAlerts && (
+          <div className="flex justify-center">
+            <Button variant="outline" onClick={() => fetchAlerts(nextAlerts)}>
+              Carregar mais
+            </Button>
+          </div>
+        )}
       </div>
     </div>
   );
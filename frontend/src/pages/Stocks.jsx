@@ -7,7 +7,7 @@ import StockCard from "@/components/StockCard";
 import FilterPopover from "@/components/FilterPopover";
 import AddStockModal from "@/components/AddStockModal";
 import EditStockModal from "@/components/EditStockModal";
-import { getStocks, getStockUpdatesInfo } from "@/api"; 
+import { getStocks, getStockUpdatesInfo, subscribeEvents } from "@/api"; 
 
 const Stocks = () => {
   const [filters, setFilters] = useState({
@@ -85,12 +85,23 @@ const Stocks = () => {
     fetchStocks();
     fetchUpdateInfo();
 
+    // precos novos chegam pelo stream de eventos, sem precisar buscar a lista de novo
+    const unsubscribe = subscribeEvents({
+      onStock: (updated) => {
+        setStocks((prev) => prev.map((stock) => (stock.id === updated.id ? { ...stock, ...updated } : stock)));
+        setUpdateInfo((prev) => ({ ...prev, last_update: new Date().toISOString() }));
+      },
+    });
+
     // atualizaçao nas infos de tempo de update
     const interval = setInterval(() => {
       fetchUpdateInfo();
     }, 60000); 
 
-    return () => clearInterval(interval);
+    return () => {
+      clearInterval(interval);
+      unsubscribe();
+    };
   }, []);
 
   // filtra os stocks pelo nome
@@ -206,9 +217,10 @@ const Stocks = () => {
                 key={stock.id}
                 ticker={stock.name}
                 periodicity={stock.periodicity}
-                price={Number(stock.current_price)}
-                buy={Number(stock.lower_limit)}
-                sell={Number(stock.upper_limit)}
+                status={stock.status}
+                price={stock.current_price}
+                buy={stock.lower_limit}
+                sell={stock.upper_limit}
                 isEditMode={isEditMode}
                 onEdit={() => handleEditClick(stock)}
                 showEditIcon={isEditMode}